@@ -26,12 +26,16 @@
 #along with this program.  If not, see <https://www.gnu.org/licenses/>.
 
 import os
+import asyncio
 from os.path import join, splitext, expandvars
 from pathlib import Path
 from ntpath import basename
 from time import time, strftime
 from shutil import rmtree
+from concurrent.futures import ThreadPoolExecutor
 import re
+import numpy as np
+from math import gcd
 pattern = re.compile('e([+\-]\d+)')
 # from multiprocessing import Process
 
@@ -39,19 +43,24 @@ from agilepy.config.AgilepyConfig import AgilepyConfig
 
 from agilepy.api.SourcesLibrary import SourcesLibrary
 from agilepy.api.ScienceTools import CtsMapGenerator, ExpMapGenerator, GasMapGenerator, IntMapGenerator, Multi
+from agilepy.utils.ProcessWrapper import ProcessWrapper
 
 from agilepy.utils.AstroUtils import AstroUtils
-from agilepy.utils.PlottingUtils import PlottingUtils
 from agilepy.utils.Parameters import Parameters
 from agilepy.utils.MapList import MapList
+from agilepy.utils.SkyMap import SkyMap
+from agilepy.utils.ProductStore import ProductStore
 from agilepy.utils.AgilepyLogger import AgilepyLogger
+from agilepy.utils.AgilepyTracer import AgilepyTracer, traced
 from agilepy.utils.AstroUtils import AstroUtils
 from agilepy.utils.CustomExceptions import AGILENotFoundError, \
                                            PFILESNotFoundError, \
                                            ScienceToolInputArgMissing, \
                                            MaplistIsNone, \
                                            SourceNotFound, \
-                                           EnvironmentVariableNotExpanded
+                                           EnvironmentVariableNotExpanded, \
+                                           ScienceToolErrorCodeReturned, \
+                                           ScienceToolProductNotFound
 
 class AGAnalysis:
     """This class contains the high-level API methods you can use to run scientific analysis.
@@ -60,6 +69,8 @@ class AGAnalysis:
 
     """
 
+    LIGHT_CURVE_HEADER = "time_start_mjd time_end_mjd sqrt(ts) flux flux_err flux_ul gal iso l_peak b_peak dist l b r ell_dist time_start_utc time_end_utc time_start_tt time_end_tt\n"
+
     def __init__(self, configurationFilePath, sourcesFilePath = None):
         """AGAnalysis constructor.
 
@@ -91,11 +102,17 @@ class AGAnalysis:
 
         self.logger = AgilepyLogger()
 
-        self.logger.initialize(outdir, self.config.getConf("output","logfilenameprefix"), self.config.getConf("output","verboselvl"))
+        logfileverboselvl, logasync, logfilemaxbytes, logfilebackupcount = \
+            self.config.getOptionValues(["logfileverboselvl", "logasync", "logfilemaxbytes", "logfilebackupcount"])
+
+        self.logger.initialize(outdir, self.config.getConf("output","logfilenameprefix"), self.config.getConf("output","verboselvl"), \
+                               asyncMode=logasync, fileDebugLvl=logfileverboselvl, maxBytes=logfilemaxbytes, backupCount=logfilebackupcount)
 
 
 
-        self.sourcesLibrary = SourcesLibrary(self.config, self.logger)
+        self.tracer = AgilepyTracer(enabled=self.config.getOptionValue("tracing"))
+
+        self.sourcesLibrary = SourcesLibrary(self.config, self.logger, self.tracer)
 
         if sourcesFilePath:
 
@@ -103,7 +120,8 @@ class AGAnalysis:
 
 
 
-        self.plottingUtils = PlottingUtils(self.config, self.logger)
+        # matplotlib and the other plotting dependencies are imported only if a plot is produced
+        self._plottingUtils = None
 
         if "AGILE" not in os.environ:
             raise AGILENotFoundError("$AGILE is not set.")
@@ -118,6 +136,64 @@ class AGAnalysis:
 
         self.lightCurveData = None
 
+        self._ownsLogger = True
+
+    @staticmethod
+    def fromTemplate(template, outdir=None):
+        """It creates a new analysis sharing the validated configuration, the logger and the sources of an existing analysis. \
+        No file or directory is read or written: this is meant for the batch workers creating many analyses in the same process (e.g. sky scans).
+
+        The configuration is a copy-on-write copy of the template's one, hence the options can be changed with setOptions() \
+        without affecting the template. The sources are copied when the new analysis uses them for the first time, \
+        hence the template should not be changed while its analyses are running. \
+        The logger is shared with the template and it is not reset by destroy().
+
+        Args:
+            template (AGAnalysis): an analysis created with the constructor, after the sources have been loaded.
+            outdir (str, optional): the output directory of the new analysis. It defaults to None: the output directory of the template is used. \
+            The directory is created when the first product is written.
+
+        Returns:
+            A new AGAnalysis object.
+
+        Example:
+            >>> template = AGAnalysis('agconfig.yaml', sourcesFilePath='sources.xml')
+            >>> analysis = AGAnalysis.fromTemplate(template, outdir='/tmp/scan/job_1')
+        """
+        analysis = AGAnalysis.__new__(AGAnalysis)
+
+        analysis.config = AgilepyConfig.getCopy(template.config)
+
+        if outdir is not None:
+            analysis.config.setOptions(outdir=outdir)
+
+        analysis.logger = template.logger
+
+        analysis.tracer = template.tracer
+
+        analysis.sourcesLibrary = SourcesLibrary(analysis.config, analysis.logger, analysis.tracer)
+
+        analysis.sourcesLibrary.shareSources(template.sourcesLibrary)
+
+        analysis._plottingUtils = None
+
+        analysis.currentMapList = MapList(analysis.logger)
+        analysis.config.attach(analysis.currentMapList, "galcoeff")
+        analysis.config.attach(analysis.currentMapList, "isocoeff")
+
+        analysis.lightCurveData = None
+
+        analysis._ownsLogger = False
+
+        return analysis
+
+    @property
+    def plottingUtils(self):
+        if self._plottingUtils is None:
+            from agilepy.utils.PlottingUtils import PlottingUtils
+            self._plottingUtils = PlottingUtils(self.config, self.logger)
+        return self._plottingUtils
+
     """
     def __del__(self):
         self.destroy()
@@ -125,7 +201,8 @@ class AGAnalysis:
 
     def destroy(self):
         self.sourcesLibrary.destroy()
-        self.logger.reset()
+        if self._ownsLogger:
+            self.logger.reset()
         self.config.detach(self.currentMapList, "galcoeff")
         self.config.detach(self.currentMapList, "isocoeff")
         self.currentMapList = None
@@ -241,6 +318,9 @@ mle:
     def deleteAnalysisDir(self):
         """It deletes the output directory where all the products of the analysis are written.
 
+        The products shared with other analyses through the product store (see the 'productstore' option) are removed
+        from the store only if no other analysis uses them.
+
         Args:
 
         Returns:
@@ -249,6 +329,12 @@ mle:
         """
         outDir = Path(self.config.getConf("output", "outdir"))
 
+        productStore = ProductStore.getStore(self.config.getOptionValue("productstore"))
+
+        if productStore is not None:
+            removed = productStore.release(outDir)
+            self.logger.info(self, "References to the product store released, %d stored products removed.", removed)
+
         if outDir.exists() and outDir.is_dir():
             rmtree(outDir)
             self.logger.info(self,"Analysis directory %s deleted.", str(outDir))
@@ -258,6 +344,32 @@ mle:
 
         return True
 
+    def exportTrace(self, fileFormat="jsonl"):
+        """It writes the timing spans recorded during the analysis (API calls, science tools invocations and parsing steps)
+        in the 'traces' subdirectory of the output directory. The spans are recorded only if the 'tracing' configuration option is True.
+
+        Args:
+            fileFormat (str): "jsonl" (one span per line) or "chrome" (Chrome trace event format, it can be opened with chrome://tracing or https://ui.perfetto.dev).
+
+        Returns:
+            The absolute path to the trace file.
+
+        Raises:
+            TraceFormatNotSupportedError: if the format is not supported.
+
+        Example:
+            >>> aganalysis.exportTrace(fileFormat="chrome")
+            /home/rt/agilepy/output/traces/trace.json
+
+        """
+        tracesDir = Path(self.config.getConf("output", "outdir")).joinpath("traces")
+
+        filePath = self.tracer.export(tracesDir, fileFormat)
+
+        self.logger.info(self, "%d spans exported in %s", len(self.tracer.spans), filePath)
+
+        return filePath
+
     def setOptions(self, **kwargs):
         """It updates configuration options specifying one or more key=value pairs at once.
 
@@ -360,7 +472,7 @@ mle:
         Args:
             maplistFile (str, optional): the path to the .maplist file. If not specified, the last generated maplist file will be used. It defaults to None.
             singleMode (bool, optional): if set to true, all maps will be displayed as subplots on a single figure. It defaults to True.
-            smooth (float, optional): the sigma value of the gaussian smoothing. It defaults to 4.0.
+            smooth (float or str, optional): the sigma value (unit: pixels) of the gaussian smoothing, or "psf" to smooth with a gaussian approximating the PSF in the energy range of each map. It defaults to 4.0.
             saveImage (bool, optional): if set to true, saves the image into the output directory. It defaults to False.
             fileFormat (str, optional): the extension of the output image. It defaults to '.png' .
             title (str, optional): the title of the image. It defaults to None.
@@ -380,7 +492,7 @@ mle:
         Args:
             maplistFile (str, optional): the path to the .maplist file. If not specified, the last generated maplist file will be used. It defaults to None.
             singleMode (bool, optional): if set to true, all maps will be displayed as subplots on a single figure. It defaults to True.
-            smooth (float, optional): the sigma value of the gaussian smoothing. It defaults to 4.0.
+            smooth (float or str, optional): the sigma value (unit: pixels) of the gaussian smoothing, or "psf" to smooth with a gaussian approximating the PSF in the energy range of each map. It defaults to 4.0.
             saveImage (bool, optional): if set to true, saves the image into the output directory. It defaults to False.
             fileFormat (str, optional): the extension of the output image. It defaults to '.png' .
             title (str, optional): the title of the image. It defaults to None.
@@ -400,7 +512,7 @@ mle:
         Args:
             maplistFile (str, optional): the path to the .maplist file. If not specified, the last generated maplist file will be used. It defaults to None.
             singleMode (bool, optional): if set to true, all maps will be displayed as subplots on a single figure. It defaults to True.
-            smooth (float, optional): the sigma value of the gaussian smoothing. It defaults to 4.0.
+            smooth (float or str, optional): the sigma value (unit: pixels) of the gaussian smoothing, or "psf" to smooth with a gaussian approximating the PSF in the energy range of each map. It defaults to 4.0.
             saveImage (bool, optional): if set to true, saves the image into the output directory. It defaults to False.
             fileFormat (str, optional): the extension of the output image. It defaults to '.png' .
             title (str, optional): the title of the image. It defaults to None.
@@ -436,12 +548,68 @@ mle:
         elif self.lightCurveData is not None and filename is None:
             return self.plottingUtils.plotLc(self.lightCurveData, lineValue, lineError)
 
+    def renderImages(self, maplistFiles=None, lightCurveFiles=None, skyMapTypes=["CTS"], singleMode=True, smooth=4.0, fileFormat=".png", cmap="CMRmap", regFilePath=None, catalogRegions=None, catalogRegionsColor="red", processes=None):
+        """It renders the sky maps of many maplist files and many light curve files, headlessly and in parallel
+        (e.g. for a report). The images are written in the 'plots/batch' subdirectory of the output directory.
+
+        Args:
+            maplistFiles (list, optional): the paths to the .maplist files. It defaults to None.
+            lightCurveFiles (list, optional): the paths to the light curve text data files. It defaults to None.
+            skyMapTypes (list, optional): the types of sky maps to render for each maplist file ("CTS", "EXP", "GAS"). It defaults to ["CTS"].
+            singleMode (bool, optional): if set to true, the maps of a maplist file are rendered as subplots of a single image. It defaults to True.
+            smooth (float or str, optional): the sigma value (unit: pixels) of the gaussian smoothing, or "psf". It defaults to 4.0.
+            fileFormat (str, optional): the extension of the output images. It defaults to '.png' .
+            cmap (str, optional): Matplotlib colormap. It defaults to 'CMRmap'.
+            regFilePath (str, optional): the relative or absolute path to a region file. It defaults to None.
+            catalogRegions(str, optional): a catalog name. The regions that belongs to the catalog will be loaded. It defaults to None.
+            catalogRegionsColor(str, optional): the color of the regions loaded from the catalog.
+            processes (int, optional): the number of worker processes. It defaults to None (the number of CPUs).
+
+        Returns:
+            The paths to the image files, in the order of the inputs (None for the images that could not be rendered).
+        """
+        outDir = Path(self.config.getOptionValue("outdir")).joinpath("plots", "batch")
+        outDir.mkdir(parents=True, exist_ok=True)
+
+        options = {"smooth": smooth, "fileFormat": fileFormat, "cmap": cmap, "regFilePath": regFilePath, \
+                   "catalogRegions": catalogRegions, "catalogRegionsColor": catalogRegionsColor}
+
+        jobs = []
+
+        for maplistIdx, maplistFile in enumerate(maplistFiles or []):
+
+            maplistRows = self.parseMaplistFile(maplistFile)
+
+            # the maplist files of different analyses (e.g. light curve bins) can have the same name
+            imageName = f"{maplistIdx}_{Path(maplistFile).stem}"
+
+            for skyMapType in skyMapTypes:
+
+                files, titles = self._getSkyMapsFilesAndTitles(skyMapType, maplistRows)
+
+                if singleMode and len(files) > 1:
+                    outputFilePath = str(outDir.joinpath(f"{imageName}_{skyMapType.lower()}").with_suffix(fileFormat))
+                    jobs.append(("displaySkyMapsSingleMode", dict(options, fitsFilepaths=files, titles=titles, outputFilePath=outputFilePath)))
+
+                else:
+                    for idx, title in enumerate(titles):
+                        outputFilePath = str(outDir.joinpath(f"{imageName}_{skyMapType.lower()}_{idx}").with_suffix(fileFormat))
+                        jobs.append(("displaySkyMap", dict(options, fitsFilepath=files[idx], title=title, outputFilePath=outputFilePath)))
+
+        for lcIdx, lightCurveFile in enumerate(lightCurveFiles or []):
+
+            outputFilePath = str(outDir.joinpath(f"{lcIdx}_{Path(lightCurveFile).stem}").with_suffix(fileFormat))
+            jobs.append(("saveLcImage", {"filename": lightCurveFile, "outputFilePath": outputFilePath}))
+
+        return self.plottingUtils.renderBatch(jobs, processes)
+
 
 
     ############################################################################
     # analysis                                                                 #
     ############################################################################
 
+    @traced("api")
     def generateMaps(self, config = None, maplistObj = None):
         """It generates (one or more) counts, exposure, gas and int maps and a ``maplist file``.
 
@@ -473,98 +641,85 @@ mle:
         else:
             maplistObjBKP = self.currentMapList
 
-        fovbinnumber = configBKP.getOptionValue("fovbinnumber")
-        energybins = configBKP.getOptionValue("energybins")
-
-        initialFovmin = configBKP.getOptionValue("fovradmin")
-        initialFovmax = configBKP.getOptionValue("fovradmax")
         initialFileNamePrefix = configBKP.getOptionValue("filenameprefix")
 
+        mapsGenerators = self._prepareMapsGeneration(configBKP)
 
-        for stepi in range(0, fovbinnumber):
-
-            if fovbinnumber == 1:
-                bincenter = 30
-                fovmin = initialFovmin
-                fovmax = initialFovmax
-            else:
-                bincenter, fovmin, fovmax = AGAnalysis._updateFovMinMaxValues(fovbinnumber, initialFovmin, initialFovmax, stepi+1)
+        for ctsMapGenerator, expMapGenerator, gasMapGenerator, intMapGenerator, maplistRow in mapsGenerators:
 
+            f1 = ctsMapGenerator.call()
+            self.logger.info(self, "Science tool ctsMapGenerator produced:\n %s", f1)
 
-            for bgCoeffIdx, stepe in enumerate(energybins):
+            f2 = expMapGenerator.call()
+            self.logger.info(self, "Science tool expMapGenerator produced:\n %s", f2)
 
-                if Parameters.checkEnergyBin(stepe):
+            f3 = gasMapGenerator.call()
+            self.logger.info(self, "Science tool gasMapGenerator produced:\n %s", f3)
 
-                    emin = stepe[0]
-                    emax = stepe[1]
+            f4 = intMapGenerator.call()
+            self.logger.info(self, "Science tool intMapGenerator produced:\n %s", f4)
 
-                    skymapL = Parameters.getSkyMap(emin, emax)
-                    skymapH = Parameters.getSkyMap(emin, emax)
-                    fileNamePrefix = Parameters.getMapNamePrefix(emin, emax, stepi+1)
+        maplistFilePath = self._writeMaplistFile(configBKP, maplistObjBKP, initialFileNamePrefix, mapsGenerators)
 
-                    self.logger.debug(self, "Map generation => fovradmin %s fovradmax %s bincenter %s emin %s emax %s fileNamePrefix %s skymapL %s skymapH %s", \
-                                       fovmin,fovmax,bincenter,emin,emax,fileNamePrefix,skymapL,skymapH)
+        self.logger.info(self, "Took %f seconds.", time() - timeStart)
 
-                    configBKP.setOptions(filenameprefix=initialFileNamePrefix+"_"+fileNamePrefix)
-                    configBKP.setOptions(fovradmin=fovmin, fovradmax=fovmax)
-                    configBKP.addOptions("selection", emin=emin, emax=emax)
-                    configBKP.addOptions("maps", skymapL=skymapL, skymapH=skymapH)
+        return maplistFilePath
 
+    async def generateMapsAsync(self, config = None, maplistObj = None, semaphore = None):
+        """Coroutine version of ``generateMaps()``: the science tools run concurrently without blocking the event loop.
+        The counts and exposure maps of all the (fov bin, energy bin) pairs are generated concurrently, then the
+        gas and int maps (they need the exposure and counts maps).
 
-                    ctsMapGenerator = CtsMapGenerator("AG_ctsmapgen", self.logger)
-                    expMapGenerator = ExpMapGenerator("AG_expmapgen", self.logger)
-                    gasMapGenerator = GasMapGenerator("AG_gasmapgen", self.logger)
-                    intMapGenerator = IntMapGenerator("AG_intmapgen", self.logger)
+        Args:
+            semaphore (asyncio.Semaphore, optional): the semaphore bounding the number of science tools running concurrently.
+                It defaults to None: a semaphore shared by all the science tools running in the event loop is used.
 
-                    ctsMapGenerator.configureTool(configBKP)
-                    expMapGenerator.configureTool(configBKP)
-                    gasMapGenerator.configureTool(configBKP, {"expMapGeneratorOutfilePath": expMapGenerator.outfilePath})
-                    intMapGenerator.configureTool(configBKP, {"expMapGeneratorOutfilePath": expMapGenerator.outfilePath, "ctsMapGeneratorOutfilePath" : ctsMapGenerator.outfilePath})
+        Returns:
+            The absolute path to the generated ``maplist file``.
 
-                    configBKP.addOptions("maps", expmap=expMapGenerator.outfilePath, ctsmap=ctsMapGenerator.outfilePath)
+        Raises:
+            ScienceToolInputArgMissing: if not all the required configuration options have been set.
 
-                    if not ctsMapGenerator.allRequiredOptionsSet(configBKP) or \
-                       not expMapGenerator.allRequiredOptionsSet(configBKP) or \
-                       not gasMapGenerator.allRequiredOptionsSet(configBKP) or \
-                       not intMapGenerator.allRequiredOptionsSet(configBKP):
+        Example:
+            >>> asyncio.run(aganalysis.generateMapsAsync())
+            /home/rt/agilepy/output/testcase.maplist4
 
-                        raise ScienceToolInputArgMissing("Some options have not been set.")
+        """
+        with self.tracer.span("AGAnalysis.generateMapsAsync", "api"):
 
-                    f1 = ctsMapGenerator.call()
-                    self.logger.info(self, "Science tool ctsMapGenerator produced:\n %s", f1)
+            timeStart = time()
 
-                    f2 = expMapGenerator.call()
-                    self.logger.info(self, "Science tool expMapGenerator produced:\n %s", f2)
+            if config:
+                configBKP = config
+            else:
+                configBKP = AgilepyConfig.getCopy(self.config)
 
-                    f3 = gasMapGenerator.call()
-                    self.logger.info(self, "Science tool gasMapGenerator produced:\n %s", f3)
+            if maplistObj:
+                maplistObjBKP = maplistObj
+            else:
+                maplistObjBKP = self.currentMapList
 
-                    f4 = intMapGenerator.call()
-                    self.logger.info(self, "Science tool intMapGenerator produced:\n %s", f4)
+            initialFileNamePrefix = configBKP.getOptionValue("filenameprefix")
 
-                    maplistObjBKP.addRow(  ctsMapGenerator.outfilePath, \
-                                                expMapGenerator.outfilePath, \
-                                                gasMapGenerator.outfilePath, \
-                                                str(bincenter), \
-                                                str(configBKP.getOptionValue("galcoeff")[bgCoeffIdx]), \
-                                                str(configBKP.getOptionValue("isocoeff")[bgCoeffIdx])
-                                              )
-                else:
-                    self.logger.warning(self,"Energy bin [%s, %s] is not supported. Map generation skipped.", stepe[0], stepe[1])
+            mapsGenerators = self._prepareMapsGeneration(configBKP)
 
+            async def generate(ctsMapGenerator, expMapGenerator, gasMapGenerator, intMapGenerator, maplistRow):
 
-        outdir = configBKP.getOptionValue("outdir")
+                f1, f2 = await asyncio.gather(ctsMapGenerator.callAsync(semaphore), expMapGenerator.callAsync(semaphore))
+                self.logger.info(self, "Science tools ctsMapGenerator and expMapGenerator produced:\n %s %s", f1, f2)
 
-        maplistObjBKP.setFile(Path(outdir).joinpath(initialFileNamePrefix))
+                f3, f4 = await asyncio.gather(gasMapGenerator.callAsync(semaphore), intMapGenerator.callAsync(semaphore))
+                self.logger.info(self, "Science tools gasMapGenerator and intMapGenerator produced:\n %s %s", f3, f4)
 
-        maplistFilePath = maplistObjBKP.writeToFile()
+            await asyncio.gather(*[generate(*generators) for generators in mapsGenerators])
 
-        self.logger.info(self, "Maplist file created in %s", maplistFilePath)
+            maplistFilePath = self._writeMaplistFile(configBKP, maplistObjBKP, initialFileNamePrefix, mapsGenerators)
 
-        self.logger.info(self, "Took %f seconds.", time() - timeStart)
+            self.logger.info(self, "Took %f seconds.", time() - timeStart)
 
-        return maplistFilePath
+            return maplistFilePath
 
+    @traced("api")
     def calcBkg(self, sourceName, galcoeff = None, pastTimeWindow = 14.0):
         """It estimates the isotropic and galactic background coefficients.
            It automatically updates the configuration.
@@ -670,6 +825,7 @@ mle:
 
         return galCoeff, isoCoeff, maplistFilePath
 
+    @traced("api")
     def mle(self, maplistFilePath = None, config = None, updateSourceLibrary = True):
         """It performs a maximum likelihood estimation analysis on every source withing the ``sourceLibrary``, producing one output file per source.
 
@@ -704,50 +860,52 @@ mle:
         else:
             configBKP = AgilepyConfig.getCopy(self.config)
 
-        if not maplistFilePath and self.currentMapList.getFile() is None:
-
-            raise MaplistIsNone("No 'maplist' files found. Please, pass a valid path to a maplist \
-                                 file as argument or call generateMaps(). ")
-
-        if not maplistFilePath:
-
-            maplistFilePath = self.currentMapList.getFile()
-
-        multi = Multi("AG_multi", self.logger)
+        multi = self._prepareMle(maplistFilePath, configBKP)
 
-        sourceListFilename = "sourceLibrary"+(str(multi.callCounter).zfill(5))
-        sourceListAgileFormatFilePath = self.sourcesLibrary.writeToFile(outfileNamePrefix=join(self.config.getConf("output","outdir"), sourceListFilename), fileformat="txt")
+        sourceFiles = multi.call()
 
-        configBKP.addOptions("selection", maplist=maplistFilePath, sourcelist=sourceListAgileFormatFilePath)
+        self._collectMleResults(sourceFiles, updateSourceLibrary)
 
-        multisources = self.sourcesLibrary.getSourcesNames()
-        configBKP.addOptions("selection", multisources=multisources)
+        self.logger.info(self, "Took %f seconds.", time()-timeStart)
 
 
-        multi.configureTool(configBKP)
+        return sourceFiles
 
-        sourceFiles = multi.call()
+    async def mleAsync(self, maplistFilePath = None, config = None, updateSourceLibrary = True, semaphore = None):
+        """Coroutine version of ``mle()``: AG_multi runs without blocking the event loop.
 
-        if len(sourceFiles) == 0:
-            self.logger.warning(self, "The number of .source files is 0.")
+        Args:
+            maplistFilePath (str): if not provided, the analysis will use the last generated mapfile produced by ``generateMaps()``.
+            semaphore (asyncio.Semaphore, optional): the semaphore bounding the number of science tools running concurrently.
+                It defaults to None: a semaphore shared by all the science tools running in the event loop is used.
 
-        self.logger.info(self,"AG_multi produced: %s", sourceFiles)
+        Returns:
+            A list of absolute paths to the output ``.source`` files.
 
-        if updateSourceLibrary:
+        Raises:
+            MaplistIsNone: is the input argument is None.
+        """
+        with self.tracer.span("AGAnalysis.mleAsync", "api"):
 
-            for sourceFile in sourceFiles:
+            timeStart = time()
 
-                multiOutputData = self.sourcesLibrary.parseSourceFile(sourceFile)
+            if config:
+                configBKP = config
+            else:
+                configBKP = AgilepyConfig.getCopy(self.config)
 
-                self.sourcesLibrary.updateMulti(multiOutputData)
+            multi = self._prepareMle(maplistFilePath, configBKP)
 
+            sourceFiles = await multi.callAsync(semaphore)
 
-        self.logger.info(self, "Took %f seconds.", time()-timeStart)
+            self._collectMleResults(sourceFiles, updateSourceLibrary)
 
+            self.logger.info(self, "Took %f seconds.", time()-timeStart)
 
-        return sourceFiles
+            return sourceFiles
 
-    def lightCurve(self, sourceName, tmin = None, tmax = None, timetype = None, binsize = 86400):
+    @traced("api")
+    def lightCurve(self, sourceName, tmin = None, tmax = None, timetype = None, binsize = 86400, concurrentBins = 1):
         """It generates a cvs file containing the data for a light curve plot.
 
         Args:
@@ -756,6 +914,9 @@ mle:
             tmax (float, optional): ending point of the light curve. It defaults to None. If None the 'tmax' value of the configuration file will be used.
             timetype (str, optional): the time format ('MJD' or 'TT'). It defaults to None. If None the 'timetype' value of the configuration file will be used.
             binsize (int, optional): temporal bin size. It defaults to 86400.
+            concurrentBins (int, optional): number of temporal bins analysed concurrently. The science tools startup (e.g. the loading
+                of the instrument response matrices) of a bin overlaps with the other bins' analysis. The number of science tools
+                running concurrently is bounded by ProcessWrapper.maxConcurrency. It defaults to 1 (bins analysed one at a time).
 
         Returns:
             The absolute path to the light curve data output file.
@@ -793,46 +954,35 @@ mle:
 
         configBKP = AgilepyConfig.getCopy(self.config)
 
-        (_, last, _) = AgilepyConfig._getFirstAndLastLineInFile(configBKP.getConf("input", "evtfile"))
-        idxTmax = float(AgilepyConfig._extractTimes(last)[1])
-
-        # logFilenamePrefix = configBKP.getConf("output","logfilenameprefix")
         # verboseLvl = configBKP.getConf("output","verboselvl")
 
         self.logger.info(self, "[LC] Number of processes: %d, Number of bins per process %d", processes, len(binsForProcesses[0]))
 
-        for idx, bin in enumerate(bins):
-
-            t1 = bin[0]
-            t2 = bin[1]
+        bins = self._clipLightCurveBins(bins, configBKP)
 
-            if t2 > idxTmax:
-                newbinsize = idxTmax - t1
-                self.logger.warning(self, f"[LC] The last bin [{t1}, {t2}] of the light curve analysis falls outside the range of the available data [.. , {idxTmax}]. The binsize is reduced to {newbinsize} seconds, the new bin is [{t1}, {idxTmax}]")
-                t2 = idxTmax
+        if concurrentBins > 1:
 
-            self.logger.info(self,"[LC] Analysis of temporal bin: [%f,%f] %d/%d", t1, t2, idx+1, len(bins))
+            self.logger.info(self, "[LC] Number of bins analysed concurrently: %d", concurrentBins)
 
-            binOutDir = str(lcAnalysisDataDir.joinpath(f"bin_{t1}_{t2}"))
+            AGAnalysis._runCoroutine(self._computeLcBinsAsync(bins, configBKP, lcAnalysisDataDir, concurrentBins))
 
+        else:
 
-            configBKP.setOptions(filenameprefix="lc_analysis", outdir = binOutDir)
-            configBKP.setOptions(tmin = t1, tmax = t2, timetype = "TT")
+            for idx, (t1, t2) in enumerate(bins):
 
-            maplistObj = MapList(self.logger)
+                self.logger.info(self,"[LC] Analysis of temporal bin: [%f,%f] %d/%d", t1, t2, idx+1, len(bins))
 
-            maplistFilePath = self.generateMaps(config = configBKP, maplistObj=maplistObj)
+                binOutDir = str(lcAnalysisDataDir.joinpath(f"bin_{t1}_{t2}"))
 
-            configBKP.setOptions(filenameprefix="lc_analysis", outdir = binOutDir)
-            configBKP.setOptions(tmin = t1, tmax = t2, timetype = "TT")
-            _ = self.mle(maplistFilePath = maplistFilePath, config = configBKP, updateSourceLibrary = False)
+                _ = self._computeLcBinProducts(configBKP, binOutDir, t1, t2)
 
         """
+        workersQueue = self.logger.startWorkersListener()
+
         processes = []
         for pID, pInputs in enumerate(binsForProcesses):
-            logFilenamePrefix += f"_thread_{pID}"
-            print("generating process...(%d). Chunk size for process: %d"%(pID, len(pInputs)))
-            p = Process(target=self._computeLcBin, args=(pID, pInputs, configBKP, lcAnalysisDataDir, logsOutDir, logFilenamePrefix, verboseLvl))
+            self.logger.info(self, "Generating process %d. Chunk size for process: %d", pID, len(pInputs))
+            p = Process(target=self._computeLcBin, args=(pID, pInputs, configBKP, lcAnalysisDataDir, workersQueue, verboseLvl))
             processes.append((pID,p,len(pInputs)))
 
         for pID, p, binsNumber in processes:
@@ -841,6 +991,8 @@ mle:
 
         for pID, p, binsNumber in processes:
             p.join()
+
+        self.logger.stopWorkersListener()
         """
 
         lcData = self.getLightCurveData(sourceName, lcAnalysisDataDir, binsize)
@@ -863,7 +1015,7 @@ mle:
 
         binDirectories = os.listdir(lcAnalysisDataDir)
 
-        lcData = "time_start_mjd time_end_mjd sqrt(ts) flux flux_err flux_ul gal iso l_peak b_peak dist l b r ell_dist time_start_utc time_end_utc time_start_tt time_end_tt\n"
+        lcData = AGAnalysis.LIGHT_CURVE_HEADER
 
         timecounter = 0
 
@@ -886,98 +1038,451 @@ mle:
                     time_start_tt = lcDataDict["time_start_tt"] + binsize * timecounter
                     time_end_tt   = lcDataDict["time_end_tt"]   + binsize * timecounter
 
-                    time_start_mjd = AstroUtils.time_tt_to_mjd(time_start_tt)
-                    time_end_mjd   = AstroUtils.time_tt_to_mjd(time_end_tt)
-
-                    time_start_utc = AstroUtils.time_mjd_to_utc(time_start_mjd)
-                    time_end_utc   = AstroUtils.time_mjd_to_utc(time_end_mjd)
-
-                    # "time_start_mjd time_end_mjd sqrt(ts) flux flux_err flux_ul gal iso l_peak b_peak dist l b r ell_dist time_start_utc time_end_utc time_start_tt time_end_tt\n"
-
-                    lcData += f"{time_start_mjd} {time_end_mjd} {lcDataDict['sqrt(ts)']} {lcDataDict['flux']} {lcDataDict['flux_err']} {lcDataDict['flux_ul']} {lcDataDict['gal']} {lcDataDict['iso']} {lcDataDict['l_peak']} {lcDataDict['b_peak']} {lcDataDict['dist_peak']} {lcDataDict['l']} {lcDataDict['b']} {lcDataDict['r']} {lcDataDict['dist']} {time_start_utc} {time_end_utc} {lcDataDict['time_start_tt']} {lcDataDict['time_end_tt']}\n"
+                    lcData += AGAnalysis._formatLightCurveRow(lcDataDict, time_start_tt, time_end_tt)
 
                     timecounter += 1
 
-        self.logger.info(self, f"\n{lcData}")
+        self.logger.debug(self, "\n%s", lcData)
 
         return lcData
 
+    @traced("api")
+    def adaptiveLightCurve(self, sourceName, tmin = None, tmax = None, timetype = None, binsize = 604800, minBinsize = 86400, sqrtTSThreshold = 3.0):
+        """It generates a cvs file containing the data for a light curve plot with adaptive temporal bins.
 
-    ############################################################################
-    # sources management                                                       #
-    ############################################################################
+        The analysis starts from coarse bins of size ``binsize``. A bin where the source has sqrt(TS) greater than ``sqrtTSThreshold`` is
+        split into two halves, recursively, as long as the halves are not shorter than ``minBinsize``. Quiet periods are hence
+        covered by few coarse bins, while flares are resolved down to ``minBinsize``.
 
-    def getSupportedCatalogs(self):
-        """It returns a list of filepaths corresponding to the supported catalogs you can load.
+        When a bin is split, the counts and exposure maps of the second half are computed as the difference between the maps
+        of the parent bin and the maps of the first half (counts and exposure are additive in time): only its gas and int maps are generated.
+
+        Args:
+            sourceName (str): the name of the source under analysis.
+            tmin (float, optional): starting point of the light curve. It defaults to None. If None the 'tmin' value of the configuration file will be used.
+            tmax (float, optional): ending point of the light curve. It defaults to None. If None the 'tmax' value of the configuration file will be used.
+            timetype (str, optional): the time format ('MJD' or 'TT'). It defaults to None. If None the 'timetype' value of the configuration file will be used.
+            binsize (int, optional): size of the initial (coarse) temporal bins. It defaults to 604800 (one week).
+            minBinsize (int, optional): minimum size of the temporal bins. It defaults to 86400.
+            sqrtTSThreshold (float, optional): the bins where the source has sqrt(TS) greater than this value are split. It defaults to 3.0.
 
         Returns:
-            A List of filepaths.
+            The absolute path to the light curve data output file.
         """
-        return self.sourcesLibrary.getSupportedCatalogs()
+        timeStart = time()
 
-    def loadSourcesFromCatalog(self, catalogName, rangeDist = (0, float("inf")), show=False):
-        """It loads the sources from a catalog.
+        if not tmin or not tmax or not timetype:
+            tmin = self.config.getOptionValue("tmin")
+            tmax = self.config.getOptionValue("tmax")
+            timetype = self.config.getOptionValue("timetype")
+            self.logger.info(self, f"Using the tmin {tmin}, tmax {tmax}, timetype {timetype} from the configuration file.")
 
-        You can also specify a rangeDist argument to filter out the sources which distance from (glon, glat) is not in the rangeDist interval.
+        if timetype == "MJD":
+            tmin = AstroUtils.time_mjd_to_tt(tmin)
+            tmax = AstroUtils.time_mjd_to_tt(tmax)
 
-        If the catalog is 2AGL and if the energy range (emin, emax) specified by the user in the configuration file is different from the catalog's energy range,
-        the flux of every source will be scaled.
+        tmin = int(tmin)
+        tmax = int(tmax)
 
-        Args:
-            catalogName (str): the catalog name (2AGL, 4FGL).
-            rangeDist (tuple, optional): a interval (min, max) of distances (degree). It defaults to (0, +inf).
-        Raises:
-            FileNotFoundError: if the catalog is not supported.
-            SourceModelFormatNotSupported: if the input file format is not supported.
-            SourcesFileLoadingError: if any error occurs during the parsing of the sources file.
+        configBKP = AgilepyConfig.getCopy(self.config)
 
-        Returns:
-            The List of sources that have been succesfully loaded into the SourcesLibrary.
-        """
-        return self.sourcesLibrary.loadSourcesFromCatalog(catalogName, rangeDist, show = show)
+        bins = self._clipLightCurveBins([ (t1, min(t1+binsize, tmax)) for t1 in range(tmin, tmax, binsize) ], configBKP)
+        tstart = bins[0][0]
+        tstop = bins[-1][1]
 
-    def loadSourcesFromFile(self, sourcesFilepath, rangeDist = (0, float("inf")), show=False):
-        """It loads the sources, reading them from a file. Three different types \
-        of format are supported: AGILE format (.txt), XML format (.xml) and AGILE catalog files (.multi).
+        self.logger.info(self,"[LC] Number of initial temporal bins: %d. tstart=%f tstop=%f", len(bins), tstart, tstop)
 
-        You can also specify a rangeDist argument to filter out the sources which distance from (glon, glat) is not in the rangeDist interval.
+        lcAnalysisDataDir = Path(self.config.getOptionValue("outdir")).joinpath("lc_adaptive")
 
-        Args:
-            sourcesFilePath (str): a relative or absolute path to a file containing the description of the sources. \
-            rangeDist (tuple): a interval (min, max) of distances (degree)
-        Raises:
-            SourceModelFormatNotSupported: if the input file format is not supported.
-            SourcesFileLoadingError: if any error occurs during the parsing of the sources file.
+        if lcAnalysisDataDir.exists() and lcAnalysisDataDir.is_dir():
+            self.logger.info(self, "The directory %s already exists. Removing it..", str(lcAnalysisDataDir))
+            rmtree(lcAnalysisDataDir)
 
-        Returns:
-            The List of sources that have been succesfully loaded into the SourcesLibrary.
-        """
-        return self.sourcesLibrary.loadSourcesFromFile(sourcesFilepath, rangeDist, show = show)
+        lcRows = []
 
-    def selectSources(self, selection, show=False):
-        """It returns the sources matching the selection criteria from the ``sourcesLibrary``.
+        def analyseBin(t1, t2, parentMaplist = None, siblingMaplist = None):
 
-        The sources can be selected with the ``selection`` argument, supporting either ``lambda functions`` and
-        ``boolean expression strings``.
+            self.logger.info(self,"[LC] Analysis of temporal bin: [%f,%f]", t1, t2)
 
-        The selection criteria can be expressed using the following ``Source`` class's parameters:
+            binOutDir = str(lcAnalysisDataDir.joinpath(f"bin_{t1}_{t2}"))
 
-        - name: the unique code identifying the source.
-        - dist: the distance of the source from the center of the maps.
-        - flux: the flux value.
-        - sqrtTS: the radix square of the ts.
+            combineMaps = None
 
-        Warning:
+            if parentMaplist is not None:
 
-            The sqrtTS parameter is available only after the maximum likelihood estimation analysis is performed.
+                def combineMaps(idx, ctsMapPath, expMapPath):
+                    SkyMap.read(parentMaplist.ctsMap[idx]).subtract(SkyMap.read(siblingMaplist.ctsMap[idx])).write(ctsMapPath)
+                    SkyMap.read(parentMaplist.expMap[idx]).subtract(SkyMap.read(siblingMaplist.expMap[idx])).write(expMapPath)
 
-        Args:
-            selection (lambda or str): a lambda function or a boolean expression string specifying the selection criteria.
-            quiet (boolean) (optional default=False): if quiet is True, the method will not console log the selected sources.
+            maplistObj, sourceFiles = self._computeLcBinProducts(configBKP, binOutDir, t1, t2, combineMaps)
 
-        Returns:
-            List of sources.
-        """
+            sourceFile = [ sf for sf in sourceFiles if sourceName in basename(sf) ]
+
+            if not sourceFile:
+                raise SourceNotFound(f"AG_multi did not produce the .source file of {sourceName} in the temporal bin [{t1}, {t2}]")
+
+            lcDataDict = self._extractLightCurveDataFromSourceFile(sourceFile[0])
+
+            halfBinsize = (t2 - t1) // 2
+
+            if float(lcDataDict["sqrt(ts)"]) > sqrtTSThreshold and halfBinsize >= minBinsize:
+
+                self.logger.info(self,"[LC] sqrt(TS) %s > %s: splitting the temporal bin [%f,%f]", lcDataDict["sqrt(ts)"], sqrtTSThreshold, t1, t2)
+
+                firstHalfMaplist = analyseBin(t1, t1+halfBinsize)
+                analyseBin(t1+halfBinsize, t2, maplistObj, firstHalfMaplist)
+
+            else:
+                lcRows.append((t1, AGAnalysis._formatLightCurveRow(lcDataDict, t1, t2)))
+
+            return maplistObj
+
+        for t1, t2 in bins:
+            analyseBin(t1, t2)
+
+        lcData = AGAnalysis.LIGHT_CURVE_HEADER + "".join([row for _, row in sorted(lcRows)])
+
+        self.logger.debug(self, "\n%s", lcData)
+
+        self.logger.info(self, "[LC] Number of temporal bins: %d", len(lcRows))
+
+        lcOutputFilePath = Path(lcAnalysisDataDir).joinpath(f"light_curve_adaptive_{tstart}_{tstop}.txt")
+
+        with open(lcOutputFilePath, "w") as lco:
+            lco.write(lcData)
+
+        self.logger.info(self, "Light curve created in %s", lcOutputFilePath)
+
+        self.logger.info(self, "Took %f seconds.", time()-timeStart)
+
+        self.lightCurveData = str(lcOutputFilePath)
+
+        return str(lcOutputFilePath)
+
+
+    @traced("api")
+    def slidingWindowLightCurve(self, sourceName, tmin = None, tmax = None, timetype = None, windowSize = 172800, step = 43200):
+        """It generates a cvs file containing the data for a light curve plot with overlapping temporal windows
+        (e.g. 2-day windows stepped by 12 hours).
+
+        The counts and exposure maps are generated once per elementary sub-bin, whose size is the greatest common divisor
+        of ``windowSize`` and ``step``. The counts and exposure maps of each window are the sum of the maps of its sub-bins
+        (counts and exposure are additive in time): only the gas and int maps of the windows are generated.
+
+        Args:
+            sourceName (str): the name of the source under analysis.
+            tmin (float, optional): starting point of the light curve. It defaults to None. If None the 'tmin' value of the configuration file will be used.
+            tmax (float, optional): ending point of the light curve. It defaults to None. If None the 'tmax' value of the configuration file will be used.
+            timetype (str, optional): the time format ('MJD' or 'TT'). It defaults to None. If None the 'timetype' value of the configuration file will be used.
+            windowSize (int, optional): size of the temporal windows. It defaults to 172800 (two days).
+            step (int, optional): temporal distance between the start of two consecutive windows. It defaults to 43200 (12 hours).
+
+        Returns:
+            The absolute path to the light curve data output file.
+        """
+        timeStart = time()
+
+        if not tmin or not tmax or not timetype:
+            tmin = self.config.getOptionValue("tmin")
+            tmax = self.config.getOptionValue("tmax")
+            timetype = self.config.getOptionValue("timetype")
+            self.logger.info(self, f"Using the tmin {tmin}, tmax {tmax}, timetype {timetype} from the configuration file.")
+
+        if timetype == "MJD":
+            tmin = AstroUtils.time_mjd_to_tt(tmin)
+            tmax = AstroUtils.time_mjd_to_tt(tmax)
+
+        tmin = int(tmin)
+        tmax = int(tmax)
+
+        configBKP = AgilepyConfig.getCopy(self.config)
+
+        (_, last, _) = AgilepyConfig._getFirstAndLastLineInFile(configBKP.getConf("input", "evtfile"))
+        idxTmax = float(AgilepyConfig._extractTimes(last)[1])
+
+        if tmax > idxTmax:
+            self.logger.warning(self, f"[LC] The light curve analysis range [{tmin}, {tmax}] falls outside the range of the available data [.. , {idxTmax}]. tmax is reduced to {idxTmax}")
+            tmax = int(idxTmax)
+
+        windows = [ (t1, t1+windowSize) for t1 in range(tmin, tmax-windowSize+1, step) ]
+
+        if not windows:
+            self.logger.critical(self, "The window size %d is greater than the light curve range [%d, %d]", windowSize, tmin, tmax)
+            raise ValueError(f"The window size {windowSize} is greater than the light curve range [{tmin}, {tmax}]")
+
+        subBinsize = gcd(windowSize, step)
+        subBins = [ (t1, t1+subBinsize) for t1 in range(tmin, windows[-1][1], subBinsize) ]
+        subBinsPerWindow = windowSize // subBinsize
+        subBinsPerStep = step // subBinsize
+
+        self.logger.info(self,"[LC] Number of windows: %d, number of sub-bins: %d (sub-bin size: %d)", len(windows), len(subBins), subBinsize)
+
+        lcAnalysisDataDir = Path(self.config.getOptionValue("outdir")).joinpath("lc_sliding")
+
+        if lcAnalysisDataDir.exists() and lcAnalysisDataDir.is_dir():
+            self.logger.info(self, "The directory %s already exists. Removing it..", str(lcAnalysisDataDir))
+            rmtree(lcAnalysisDataDir)
+
+        # counts and exposure maps of the sub-bins: subBinsMaps[subBinIdx][mapIdx] = (ctsMapPath, expMapPath)
+        subBinsMaps = []
+
+        for idx, (t1, t2) in enumerate(subBins):
+
+            self.logger.info(self,"[LC] Maps generation of sub-bin: [%f,%f] %d/%d", t1, t2, idx+1, len(subBins))
+
+            configBKP.setOptions(filenameprefix="lc_subbin", outdir = str(lcAnalysisDataDir.joinpath("subbins", f"bin_{t1}_{t2}")))
+            configBKP.setOptions(tmin = t1, tmax = t2, timetype = "TT")
+
+            subBinMaps = []
+
+            for ctsMapGenerator, expMapGenerator, _, _, _ in self._prepareMapsGeneration(configBKP):
+
+                f1 = ctsMapGenerator.call()
+                self.logger.info(self, "Science tool ctsMapGenerator produced:\n %s", f1)
+
+                f2 = expMapGenerator.call()
+                self.logger.info(self, "Science tool expMapGenerator produced:\n %s", f2)
+
+                subBinMaps.append((ctsMapGenerator.outfilePath, expMapGenerator.outfilePath))
+
+            subBinsMaps.append(subBinMaps)
+
+        lcData = AGAnalysis.LIGHT_CURVE_HEADER
+
+        for idx, (t1, t2) in enumerate(windows):
+
+            self.logger.info(self,"[LC] Analysis of window: [%f,%f] %d/%d", t1, t2, idx+1, len(windows))
+
+            windowSubBinsMaps = subBinsMaps[idx*subBinsPerStep : idx*subBinsPerStep+subBinsPerWindow]
+
+            def combineMaps(mapIdx, ctsMapPath, expMapPath):
+                SkyMap.stack([SkyMap.read(maps[mapIdx][0]) for maps in windowSubBinsMaps]).write(ctsMapPath)
+                SkyMap.stack([SkyMap.read(maps[mapIdx][1]) for maps in windowSubBinsMaps]).write(expMapPath)
+
+            binOutDir = str(lcAnalysisDataDir.joinpath(f"window_{t1}_{t2}"))
+
+            _, sourceFiles = self._computeLcBinProducts(configBKP, binOutDir, t1, t2, combineMaps)
+
+            sourceFile = [ sf for sf in sourceFiles if sourceName in basename(sf) ]
+
+            if not sourceFile:
+                raise SourceNotFound(f"AG_multi did not produce the .source file of {sourceName} in the window [{t1}, {t2}]")
+
+            lcData += AGAnalysis._formatLightCurveRow(self._extractLightCurveDataFromSourceFile(sourceFile[0]), t1, t2)
+
+        self.logger.debug(self, "\n%s", lcData)
+
+        lcOutputFilePath = Path(lcAnalysisDataDir).joinpath(f"light_curve_sliding_{windows[0][0]}_{windows[-1][1]}.txt")
+
+        with open(lcOutputFilePath, "w") as lco:
+            lco.write(lcData)
+
+        self.logger.info(self, "Light curve created in %s", lcOutputFilePath)
+
+        self.logger.info(self, "Took %f seconds.", time()-timeStart)
+
+        self.lightCurveData = str(lcOutputFilePath)
+
+        return str(lcOutputFilePath)
+
+
+    @traced("api")
+    def tsMap(self, size = 4.0, step = 0.5, sourceDict = None, concurrentPoints = None):
+        """It computes a TS map and a flux upper limit map over a square grid of positions centred on the (glon, glat) of the configuration.
+
+        The maps are generated once, large enough to contain the analysis region (``ranal``) of every grid position.
+        Then AG_multi runs once per grid position, with a test point source (free flux, fixed position) added to the
+        sources library: the runs are concurrent and they share the maps and the background coefficients of the configuration
+        (e.g. the ones estimated by ``calcBkg()``).
+
+        Args:
+            size (float, optional): the side of the grid in degrees. It defaults to 4.
+            step (float, optional): the distance between two grid positions in degrees (the pixel size of the output maps). It defaults to 0.5.
+            sourceDict (dict, optional): the spectrum of the test source (see ``addSource()``, glon and glat are not needed). It defaults to None: \
+                a power law with index 2.1.
+            concurrentPoints (int, optional): number of grid positions analysed concurrently. It defaults to None: ProcessWrapper.maxConcurrency.
+
+        Returns:
+            The absolute paths to the TS map and to the flux upper limit map (FITS files). The positions where AG_multi failed are NaN.
+
+        Example:
+            >>> aganalysis.calcBkg("2AGLJ2021+4029")
+            >>> tsMapPath, ulMapPath = aganalysis.tsMap(size=2, step=0.25)
+        """
+        timeStart = time()
+
+        if sourceDict is None:
+            sourceDict = {"spectrumType" : "PowerLaw", "flux" : 100e-08, "index" : 2.1}
+
+        if concurrentPoints is None:
+            concurrentPoints = ProcessWrapper.maxConcurrency
+
+        tsMapDataDir = Path(self.config.getOptionValue("outdir")).joinpath("tsmap")
+
+        if tsMapDataDir.exists() and tsMapDataDir.is_dir():
+            self.logger.info(self, "The directory %s already exists. Removing it..", str(tsMapDataDir))
+            rmtree(tsMapDataDir)
+
+        configBKP = AgilepyConfig.getCopy(self.config)
+        configBKP.setOptions(filenameprefix="tsmap", outdir=str(tsMapDataDir))
+
+        mapsize = size + 2*configBKP.getOptionValue("ranal")
+
+        if configBKP.getOptionValue("mapsize") < mapsize:
+            self.logger.info(self, "[TS] The map size is increased to %f to contain the analysis region of every grid position", mapsize)
+            configBKP.setOptions(mapsize=mapsize)
+
+        maplistObj = MapList(self.logger)
+
+        maplistFilePath = self.generateMaps(config = configBKP, maplistObj = maplistObj)
+
+        # the output maps have the projection of the counts maps, with the grid step as pixel size
+        npix = max(1, int(round(size / step)))
+
+        header = SkyMap.read(maplistObj.ctsMap[0]).header
+        header["NAXIS1"] = npix
+        header["NAXIS2"] = npix
+        header["CRPIX1"] = (npix + 1) / 2
+        header["CRPIX2"] = (npix + 1) / 2
+        header["CDELT1"] = -step
+        header["CDELT2"] = step
+        header["MINENG"] = min(energyBin[0] for energyBin in configBKP.getOptionValue("energybins"))
+        header["MAXENG"] = max(energyBin[1] for energyBin in configBKP.getOptionValue("energybins"))
+
+        tsSkyMap = SkyMap(data=np.full((npix, npix), np.nan), header=header)
+        ulSkyMap = SkyMap(data=np.full((npix, npix), np.nan), header=header.copy())
+
+        ys, xs = np.mgrid[0:npix, 0:npix]
+        glons, glats = tsSkyMap.wcs.pixel_to_world_values(xs, ys)
+
+        self.logger.info(self, "[TS] Number of grid positions: %d (%dx%d)", npix*npix, npix, npix)
+
+        pointsSemaphore = asyncio.Semaphore(concurrentPoints)
+
+        async def analysePoint(x, y):
+
+            async with pointsSemaphore:
+
+                testSourceName = f"TSMAP_{x}_{y}"
+
+                testSource = self.sourcesLibrary._sourceFromDict(testSourceName, dict(sourceDict, glon=glons[y, x] % 360, glat=glats[y, x]))
+                self.sourcesLibrary.fixSource(testSource)
+                testSource.setFreeAttributeValueOf("flux", 1)
+
+                sourceListFilePath = self.sourcesLibrary.writeToFile(outfileNamePrefix=str(tsMapDataDir.joinpath(f"sourceLibrary_{x}_{y}")), \
+                                                                      fileformat="txt", sources=self.sourcesLibrary.getSources()+[testSource])
+
+                # every grid position needs its own AG_multi outfile (and .log/.reg/.ell files)
+                pointConfig = AgilepyConfig.getCopy(configBKP)
+                pointConfig.setOptions(filenameprefix=f"tsmap_{x}_{y}")
+                pointConfig.addOptions("selection", maplist=maplistFilePath, sourcelist=sourceListFilePath, multisources=[testSourceName])
+
+                multi = Multi("AG_multi", self.logger, self.tracer)
+                multi.configureTool(pointConfig)
+
+                try:
+                    sourceFiles = await multi.callAsync()
+                except (ScienceToolErrorCodeReturned, ScienceToolProductNotFound) as e:
+                    self.logger.warning(self, "[TS] AG_multi failed for the grid position (%f, %f): %s", glons[y, x], glats[y, x], e)
+                    return
+
+                multiOutput = self.sourcesLibrary.parseSourceFile(sourceFiles[0])
+
+                tsSkyMap.data[y, x] = float(multiOutput.get("multiSqrtTS"))**2
+                ulSkyMap.data[y, x] = float(multiOutput.get("multiUL"))
+
+        async def analysePoints():
+            await asyncio.gather(*[analysePoint(x, y) for y in range(npix) for x in range(npix)])
+
+        AGAnalysis._runCoroutine(analysePoints())
+
+        tsSkyMap.header["BUNIT"] = "TS"
+        ulSkyMap.header["BUNIT"] = "ph/cm2/s"
+
+        tsMapFilePath = tsSkyMap.write(tsMapDataDir.joinpath("ts_map.fits"))
+        ulMapFilePath = ulSkyMap.write(tsMapDataDir.joinpath("ul_map.fits"))
+
+        self.logger.info(self, "TS map created in %s, flux upper limit map created in %s", tsMapFilePath, ulMapFilePath)
+
+        self.logger.info(self, "Took %f seconds.", time()-timeStart)
+
+        return tsMapFilePath, ulMapFilePath
+
+    ############################################################################
+    # sources management                                                       #
+    ############################################################################
+
+    def getSupportedCatalogs(self):
+        """It returns a list of filepaths corresponding to the supported catalogs you can load.
+
+        Returns:
+            A List of filepaths.
+        """
+        return self.sourcesLibrary.getSupportedCatalogs()
+
+    def loadSourcesFromCatalog(self, catalogName, rangeDist = (0, float("inf")), show=False):
+        """It loads the sources from a catalog.
+
+        You can also specify a rangeDist argument to filter out the sources which distance from (glon, glat) is not in the rangeDist interval.
+
+        If the catalog is 2AGL and if the energy range (emin, emax) specified by the user in the configuration file is different from the catalog's energy range,
+        the flux of every source will be scaled.
+
+        Args:
+            catalogName (str): the catalog name (2AGL, 4FGL).
+            rangeDist (tuple, optional): a interval (min, max) of distances (degree). It defaults to (0, +inf).
+        Raises:
+            FileNotFoundError: if the catalog is not supported.
+            SourceModelFormatNotSupported: if the input file format is not supported.
+            SourcesFileLoadingError: if any error occurs during the parsing of the sources file.
+
+        Returns:
+            The List of sources that have been succesfully loaded into the SourcesLibrary.
+        """
+        return self.sourcesLibrary.loadSourcesFromCatalog(catalogName, rangeDist, show = show)
+
+    def loadSourcesFromFile(self, sourcesFilepath, rangeDist = (0, float("inf")), show=False):
+        """It loads the sources, reading them from a file. Three different types \
+        of format are supported: AGILE format (.txt), XML format (.xml) and AGILE catalog files (.multi).
+
+        You can also specify a rangeDist argument to filter out the sources which distance from (glon, glat) is not in the rangeDist interval.
+
+        Args:
+            sourcesFilePath (str): a relative or absolute path to a file containing the description of the sources. \
+            rangeDist (tuple): a interval (min, max) of distances (degree)
+        Raises:
+            SourceModelFormatNotSupported: if the input file format is not supported.
+            SourcesFileLoadingError: if any error occurs during the parsing of the sources file.
+
+        Returns:
+            The List of sources that have been succesfully loaded into the SourcesLibrary.
+        """
+        return self.sourcesLibrary.loadSourcesFromFile(sourcesFilepath, rangeDist, show = show)
+
+    def selectSources(self, selection, show=False):
+        """It returns the sources matching the selection criteria from the ``sourcesLibrary``.
+
+        The sources can be selected with the ``selection`` argument, supporting either ``lambda functions`` and
+        ``boolean expression strings``.
+
+        The selection criteria can be expressed using the following ``Source`` class's parameters:
+
+        - name: the unique code identifying the source.
+        - dist: the distance of the source from the center of the maps.
+        - flux: the flux value.
+        - sqrtTS: the radix square of the ts.
+
+        Warning:
+
+            The sqrtTS parameter is available only after the maximum likelihood estimation analysis is performed.
+
+        Args:
+            selection (lambda or str): a lambda function or a boolean expression string specifying the selection criteria.
+            quiet (boolean) (optional default=False): if quiet is True, the method will not console log the selected sources.
+
+        Returns:
+            List of sources.
+        """
         return self.sourcesLibrary.selectSources(selection, show =show)
 
     def getSources(self):
@@ -1157,6 +1662,144 @@ mle:
     ############################################################################
 
 
+    def _prepareMapsGeneration(self, configBKP):
+        """
+        It configures the science tools generating the maps of each (fov bin, energy bin) pair.
+
+        Returns:
+            A list of (ctsMapGenerator, expMapGenerator, gasMapGenerator, intMapGenerator, maplistRow) tuples.
+        """
+        fovbinnumber = configBKP.getOptionValue("fovbinnumber")
+        energybins = configBKP.getOptionValue("energybins")
+
+        initialFovmin = configBKP.getOptionValue("fovradmin")
+        initialFovmax = configBKP.getOptionValue("fovradmax")
+        initialFileNamePrefix = configBKP.getOptionValue("filenameprefix")
+
+        mapsGenerators = []
+
+        for stepi in range(0, fovbinnumber):
+
+            if fovbinnumber == 1:
+                bincenter = 30
+                fovmin = initialFovmin
+                fovmax = initialFovmax
+            else:
+                bincenter, fovmin, fovmax = AGAnalysis._updateFovMinMaxValues(fovbinnumber, initialFovmin, initialFovmax, stepi+1)
+
+
+            for bgCoeffIdx, stepe in enumerate(energybins):
+
+                if Parameters.checkEnergyBin(stepe):
+
+                    emin = stepe[0]
+                    emax = stepe[1]
+
+                    skymapL = Parameters.getSkyMap(emin, emax)
+                    skymapH = Parameters.getSkyMap(emin, emax)
+                    fileNamePrefix = Parameters.getMapNamePrefix(emin, emax, stepi+1)
+
+                    self.logger.debug(self, "Map generation => fovradmin %s fovradmax %s bincenter %s emin %s emax %s fileNamePrefix %s skymapL %s skymapH %s", \
+                                       fovmin,fovmax,bincenter,emin,emax,fileNamePrefix,skymapL,skymapH)
+
+                    configBKP.setOptions(filenameprefix=initialFileNamePrefix+"_"+fileNamePrefix)
+                    configBKP.setOptions(fovradmin=fovmin, fovradmax=fovmax)
+                    configBKP.addOptions("selection", emin=emin, emax=emax)
+                    configBKP.addOptions("maps", skymapL=skymapL, skymapH=skymapH)
+
+
+                    ctsMapGenerator = CtsMapGenerator("AG_ctsmapgen", self.logger, self.tracer)
+                    expMapGenerator = ExpMapGenerator("AG_expmapgen", self.logger, self.tracer)
+                    gasMapGenerator = GasMapGenerator("AG_gasmapgen", self.logger, self.tracer)
+                    intMapGenerator = IntMapGenerator("AG_intmapgen", self.logger, self.tracer)
+
+                    ctsMapGenerator.configureTool(configBKP)
+                    expMapGenerator.configureTool(configBKP)
+                    gasMapGenerator.configureTool(configBKP, {"expMapGeneratorOutfilePath": expMapGenerator.outfilePath})
+                    intMapGenerator.configureTool(configBKP, {"expMapGeneratorOutfilePath": expMapGenerator.outfilePath, "ctsMapGeneratorOutfilePath" : ctsMapGenerator.outfilePath})
+
+                    configBKP.addOptions("maps", expmap=expMapGenerator.outfilePath, ctsmap=ctsMapGenerator.outfilePath)
+
+                    if not ctsMapGenerator.allRequiredOptionsSet(configBKP) or \
+                       not expMapGenerator.allRequiredOptionsSet(configBKP) or \
+                       not gasMapGenerator.allRequiredOptionsSet(configBKP) or \
+                       not intMapGenerator.allRequiredOptionsSet(configBKP):
+
+                        raise ScienceToolInputArgMissing("Some options have not been set.")
+
+                    maplistRow = (ctsMapGenerator.outfilePath, \
+                                  expMapGenerator.outfilePath, \
+                                  gasMapGenerator.outfilePath, \
+                                  str(bincenter), \
+                                  str(configBKP.getOptionValue("galcoeff")[bgCoeffIdx]), \
+                                  str(configBKP.getOptionValue("isocoeff")[bgCoeffIdx])
+                                 )
+
+                    mapsGenerators.append((ctsMapGenerator, expMapGenerator, gasMapGenerator, intMapGenerator, maplistRow))
+
+                else:
+                    self.logger.warning(self,"Energy bin [%s, %s] is not supported. Map generation skipped.", stepe[0], stepe[1])
+
+        return mapsGenerators
+
+    def _writeMaplistFile(self, configBKP, maplistObjBKP, initialFileNamePrefix, mapsGenerators):
+
+        for *_, maplistRow in mapsGenerators:
+            maplistObjBKP.addRow(*maplistRow)
+
+        outdir = configBKP.getOptionValue("outdir")
+
+        maplistObjBKP.setFile(Path(outdir).joinpath(initialFileNamePrefix))
+
+        maplistFilePath = maplistObjBKP.writeToFile()
+
+        self.logger.info(self, "Maplist file created in %s", maplistFilePath)
+
+        return maplistFilePath
+
+    def _prepareMle(self, maplistFilePath, configBKP):
+        """
+        It writes the sources library on file (in the output directory of configBKP) and configures AG_multi.
+        """
+        if not maplistFilePath and self.currentMapList.getFile() is None:
+
+            raise MaplistIsNone("No 'maplist' files found. Please, pass a valid path to a maplist \
+                                 file as argument or call generateMaps(). ")
+
+        if not maplistFilePath:
+
+            maplistFilePath = self.currentMapList.getFile()
+
+        multi = Multi("AG_multi", self.logger, self.tracer)
+
+        sourceListFilename = "sourceLibrary"+(str(multi.callCounter).zfill(5))
+        sourceListAgileFormatFilePath = self.sourcesLibrary.writeToFile(outfileNamePrefix=join(configBKP.getConf("output","outdir"), sourceListFilename), fileformat="txt")
+
+        configBKP.addOptions("selection", maplist=maplistFilePath, sourcelist=sourceListAgileFormatFilePath)
+
+        multisources = self.sourcesLibrary.getSourcesNames()
+        configBKP.addOptions("selection", multisources=multisources)
+
+
+        multi.configureTool(configBKP)
+
+        return multi
+
+    def _collectMleResults(self, sourceFiles, updateSourceLibrary):
+
+        if len(sourceFiles) == 0:
+            self.logger.warning(self, "The number of .source files is 0.")
+
+        self.logger.info(self,"AG_multi produced: %s", sourceFiles)
+
+        if updateSourceLibrary:
+
+            for sourceFile in sourceFiles:
+
+                multiOutputData = self.sourcesLibrary.parseSourceFile(sourceFile)
+
+                self.sourcesLibrary.updateMulti(multiOutputData)
+
     @staticmethod
     def _updateFovMinMaxValues(fovbinnumber, fovradmin, fovradmax, stepi):
         # print("\nfovbinnumber {}, fovradmin {}, fovradmax {}, stepi {}".format(fovbinnumber, fovradmin, fovradmax, stepi))
@@ -1174,11 +1817,14 @@ mle:
 
         return bincenter, fovmin, fovmax
 
-    def _computeLcBin(self, threadID, bins, configBKP, lcAnalysisDataDir, logsOutDir, logFilenamePrefix, verboseLvl):
+    def _computeLcBin(self, workerID, bins, configBKP, lcAnalysisDataDir, workersQueue, verboseLvl):
 
+        # the messages of this worker process are written by the logger of the parent process
         logger = AgilepyLogger()
 
-        logger.initialize(logsOutDir, logFilenamePrefix, verboseLvl)
+        logger.initializeWorker(workersQueue, f"worker_{workerID}", verboseLvl)
+
+        self._setLogger(logger)
 
         # outputs = []
 
@@ -1196,6 +1842,134 @@ mle:
 
             _ = self.mle(maplistFilePath = maplistFilePath, config = configBKP, updateSourceLibrary = False)
 
+    def _clipLightCurveBins(self, bins, configBKP):
+        """
+        It reduces the last bin to the end of the available data.
+        """
+        (_, last, _) = AgilepyConfig._getFirstAndLastLineInFile(configBKP.getConf("input", "evtfile"))
+        idxTmax = float(AgilepyConfig._extractTimes(last)[1])
+
+        for idx, bin in enumerate(bins):
+
+            t1 = bin[0]
+            t2 = bin[1]
+
+            if t2 > idxTmax:
+                newbinsize = idxTmax - t1
+                self.logger.warning(self, f"[LC] The last bin [{t1}, {t2}] of the light curve analysis falls outside the range of the available data [.. , {idxTmax}]. The binsize is reduced to {newbinsize} seconds, the new bin is [{t1}, {idxTmax}]")
+                bins[idx] = (t1, idxTmax)
+
+        return bins
+
+    def _computeLcBinProducts(self, configBKP, binOutDir, t1, t2, combineMaps = None):
+        """
+        It generates the maps of a light curve bin and it runs the mle analysis on them.
+        If combineMaps is given, the counts and exposure maps are computed from existing maps
+        (see _generateDerivedMaps()) instead of running the science tools.
+
+        Returns:
+            The MapList object of the bin and the list of the .source files.
+        """
+        configBKP.setOptions(filenameprefix="lc_analysis", outdir = binOutDir)
+        configBKP.setOptions(tmin = t1, tmax = t2, timetype = "TT")
+
+        maplistObj = MapList(self.logger)
+
+        if combineMaps is None:
+            maplistFilePath = self.generateMaps(config = configBKP, maplistObj=maplistObj)
+        else:
+            maplistFilePath = self._generateDerivedMaps(configBKP, maplistObj, combineMaps)
+
+        configBKP.setOptions(filenameprefix="lc_analysis", outdir = binOutDir)
+        configBKP.setOptions(tmin = t1, tmax = t2, timetype = "TT")
+        sourceFiles = self.mle(maplistFilePath = maplistFilePath, config = configBKP, updateSourceLibrary = False)
+
+        return maplistObj, sourceFiles
+
+    def _generateDerivedMaps(self, configBKP, maplistObj, combineMaps):
+        """
+        It writes the counts and exposure maps calling combineMaps(idx, ctsMapPath, expMapPath)
+        for each (fov bin, energy bin) pair, then it generates the gas and int maps.
+        """
+        initialFileNamePrefix = configBKP.getOptionValue("filenameprefix")
+
+        mapsGenerators = self._prepareMapsGeneration(configBKP)
+
+        for idx, (ctsMapGenerator, expMapGenerator, gasMapGenerator, intMapGenerator, _) in enumerate(mapsGenerators):
+
+            Path(ctsMapGenerator.outputDir).mkdir(parents=True, exist_ok=True)
+
+            combineMaps(idx, ctsMapGenerator.outfilePath, expMapGenerator.outfilePath)
+            self.logger.info(self, "Counts and exposure maps computed from existing maps:\n %s %s", ctsMapGenerator.outfilePath, expMapGenerator.outfilePath)
+
+            f3 = gasMapGenerator.call()
+            self.logger.info(self, "Science tool gasMapGenerator produced:\n %s", f3)
+
+            f4 = intMapGenerator.call()
+            self.logger.info(self, "Science tool intMapGenerator produced:\n %s", f4)
+
+        return self._writeMaplistFile(configBKP, maplistObj, initialFileNamePrefix, mapsGenerators)
+
+    @staticmethod
+    def _formatLightCurveRow(lcDataDict, time_start_tt, time_end_tt):
+
+        time_start_mjd = AstroUtils.time_tt_to_mjd(time_start_tt)
+        time_end_mjd   = AstroUtils.time_tt_to_mjd(time_end_tt)
+
+        time_start_utc = AstroUtils.time_mjd_to_utc(time_start_mjd)
+        time_end_utc   = AstroUtils.time_mjd_to_utc(time_end_mjd)
+
+        # "time_start_mjd time_end_mjd sqrt(ts) flux flux_err flux_ul gal iso l_peak b_peak dist l b r ell_dist time_start_utc time_end_utc time_start_tt time_end_tt\n"
+
+        return f"{time_start_mjd} {time_end_mjd} {lcDataDict['sqrt(ts)']} {lcDataDict['flux']} {lcDataDict['flux_err']} {lcDataDict['flux_ul']} {lcDataDict['gal']} {lcDataDict['iso']} {lcDataDict['l_peak']} {lcDataDict['b_peak']} {lcDataDict['dist_peak']} {lcDataDict['l']} {lcDataDict['b']} {lcDataDict['r']} {lcDataDict['dist']} {time_start_utc} {time_end_utc} {lcDataDict['time_start_tt']} {lcDataDict['time_end_tt']}\n"
+
+    async def _computeLcBinsAsync(self, bins, configBKP, lcAnalysisDataDir, concurrentBins):
+        """
+        It analyses the light curve bins, 'concurrentBins' at a time. Each bin works on its own copy of the configuration.
+        """
+        binsSemaphore = asyncio.Semaphore(concurrentBins)
+
+        async def computeLcBin(idx, t1, t2):
+
+            async with binsSemaphore:
+
+                self.logger.info(self,"[LC] Analysis of temporal bin: [%f,%f] %d/%d", t1, t2, idx+1, len(bins))
+
+                binOutDir = str(lcAnalysisDataDir.joinpath(f"bin_{t1}_{t2}"))
+
+                binConfig = AgilepyConfig.getCopy(configBKP)
+
+                binConfig.setOptions(filenameprefix="lc_analysis", outdir = binOutDir)
+                binConfig.setOptions(tmin = t1, tmax = t2, timetype = "TT")
+
+                maplistFilePath = await self.generateMapsAsync(config = binConfig, maplistObj = MapList(self.logger))
+
+                binConfig.setOptions(filenameprefix="lc_analysis", outdir = binOutDir)
+                await self.mleAsync(maplistFilePath = maplistFilePath, config = binConfig, updateSourceLibrary = False)
+
+        await asyncio.gather(*[computeLcBin(idx, t1, t2) for idx, (t1, t2) in enumerate(bins)])
+
+    @staticmethod
+    def _runCoroutine(coroutine):
+        """
+        It runs the coroutine until it completes. If an event loop is already running in this thread
+        (e.g. in a jupyter notebook) the coroutine runs in a new event loop in another thread.
+        """
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            return asyncio.run(coroutine)
+
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            return executor.submit(asyncio.run, coroutine).result()
+
+    def _setLogger(self, logger):
+        self.logger = logger
+        self.sourcesLibrary.logger = logger
+        if self._plottingUtils is not None:
+            self._plottingUtils.logger = logger
+        self.currentMapList.logger = logger
+
     @staticmethod
     def _chunkList(lst, num):
         avg = len(lst) / float(num)
@@ -1303,23 +2077,12 @@ mle:
         isoCoeff = multiOutput.get("multiIsoCoeff")
         galCoeff = multiOutput.get("multiGalCoeff")
 
-        self.logger.debug(self, f"Multioutput: {multiOutput}")
+        self.logger.debug(self, "Multioutput: %s", multiOutput)
 
         return isoCoeff, galCoeff
 
 
-    def _displaySkyMaps(self, skyMapType, singleMode, maplistFile=None, smooth=4.0, saveImage=False, fileFormat=".png", title=None, cmap="CMRmap", regFilePath=None, catalogRegions=None, catalogRegionsColor=None):
-
-        if self.currentMapList.getFile() is None and maplistFile is None:
-            self.logger.warning(self, "No sky maps have already been generated yet and maplistFile is None. Please, call generateMaps() or pass a valid maplistFile.")
-            return False
-
-        if self.currentMapList.getFile() is None:
-            maplistRows = self.parseMaplistFile(maplistFile)
-        else:
-            maplistRows = self.parseMaplistFile()
-
-        outputs = []
+    def _getSkyMapsFilesAndTitles(self, skyMapType, maplistRows):
 
         titles = []
         files = []
@@ -1345,6 +2108,23 @@ mle:
 
             files.append(maplistRow[mapIndex])
 
+        return files, titles
+
+    def _displaySkyMaps(self, skyMapType, singleMode, maplistFile=None, smooth=4.0, saveImage=False, fileFormat=".png", title=None, cmap="CMRmap", regFilePath=None, catalogRegions=None, catalogRegionsColor=None):
+
+        if self.currentMapList.getFile() is None and maplistFile is None:
+            self.logger.warning(self, "No sky maps have already been generated yet and maplistFile is None. Please, call generateMaps() or pass a valid maplistFile.")
+            return False
+
+        if self.currentMapList.getFile() is None:
+            maplistRows = self.parseMaplistFile(maplistFile)
+        else:
+            maplistRows = self.parseMaplistFile()
+
+        outputs = []
+
+        files, titles = self._getSkyMapsFilesAndTitles(skyMapType, maplistRows)
+
         if len(files) == 1 and singleMode is True:
             self.logger.warning(self, "singleMode has been turned off because only one map is going to be displayed.")
             singleMode = False
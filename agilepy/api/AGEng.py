@@ -26,16 +26,16 @@
 #along with this program.  If not, see <https://www.gnu.org/licenses/>.
 
 import numpy as np
-from astropy.coordinates import SkyCoord
+from astropy.coordinates import SkyCoord, angular_separation
 from astropy import units as u
 from astropy.io import fits
 from os.path import join
 from pathlib import Path
 
 from agilepy.config.AgilepyConfig import AgilepyConfig
-from agilepy.utils.PlottingUtils import PlottingUtils
 from agilepy.utils.AgilepyLogger import AgilepyLogger
 from agilepy.utils.AstroUtils import AstroUtils
+from agilepy.utils.VisibilityStats import VisibilityStats
 from agilepy.utils.CustomExceptions import WrongCoordinateSystemError
 
 class AGEng:
@@ -50,6 +50,9 @@ class AGEng:
         logger (:obj:`AgilepyLogger`): it is used to log messages with different importance levels.
     """
 
+    # AGILE attitude is collected every 0.1 s
+    ATTITUDE_DELTA_TIME = 0.1
+
     def __init__(self, configurationFilePath):
         """AGEng constructor.
 
@@ -72,9 +75,21 @@ class AGEng:
 
         self.logger = AgilepyLogger()
 
-        self.logger.initialize(self.outdir, self.config.getConf("output","logfilenameprefix"), self.config.getConf("output","verboselvl"))
+        logfileverboselvl, logasync, logfilemaxbytes, logfilebackupcount = \
+            self.config.getOptionValues(["logfileverboselvl", "logasync", "logfilemaxbytes", "logfilebackupcount"])
+
+        self.logger.initialize(self.outdir, self.config.getConf("output","logfilenameprefix"), self.config.getConf("output","verboselvl"), \
+                               asyncMode=logasync, fileDebugLvl=logfileverboselvl, maxBytes=logfilemaxbytes, backupCount=logfilebackupcount)
 
-        self.plottingUtils = PlottingUtils(self.config, self.logger)
+        # matplotlib and the other plotting dependencies are imported only if a plot is produced
+        self._plottingUtils = None
+
+    @property
+    def plottingUtils(self):
+        if self._plottingUtils is None:
+            from agilepy.utils.PlottingUtils import PlottingUtils
+            self._plottingUtils = PlottingUtils(self.config, self.logger)
+        return self._plottingUtils
 
 
     def visibilityPlot(self, tmin, tmax, src_x, src_y, ref, zmax=60, step=1, writeFiles=True, computeHistogram=True, logfilesIndex=None, saveImage=True, fileFormat="png", title="Visibility Plot"):
@@ -114,6 +129,171 @@ class AGEng:
 
         return vis_plot, hist_plot
 
+    def computePointingDistancesFromSources(self, tmin, tmax, src_x, src_y, ref, step=1, logfilesIndex=None):
+        """ It computes the angular separations between the center of the
+        AGILE GRID field of view and several positions in the sky at once.
+        Every log file is read only once, regardless of the number of sources.
+
+        Args:
+            tmin (float): inferior observation time limit to analize.
+            tmax (float): superior observation time limit to analize.
+            src_x (List): sources position x (unit: degrees)
+            src_y (List): sources position y (unit: degrees)
+            ref (str): the reference system of the sources positions ('equ' or 'gal')
+            step (integer): time interval in seconds between 2 consecutive points. Minimum accepted value: 0.1 s.
+            logfilesIndex (str) (optional): the index file for the logs files. If specified it will ovverride the one in the configuration file.
+
+        Returns:
+            separations (np.ndarray): the angular separations (unit: degrees) with shape (number of sources, number of times)
+            ti_tt (np.ndarray):
+            tf_tt (np.ndarray):
+            src_ra (np.ndarray): the sources right ascension (FK5)
+            src_dec (np.ndarray): the sources declination (FK5)
+
+        Example:
+            >>> separations, ti_tt, tf_tt, ra, dec = ageng.computePointingDistancesFromSources(456361778, 456373279, [129.7, 78.2], [3.7, 2.1], "gal", step=10)
+        """
+        self.logger.info(self, "Computing pointing distances from %d sources (%s) in [%f, %f]", len(np.atleast_1d(src_x)), ref, tmin, tmax)
+
+        src_ra, src_dec = self._getSourcesFK5Positions(src_x, src_y, ref, step)
+
+        separations = []
+        ti_tt = []
+        tf_tt = []
+
+        for sep, ti, tf in self._iterPointingDistancesFromSources(tmin, tmax, src_ra, src_dec, step, logfilesIndex):
+            separations.append(sep)
+            ti_tt.append(ti)
+            tf_tt.append(tf)
+
+        if not separations:
+            return np.empty((len(src_ra), 0)), np.empty(0), np.empty(0), src_ra, src_dec
+
+        separations = np.concatenate(separations, axis=1)
+
+        self.logger.debug(self, "Total computed separations: %d x %d", separations.shape[0], separations.shape[1])
+
+        return separations, np.concatenate(ti_tt), np.concatenate(tf_tt), src_ra, src_dec
+
+    def computeVisibilityStats(self, tmin, tmax, src_x, src_y, ref, zmax=60, step=1, logfilesIndex=None):
+        """ It computes, for one or more positions in the sky, the histogram of the off-axis angles,
+        the total observation time and the time spent under zmax. The statistics are accumulated
+        log file by log file, hence the memory usage does not depend on the time range.
+
+        Args:
+            tmin (float): inferior observation time limit to analize.
+            tmax (float): superior observation time limit to analize.
+            src_x (float or List): source(s) position x (unit: degrees)
+            src_y (float or List): source(s) position y (unit: degrees)
+            ref (str): the reference system of the sources positions ('equ' or 'gal')
+            zmax (float): maximum zenith distance of the source to the center of the detector (unit: degrees)
+            step (integer): time interval in seconds between 2 consecutive points. Minimum accepted value: 0.1 s.
+            logfilesIndex (str) (optional): the index file for the logs files. If specified it will ovverride the one in the configuration file.
+
+        Returns:
+            stats (:obj:`VisibilityStats`): the accumulated statistics (one row per source)
+            src_ra (np.ndarray): the sources right ascension (FK5)
+            src_dec (np.ndarray): the sources declination (FK5)
+        """
+        self.logger.info(self, "Computing visibility statistics of %d sources (%s) in [%f, %f]", len(np.atleast_1d(src_x)), ref, tmin, tmax)
+
+        src_ra, src_dec = self._getSourcesFK5Positions(src_x, src_y, ref, step)
+
+        stats = VisibilityStats(zmax, numberOfSources=len(src_ra))
+
+        for sep, ti, tf in self._iterPointingDistancesFromSources(tmin, tmax, src_ra, src_dec, step, logfilesIndex):
+            stats.update(sep, ti, tf)
+
+        self.logger.debug(self, "Total reduced separations: %d", stats.count)
+
+        return stats, src_ra, src_dec
+
+    def visibilityHisto(self, tmin, tmax, src_x, src_y, ref, zmax=60, step=1, logfilesIndex=None, saveImage=True, fileFormat="png", title="Visibility Histogram"):
+        """ It plots the histogram of the off-axis angles of a given position in the sky.
+        Unlike visibilityPlot(), the separations are never kept in memory: the histogram
+        is drawn from the statistics accumulated log file by log file.
+
+        Args:
+            tmin (float): inferior observation time limit to analize.
+            tmax (float): superior observation time limit to analize.
+            src_x (float): source position x (unit: degrees)
+            src_y (float): source position y (unit: degrees)
+            ref (str): the reference system of the source position ('equ' or 'gal')
+            zmax (float): maximum zenith distance of the source to the center of the detector (unit: degrees)
+            step (integer): time interval in seconds between 2 consecutive points. Minimum accepted value: 0.1 s.
+            logfilesIndex (str) (optional): the index file for the logs files. If specified it will ovverride the one in the configuration file.
+            saveImage (bool): If True, the image will be saved on disk
+            fileFormat (str): The output format of the image
+            title (str): The plot title
+
+        Returns:
+            The path to the histogram image.
+        """
+        stats, src_ra, src_dec = self.computeVisibilityStats(tmin, tmax, src_x, src_y, ref, zmax, step, logfilesIndex)
+
+        return self.plottingUtils.visibilityHistoFromStats(stats, src_ra[0], src_dec[0], step, saveImage, self.outdir, fileFormat, title)
+
+    def _getSourcesFK5Positions(self, src_x, src_y, ref, step):
+
+        src_x = np.atleast_1d(np.asarray(src_x, dtype=float))
+        src_y = np.atleast_1d(np.asarray(src_y, dtype=float))
+
+        if src_x.shape != src_y.shape:
+            self.logger.critical(self, "src_x and src_y must have the same length (%d != %d)", len(src_x), len(src_y))
+            raise ValueError("src_x and src_y must have the same length (%d != %d)"%(len(src_x), len(src_y)))
+
+        skyCordsFK5 = self._getSkyCoordsFK5(src_x, src_y, ref)
+
+        if step < 0.1:
+            self.logger.critical(self, "step %f cannot be < 0.1", step)
+            raise ValueError("'step' %f cannot be < 0.1"%(step))
+
+        return skyCordsFK5.ra.deg, skyCordsFK5.dec.deg
+
+    def _iterPointingDistancesFromSources(self, tmin, tmax, src_ra, src_dec, step, logfilesIndex):
+        """
+        It yields, log file by log file, the (separations, ti_tt, tf_tt) arrays. The separations
+        (unit: degrees) have shape (number of sources, number of times of the log file).
+        """
+        if not logfilesIndex:
+            logfilesIndex = self.config.getConf("input", "logfile")
+
+        logFiles = self._getLogsFileInInterval(logfilesIndex, tmin, tmax)
+
+        self.logger.info(self, "%d log files satisfy the interval %f-%f", len(logFiles), tmin, tmax)
+
+        if not logFiles:
+            self.logger.warning(self, "No log files can are compatible with tmin %f and tmax %f", tmin, tmax)
+            return
+
+        total = len(logFiles)
+
+        for idx, logFile in enumerate(logFiles):
+
+            self.logger.info(self, "%d/%d %s", idx+1, total, logFile)
+
+            doTimeMask = idx == 0 or idx == total-1
+
+            TIME, ATTITUDE_RA_Y, ATTITUDE_DEC_Y = self._readAttitudePerFile(doTimeMask, logFile, tmin, tmax, step)
+
+            # (number of sources, 1) vs (1, number of times) => (number of sources, number of times)
+            sep = angular_separation(np.radians(src_ra)[:, np.newaxis], np.radians(src_dec)[:, np.newaxis], \
+                                     np.radians(ATTITUDE_RA_Y)[np.newaxis, :], np.radians(ATTITUDE_DEC_Y)[np.newaxis, :])
+
+            yield np.degrees(sep), TIME, TIME + AGEng.ATTITUDE_DELTA_TIME
+
+    def _getSkyCoordsFK5(self, src_x, src_y, ref):
+
+        if ref == "equ":
+            return SkyCoord(ra=src_x*u.degree, dec=src_y*u.degree, frame='fk5')
+
+        elif ref == "gal":
+            return SkyCoord(l=src_x*u.degree, b=src_y*u.degree, frame='galactic').transform_to('fk5')
+
+        else:
+            self.logger.critical(self, "Reference system '%s' is not supported", ref)
+            raise WrongCoordinateSystemError("Reference system '%s' is not supported" %(ref))
+
     def _computePointingDistancesFromSource(self, tmin, tmax, src_x, src_y, ref, zmax, step, writeFiles, logfilesIndex):
         """ It computes the angular separations between the center of the
         AGILE GRID field of view and the coordinates for a given position in the sky,
@@ -254,6 +434,30 @@ class AGEng:
 
     def _computeSeparationPerFile(self, doTimeMask, logFile, tmin_start, tmax_start, skyCordsFK5, zmax, step):
 
+        TIME, ATTITUDE_RA_Y, ATTITUDE_DEC_Y = self._readAttitudePerFile(doTimeMask, logFile, tmin_start, tmax_start, step)
+
+        # creating arrays filled with zeros
+        src_raz  = np.zeros(len(TIME))
+        src_decz  = np.zeros(len(TIME))
+
+        # filling the just created arrays with our coordinates of interest
+        src_ra   = src_raz + skyCordsFK5.ra
+        src_dec   = src_decz + skyCordsFK5.dec
+
+        c1  = SkyCoord(src_ra, src_dec, unit='deg', frame='icrs')
+        c2  = SkyCoord(ATTITUDE_RA_Y, ATTITUDE_DEC_Y, unit='deg', frame='icrs')
+#        print 'c1=', len(c1), 'c2=', len(c2) # to ensure c1 and c2 have the same length
+        sep = c2.separation(c1)
+
+        self.logger.debug(self, "Number of computed separation: %f"%(len(sep)))
+
+        return np.asfarray(sep), TIME, TIME+AGEng.ATTITUDE_DELTA_TIME
+
+    def _readAttitudePerFile(self, doTimeMask, logFile, tmin_start, tmax_start, step):
+        """
+        It reads the attitude of a log file, returning the (TIME, ATTITUDE_RA_Y, ATTITUDE_DEC_Y)
+        arrays sampled every 'step' seconds.
+        """
         logFile = AgilepyConfig._expandEnvVar(logFile)
         hdulist = fits.open(logFile)
         SC = hdulist[1].data
@@ -289,20 +493,15 @@ class AGEng:
         booleanMaskRA = np.logical_not(np.isnan(ATTITUDE_RA_Y))
         booleanMaskDEC = np.logical_not(np.isnan(ATTITUDE_DEC_Y))
 
-        booleanMaskRADEC = np.logical_or(booleanMaskRA, booleanMaskDEC)
+        # TIME, RA and DEC must keep the same length: a row is skipped if at least one of RA/DEC is NULL
+        booleanMaskRADEC = np.logical_and(booleanMaskRA, booleanMaskDEC)
 
-        TIME = TIME[booleanMaskRA]
+        TIME = TIME[booleanMaskRADEC]
         ATTITUDE_RA_Y= ATTITUDE_RA_Y[booleanMaskRADEC]
         ATTITUDE_DEC_Y= ATTITUDE_DEC_Y[booleanMaskRADEC]
 
         self.logger.debug(self, "Not-null mask RA/DEC (at least one NULL): %d values skipped"%(np.sum(np.logical_not(booleanMaskRADEC))))
 
-
-        deltatime = 0.1 # AGILE attitude is collected every 0.1 s
-
-        # tmin = np.min(TIME)
-        # tmax = np.max(TIME)
-
         index_ti = 0
         index_tf = len(TIME)-1
 
@@ -313,24 +512,9 @@ class AGEng:
 
         self.logger.debug(self, "indexstep is: %f",indexstep)
 
-        # creating arrays filled with zeros
-        src_raz  = np.zeros(len(TIME[index_ti:index_tf:indexstep]))
-        src_decz  = np.zeros(len(TIME[index_ti:index_tf:indexstep]))
-
         self.logger.debug(self, "Number of separations to be computed: %f", index_tf/indexstep)
 
-        # filling the just created arrays with our coordinates of interest
-        src_ra   = src_raz + skyCordsFK5.ra
-        src_dec   = src_decz + skyCordsFK5.dec
-
-        c1  = SkyCoord(src_ra, src_dec, unit='deg', frame='icrs')
-        c2  = SkyCoord(ATTITUDE_RA_Y[index_ti:index_tf:indexstep], ATTITUDE_DEC_Y[index_ti:index_tf:indexstep], unit='deg', frame='icrs')
-#        print 'c1=', len(c1), 'c2=', len(c2) # to ensure c1 and c2 have the same length
-        sep = c2.separation(c1)
-
-        self.logger.debug(self, "Number of computed separation: %f"%(len(sep)))
-
-        return np.asfarray(sep), TIME[index_ti:index_tf:indexstep], TIME[index_ti:index_tf:indexstep]+deltatime
+        return TIME[index_ti:index_tf:indexstep], ATTITUDE_RA_Y[index_ti:index_tf:indexstep], ATTITUDE_DEC_Y[index_ti:index_tf:indexstep]
 
     def _getLogsFileInInterval(self, logfilesIndex, tmin, tmax):
 
@@ -29,11 +29,12 @@ import os
 
 from agilepy.utils.Parameters import Parameters
 from agilepy.utils.ProcessWrapper import ProcessWrapper
+from agilepy.utils.ProductStore import ProductStore
 
 class CtsMapGenerator(ProcessWrapper):
 
-    def __init__(self, exeName, agilepyLogger):
-        super().__init__(exeName, agilepyLogger)
+    def __init__(self, exeName, agilepyLogger, tracer=None):
+        super().__init__(exeName, agilepyLogger, tracer)
 
     def getRequiredOptions(self):
         return ["evtfile", "outdir", "filenameprefix", "emin", "emax", "energybins", "glat", "glon", "tmin", "tmax"]
@@ -47,25 +48,13 @@ class CtsMapGenerator(ProcessWrapper):
 
         self.products = [self.outfilePath]
 
-        self.args = [ self.outfilePath,  \
-                      confDict.getOptionValue("evtfile"), #indexfiler\
-                      confDict.getOptionValue("timelist"), \
-                      confDict.getOptionValue("mapsize"), \
-                      confDict.getOptionValue("binsize"), \
-                      confDict.getOptionValue("glon"), \
-                      confDict.getOptionValue("glat"), \
-                      confDict.getOptionValue("lonpole"), \
-                      confDict.getOptionValue("albedorad"), \
-                      confDict.getOptionValue("phasecode"), \
-                      confDict.getOptionValue("filtercode"), \
-                      confDict.getOptionValue("proj"), \
-                      confDict.getOptionValue("tmin"), \
-                      confDict.getOptionValue("tmax"), \
-                      confDict.getOptionValue("emin"), \
-                      confDict.getOptionValue("emax"), \
-                      confDict.getOptionValue("fovradmin"), \
-                      confDict.getOptionValue("fovradmax"), \
-                    ]
+        self.productStore = ProductStore.getStore(confDict.getOptionValue("productstore"))
+
+        self.args = [ self.outfilePath ] + \
+                    confDict.getOptionValues([ "evtfile", #indexfiler\
+                                               "timelist", "mapsize", "binsize", "glon", "glat", "lonpole", \
+                                               "albedorad", "phasecode", "filtercode", "proj", "tmin", "tmax", \
+                                               "emin", "emax", "fovradmin", "fovradmax" ])
 
 
 
@@ -73,8 +62,8 @@ class CtsMapGenerator(ProcessWrapper):
 
 class ExpMapGenerator(ProcessWrapper):
 
-    def __init__(self, exeName, agilepyLogger):
-        super().__init__(exeName, agilepyLogger)
+    def __init__(self, exeName, agilepyLogger, tracer=None):
+        super().__init__(exeName, agilepyLogger, tracer)
 
 
     def getRequiredOptions(self):
@@ -93,41 +82,30 @@ class ExpMapGenerator(ProcessWrapper):
 
         self.products = [self.outfilePath]
 
+        self.productStore = ProductStore.getStore(confDict.getOptionValue("productstore"))
+
+        logfile, maplistgen, timelist, mapsize, binsize, glon, glat, lonpole, albedorad = \
+            confDict.getOptionValues(["logfile", "maplistgen", "timelist", "mapsize", "binsize", "glon", "glat", "lonpole", "albedorad"])
+
         self.args = [ self.outfilePath,  \
-                      confDict.getOptionValue("logfile"), #indexfiler\
+                      logfile, #indexfiler\
                       Parameters.sarmatrix, \
                       edpmatrix, \
-                      confDict.getOptionValue("maplistgen"), \
-                      confDict.getOptionValue("timelist"), \
-                      confDict.getOptionValue("mapsize"), \
-                      confDict.getOptionValue("binsize"), \
-                      confDict.getOptionValue("glon"), \
-                      confDict.getOptionValue("glat"), \
-                      confDict.getOptionValue("lonpole"), \
-                      confDict.getOptionValue("albedorad"), \
+                      maplistgen, timelist, mapsize, binsize, glon, glat, lonpole, albedorad, \
                       0.5, \
                       360, \
                       5.0, \
-                      confDict.getOptionValue("phasecode"), \
-                      confDict.getOptionValue("proj"), \
-                      confDict.getOptionValue("expstep"), \
-                      confDict.getOptionValue("timestep"), \
-                      confDict.getOptionValue("spectralindex"), \
-                      confDict.getOptionValue("tmin"), \
-                      confDict.getOptionValue("tmax"), \
-                      confDict.getOptionValue("emin"), \
-                      confDict.getOptionValue("emax"), \
-                      confDict.getOptionValue("fovradmin"), \
-                      confDict.getOptionValue("fovradmax"), \
-                    ]
+                    ] + \
+                    confDict.getOptionValues([ "phasecode", "proj", "expstep", "timestep", "spectralindex", \
+                                               "tmin", "tmax", "emin", "emax", "fovradmin", "fovradmax" ])
 
 
 
 
 class GasMapGenerator(ProcessWrapper):
 
-    def __init__(self, exeName, agilepyLogger):
-        super().__init__(exeName, agilepyLogger)
+    def __init__(self, exeName, agilepyLogger, tracer=None):
+        super().__init__(exeName, agilepyLogger, tracer)
 
     def getRequiredOptions(self):
         return ["outdir", "filenameprefix", "expmap"]
@@ -141,19 +119,20 @@ class GasMapGenerator(ProcessWrapper):
 
         self.products = [self.outfilePath]
 
+        self.productStore = ProductStore.getStore(confDict.getOptionValue("productstore"))
+
         self.args = [ extraParams["expMapGeneratorOutfilePath"], \
                       self.outfilePath,  \
-                      confDict.getOptionValue("skymapL"), \
-                      confDict.getOptionValue("skymapH"), \
-                    ]
+                    ] + \
+                    confDict.getOptionValues(["skymapL", "skymapH"])
 
 
 
 
 class IntMapGenerator(ProcessWrapper):
 
-    def __init__(self, exeName, agilepyLogger):
-        super().__init__(exeName, agilepyLogger)
+    def __init__(self, exeName, agilepyLogger, tracer=None):
+        super().__init__(exeName, agilepyLogger, tracer)
 
     def getRequiredOptions(self):
         return ["outdir", "filenameprefix", "expmap", "ctsmap"]
@@ -166,6 +145,8 @@ class IntMapGenerator(ProcessWrapper):
 
         self.products = [self.outfilePath]
 
+        self.productStore = ProductStore.getStore(confDict.getOptionValue("productstore"))
+
         self.args = [ extraParams["expMapGeneratorOutfilePath"], \
                       self.outfilePath,  \
                       extraParams["ctsMapGeneratorOutfilePath"], \
@@ -178,8 +159,8 @@ class IntMapGenerator(ProcessWrapper):
 
 class Multi(ProcessWrapper):
 
-    def __init__(self, exeName, agilepyLogger):
-        super().__init__(exeName, agilepyLogger)
+    def __init__(self, exeName, agilepyLogger, tracer=None):
+        super().__init__(exeName, agilepyLogger, tracer)
 
     def getRequiredOptions(self):
         return ["outdir", "filenameprefix"]
@@ -200,30 +181,15 @@ class Multi(ProcessWrapper):
             expratioevaluation = 1
 
 
-        self.args = [
-            confDict.getOptionValue("maplist"), \
-            Parameters.matrixconf, \
-            confDict.getOptionValue("ranal"), \
-            confDict.getOptionValue("galmode"), \
-            confDict.getOptionValue("isomode"), \
-            confDict.getOptionValue("sourcelist"), \
-            self.outfilePath, \
-            confDict.getOptionValue("ulcl"), \
-            confDict.getOptionValue("loccl"), \
-            confDict.getOptionValue("galmode2"), \
-            confDict.getOptionValue("galmode2fit"), \
-            confDict.getOptionValue("isomode2"), \
-            confDict.getOptionValue("isomode2fit"), \
-            confDict.getOptionValue("edpcorrection"), \
-            confDict.getOptionValue("fluxcorrection"), \
-            confDict.getOptionValue("minimizertype"), \
-            confDict.getOptionValue("minimizeralg"), \
-            confDict.getOptionValue("minimizerdefstrategy"), \
-            confDict.getOptionValue("mindefaulttolerance"), \
-            confDict.getOptionValue("integratortype"), \
-            expratioevaluation, \
-            confDict.getOptionValue("expratio_minthr"), \
-            confDict.getOptionValue("expratio_maxthr"), \
-            confDict.getOptionValue("expratio_size"), \
-            confDict.getOptionValue("contourpoints"),
-        ]
+        maplist, ranal, galmode, isomode, sourcelist = confDict.getOptionValues(["maplist", "ranal", "galmode", "isomode", "sourcelist"])
+
+        self.args = [ maplist, \
+                      Parameters.matrixconf, \
+                      ranal, galmode, isomode, sourcelist, \
+                      self.outfilePath, \
+                    ] + \
+                    confDict.getOptionValues([ "ulcl", "loccl", "galmode2", "galmode2fit", "isomode2", "isomode2fit", \
+                                               "edpcorrection", "fluxcorrection", "minimizertype", "minimizeralg", \
+                                               "minimizerdefstrategy", "mindefaulttolerance", "integratortype" ]) + \
+                    [ expratioevaluation ] + \
+                    confDict.getOptionValues([ "expratio_minthr", "expratio_maxthr", "expratio_size", "contourpoints" ])
@@ -29,6 +29,7 @@ from pathlib import Path
 from inspect import signature
 from os.path import splitext
 from os import listdir
+import pickle
 from copy import deepcopy
 
 from functools import singledispatch
@@ -37,6 +38,7 @@ from xml.dom import minidom
 
 from agilepy.utils.AstroUtils import AstroUtils
 from agilepy.utils.Parameters import Parameters
+from agilepy.utils.AgilepyTracer import AgilepyTracer, traced
 
 from agilepy.utils.BooleanExpressionParser import BooleanParser
 from agilepy.utils.SourceModel import Source, MultiOutput, Spectrum, SpatialModel, Parameter
@@ -50,21 +52,45 @@ from agilepy.utils.CustomExceptions import SourceModelFormatNotSupported, \
 
 class SourcesLibrary:
 
-    def __init__(self, agilepyConfig, agilepyLogger):
+    def __init__(self, agilepyConfig, agilepyLogger, tracer=None):
         """
         This method ... blabla ...
         """
         self.logger = agilepyLogger
 
+        self.tracer = tracer if tracer is not None else AgilepyTracer(enabled=False)
+
         self.config = agilepyConfig
 
         self.sources = []
 
         self.sourcesBKP = None
 
+        # the sources of another library, copied when they are accessed for the first time (see shareSources())
+        self._sharedSources = None
+
+        # the directory is created by writeToFile()
         self.outdirPath = Path(self.config.getConf("output","outdir")).joinpath("sources_library")
 
-        self.outdirPath.mkdir(parents=True, exist_ok=True)
+    @property
+    def sources(self):
+        if self._sharedSources is not None:
+            self._sources = pickle.loads(pickle.dumps(self._sharedSources, protocol=pickle.HIGHEST_PROTOCOL))
+            self._sharedSources = None
+        return self._sources
+
+    @sources.setter
+    def sources(self, sources):
+        self._sources = sources
+        self._sharedSources = None
+
+    def shareSources(self, sourcesLibrary):
+        """
+        It makes the sources of another library the sources of this one, without parsing any file.
+        The sources are copied only when they are accessed for the first time, hence the other library
+        must not be changed in the meantime.
+        """
+        self._sharedSources = list(sourcesLibrary.sources)
 
     def backupSL(self):
         self.sourcesBKP = deepcopy(self.sources)
@@ -109,6 +135,7 @@ class SourcesLibrary:
 
 
 
+    @traced("parsing")
     def loadSourcesFromFile(self, filePath, rangeDist = (0, float("inf")), scaleFlux = False, show=False):
 
         filePath = self.config._expandEnvVar(filePath)
@@ -145,7 +172,7 @@ class SourcesLibrary:
 
         if show:
             for s in addedSources:
-                self.logger.info(self, f"{s}")
+                self.logger.info(self, "%s", s)
 
         self.logger.info(self, "Loaded %d sources. Total sources: %d", len(addedSources), len(self.sources))
 
@@ -170,6 +197,8 @@ class SourcesLibrary:
         if fileformat not in ["txt", "xml"]:
             raise SourceModelFormatNotSupported("Format {} not supported. Supported formats: txt, xml".format(format))
 
+        self.outdirPath.mkdir(parents=True, exist_ok=True)
+
         outputFilePath = self.outdirPath.joinpath(outfileNamePrefix)
 
         if sources is None:
@@ -223,7 +252,7 @@ class SourcesLibrary:
 
         if show:
             for s in selected:
-                self.logger.info(self, f"{s}")
+                self.logger.info(self, "%s", s)
 
         return selected
 
@@ -263,7 +292,7 @@ class SourcesLibrary:
                 affected.append(s)
 
                 if show:
-                    self.logger.info(self, f"{s}")
+                    self.logger.info(self, "%s", s)
 
         return affected
 
@@ -279,7 +308,7 @@ class SourcesLibrary:
 
         if show:
             for s in deletedSources:
-                self.logger.info(self, f"{s}")
+                self.logger.info(self, "%s", s)
 
         self.logger.info(self, "Deleted %d sources.", len(deletedSources))
         return deletedSources
@@ -331,6 +360,7 @@ class SourcesLibrary:
             self.logger.info(self, f"Position is not changed: {source.spatialModel.pos.value}")
             return False
 
+    @traced("parsing")
     def parseSourceFile(self, sourceFilePath):
         """
         Static method
@@ -525,6 +555,16 @@ class SourcesLibrary:
 
         self.logger.debug(self, "Loading source from a dictionary..")
 
+        newSource = self._sourceFromDict(sourceName, sourceObject)
+
+        self.sources.append(newSource)
+
+        return newSource
+
+    def _sourceFromDict(self, sourceName, sourceObject):
+        """
+        It returns a point source built from a dictionary (see AGAnalysis.addSource()), without adding it to the library.
+        """
         requiredKeys = ["glon", "glat", "spectrumType"]
 
         for rK in requiredKeys:
@@ -541,18 +581,18 @@ class SourcesLibrary:
 
         spectrumKeys = ["flux", "index", "index1", "index2", "cutoffEnergy", "pivotEnergy", "curvature"]
 
+        spectrumParameters = newSource.spectrum.getParameters()
+
         for sK in spectrumKeys:
-            if sK in vars(newSource.spectrum):
-                getattr(newSource.spectrum, sK).set(0)
-            if sK in sourceObject and sK in vars(newSource.spectrum):
-                getattr(newSource.spectrum, sK).set(sourceObject[sK])
+            if sK in spectrumParameters:
+                spectrumParameters[sK].set(0)
+            if sK in sourceObject and sK in spectrumParameters:
+                spectrumParameters[sK].set(sourceObject[sK])
 
         distance = self.getSourceDistance(newSource)
 
         newSource.spatialModel.set("dist", distance)
 
-        self.sources.append(newSource)
-
         return newSource
 
 
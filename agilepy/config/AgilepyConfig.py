@@ -50,20 +50,53 @@ class AgilepyConfig(Observable):
     """
 
     """
+    _indexLinesCache = {}
+
     def __init__(self):
         super().__init__()
         self.pp = pprint.PrettyPrinter(indent=2)
         self.initialized = False
         self.conf = None
+        self._sharedSections = set()
+        self._optionsIndex = {}
+
 
+    def __getstate__(self):
+        """
+        The configuration can be sent to other processes (e.g. the workers of PlottingUtils.renderBatch()):
+        the printer is not pickled because it holds sys.stdout.
+        """
+        state = dict(self.__dict__)
+        del state["pp"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.pp = pprint.PrettyPrinter(indent=2)
 
     @staticmethod
     def getCopy(copyFrom):
+        """
+        It returns a copy-on-write copy of the configuration: the sections are shared
+        between the two objects and a section is copied only when one of them writes it
+        (see setOptions() and addOptions()).
+        """
         ac = AgilepyConfig()
-        ac.conf = deepcopy(copyFrom.conf)
+        ac.conf = dict(copyFrom.conf)
+        ac._sharedSections = set(ac.conf.keys())
+        ac._optionsIndex = dict(copyFrom._optionsIndex)
+        copyFrom._sharedSections.update(copyFrom.conf.keys())
         ac.initialized = True
         return ac
 
+    def _ownSection(self, section):
+        """
+        It gives to this object its own copy of a section shared with other copies.
+        """
+        if section in self._sharedSections:
+            self.conf[section] = deepcopy(self.conf[section])
+            self._sharedSections.discard(section)
+
 
     def loadConfigurations(self, configurationFilePath, validate = True):
 
@@ -80,6 +113,8 @@ class AgilepyConfig(Observable):
         conf = AgilepyConfig._completeConfiguration(mergedConf)
 
         self.conf = conf
+        self._sharedSections = set()
+        self._buildOptionsIndex()
         # self.conf_bkp = deepcopy(self.conf)
 
         if validate:
@@ -89,31 +124,39 @@ class AgilepyConfig(Observable):
         self.initialized = True
 
 
-    def validateConfiguration(self):
-
+    def validateConfiguration(self, changedOptions=None):
+        """
+        It validates the configuration. If changedOptions is passed, only the
+        validators depending on those options are run.
+        """
         errors = {}
 
-        errors.update( AgilepyConfig._validateBackgroundCoeff(self.conf) )
-        errors.update( AgilepyConfig._validateIndexFiles(self.conf) )
-        errors.update( AgilepyConfig._validateTimeInIndex(self.conf) )
-        errors.update( AgilepyConfig._validateLOCCL(self.conf) )
-        errors.update( AgilepyConfig._validateMinMax(self.conf, "selection", "fovradmin", "fovradmax") )
-        errors.update( AgilepyConfig._validateMinMax(self.conf, "selection", "emin", "emax") )
-        errors.update( AgilepyConfig._validateTimetype(self.conf))
+        for dependsOn, validator in AgilepyConfig._getValidators():
+
+            if changedOptions is None or any(option in dependsOn for option in changedOptions):
+
+                errors.update( validator(self.conf) )
 
         if errors:
             raise ConfigurationsNotValidError("Errors: {}".format(errors))
 
 
-    def getSectionOfOption(self, optionName):
+    def _buildOptionsIndex(self):
+        """
+        It maps each option name to its section. If an option name is
+        defined in more than one section, the first section wins.
+        """
+        self._optionsIndex = {}
 
         for optionSection in self.conf:
 
-            if optionName in self.conf[optionSection]:
+            for optionName in self.conf[optionSection]:
 
-                return optionSection
+                self._optionsIndex.setdefault(optionName, optionSection)
 
-        return None
+    def getSectionOfOption(self, optionName):
+
+        return self._optionsIndex.get(optionName)
 
 
     def printOptions(self, section=None):
@@ -132,6 +175,23 @@ class AgilepyConfig(Observable):
 
         return self.conf[optionSection][optionName]
 
+    def getOptionValues(self, optionNames):
+        """
+        It returns the values of several options at once, in the same order of optionNames.
+        """
+        values = []
+
+        for optionName in optionNames:
+
+            optionSection = self._optionsIndex.get(optionName)
+
+            if not optionSection:
+                raise OptionNotFoundInConfigFileError("The option %s has not been found in the configuration."%(optionName))
+
+            values.append(self.conf[optionSection][optionName])
+
+        return values
+
 
     def addOptions(self, section , **kwargs):
         """
@@ -141,8 +201,24 @@ class AgilepyConfig(Observable):
             if section not in self.conf:
                 self.conf[section] = {}
 
+            self._ownSection(section)
+
             self.conf[section][optionName] = optionValue
 
+            self._indexOption(optionName, section)
+
+    def _indexOption(self, optionName, section):
+
+        indexedSection = self._optionsIndex.get(optionName)
+
+        if indexedSection is None:
+            self._optionsIndex[optionName] = section
+
+        elif indexedSection != section:
+            sections = list(self.conf)
+            if sections.index(section) < sections.index(indexedSection):
+                self._optionsIndex[optionName] = section
+
 
     def setOptions(self, force=False, **kwargs):
         """
@@ -175,19 +251,25 @@ class AgilepyConfig(Observable):
             if not isOk:
                 raise ConfigFileOptionTypeError("Can't set config option '{}'. Error: {}".format(optionName, errorMsg))
 
+            self._ownSection(optionSection)
+
             self.conf[optionSection][optionName] = optionValue
 
             if optionName == "loccl":
 
+                self._ownSection("mle")
+
                 AgilepyConfig._transformLoccl(self.conf)
 
             if optionName == "isocoeff" or optionName == "galcoeff":
 
+                self._ownSection("model")
+
                 AgilepyConfig._convertBackgroundCoeff(self.conf, optionName)
 
 
 
-        self.validateConfiguration()
+        self.validateConfiguration(changedOptions=kwargs.keys())
 
         for optionName, optionValue in kwargs.items():
 
@@ -219,7 +301,7 @@ class AgilepyConfig(Observable):
         """
 
         # int
-        if optionName in ["verboselvl", "filtercode", "emin", "emax", "fovradmin", \
+        if optionName in ["verboselvl", "logfileverboselvl", "logfilemaxbytes", "logfilebackupcount", "mapcachemaxbytes", "filtercode", "emin", "emax", "fovradmin", \
                           "fovradmax", "albedorad", "dq", "phasecode", "expstep", \
                           "fovbinnumber", "galmode", "isomode", "emin_sources", \
                           "emax_sources", "loccl"]:
@@ -233,10 +315,10 @@ class AgilepyConfig(Observable):
 
         # String
         elif optionName in ["evtfile", "logfile", "outdir", "filenameprefix", "logfilenameprefix", \
-                            "timetype", "timelist", "projtype", "proj", "modelfile"]:
+                            "timetype", "timelist", "projtype", "proj", "modelfile", "productstore"]:
             return (None, str)
 
-        elif optionName in ["useEDPmatrixforEXP", "expratioevaluation", "twocolumns"]:
+        elif optionName in ["useEDPmatrixforEXP", "expratioevaluation", "twocolumns", "logasync", "tracing"]:
             return (None, bool)
 
         # List of Numbers
@@ -252,7 +334,7 @@ class AgilepyConfig(Observable):
 
     @staticmethod
     def _notUpdatable(optionName):
-        if optionName in ["logfilenameprefix", "verboselvl"]:
+        if optionName in ["logfilenameprefix", "verboselvl", "logfileverboselvl", "logasync", "logfilemaxbytes", "logfilebackupcount", "tracing"]:
             return True
         return False
 
@@ -433,6 +515,8 @@ class AgilepyConfig(Observable):
         confDict["input"]["evtfile"] = AgilepyConfig._expandEnvVar(confDict["input"]["evtfile"])
         confDict["input"]["logfile"] = AgilepyConfig._expandEnvVar(confDict["input"]["logfile"])
         confDict["output"]["outdir"] = AgilepyConfig._expandEnvVar(confDict["output"]["outdir"])
+        if confDict["output"]["productstore"] is not None:
+            confDict["output"]["productstore"] = AgilepyConfig._expandEnvVar(confDict["output"]["productstore"])
 
     @staticmethod
     def _expandEnvVar(path):
@@ -468,6 +552,21 @@ class AgilepyConfig(Observable):
             return yaml.safe_load(yamlfile)
 
 
+    @staticmethod
+    def _getValidators():
+        """
+        It returns the validators, each one coupled with the options it depends on.
+        """
+        return [
+            (("energybins", "fovbinnumber", "isocoeff", "galcoeff"), AgilepyConfig._validateBackgroundCoeff),
+            (("evtfile", "logfile"), AgilepyConfig._validateIndexFiles),
+            (("evtfile", "tmin", "tmax", "timetype"), AgilepyConfig._validateTimeInIndex),
+            (("loccl",), AgilepyConfig._validateLOCCL),
+            (("fovradmin", "fovradmax"), lambda confDict: AgilepyConfig._validateMinMax(confDict, "selection", "fovradmin", "fovradmax")),
+            (("emin", "emax"), lambda confDict: AgilepyConfig._validateMinMax(confDict, "selection", "emin", "emax")),
+            (("timetype",), AgilepyConfig._validateTimetype),
+        ]
+
     @staticmethod
     def _validateTimetype(confDict):
 
@@ -565,7 +664,7 @@ class AgilepyConfig(Observable):
 
         if lineSize > 1024:
             print("[AgilepyConfig] ! WARNING ! The byte size of the first input/evtfile line {} is {} B.\
-                   This value is greater than 500. Please, check the evt index time range: TMIN: {} - TMAX: {}".format(firstLine, lineSize, tmin, tmax))
+                   This value is greater than 500. Please, check the evt index time range: TMIN: {} - TMAX: {}".format(first, lineSize, idxTmin, idxTmax))
 
         userTmin = confDict["selection"]["tmin"]
         userTmax = confDict["selection"]["tmax"]
@@ -592,12 +691,28 @@ class AgilepyConfig(Observable):
 
     @staticmethod
     def _getFirstAndLastLineInFile(file):
-        with open(file, 'rb') as evtindex:
-            firstLine = next(evtindex).decode()
-            lineSize = len(firstLine.encode('utf-8'))
-            evtindex.seek(-500, os.SEEK_END)
-            lastLine = evtindex.readlines()[-1].decode()
-            return (firstLine, lastLine, lineSize)
+        """
+        The result is cached per file path and replaced when the modification time or the size of the file change.
+        """
+        filePath = os.path.realpath(file)
+        fileStat = os.stat(filePath)
+        version = (fileStat.st_mtime_ns, fileStat.st_size)
+
+        cached = AgilepyConfig._indexLinesCache.get(filePath)
+
+        if cached is None or cached[0] != version:
+
+            with open(filePath, 'rb') as evtindex:
+                firstLine = next(evtindex).decode()
+                lineSize = len(firstLine.encode('utf-8'))
+                evtindex.seek(-500, os.SEEK_END)
+                lastLine = evtindex.readlines()[-1].decode()
+
+            cached = (version, (firstLine, lastLine, lineSize))
+
+            AgilepyConfig._indexLinesCache[filePath] = cached
+
+        return cached[1]
 
     @staticmethod
     def _extractTimes(indexFileLine):
@@ -0,0 +1,7 @@
+#!/bin/bash
+
+script_dir="$( cd "$( dirname "${BASH_SOURCE[0]}" )" >/dev/null 2>&1 && pwd )"
+
+echo "Script dir: $script_dir"
+
+python -m pytest "$script_dir/../testing/benchmarks" --benchmark-only "$@"
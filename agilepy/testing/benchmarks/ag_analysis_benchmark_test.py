@@ -0,0 +1,186 @@
+# DESCRIPTION
+#       Agilepy software
+#
+# NOTICE
+#      Any information contained in this software
+#      is property of the AGILE TEAM and is strictly
+#      private and confidential.
+#      Copyright (C) 2005-2020 AGILE Team.
+#          Baroncelli Leonardo <leonardo.baroncelli@inaf.it>
+#          Addis Antonio <antonio.addis@inaf.it>
+#          Bulgarelli Andrea <andrea.bulgarelli@inaf.it>
+#          Parmiggiani Nicolò <nicolo.parmiggiani@inaf.it>
+#      All rights reserved.
+
+#This program is free software: you can redistribute it and/or modify
+#it under the terms of the GNU General Public License as published by
+#the Free Software Foundation, either version 3 of the License, or
+#(at your option) any later version.
+
+#This program is distributed in the hope that it will be useful,
+#but WITHOUT ANY WARRANTY; without even the implied warranty of
+#MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#GNU General Public License for more details.
+
+#You should have received a copy of the GNU General Public License
+#along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+import os
+import asyncio
+from pathlib import Path
+
+import pytest
+import numpy as np
+
+pytest.importorskip("pytest_benchmark")
+
+from agilepy.api.AGAnalysis import AGAnalysis
+from agilepy.utils.SkyMap import SkyMap
+from agilepy.utils.MapList import MapList
+
+
+@pytest.fixture
+def aganalysis(agileEnv):
+    ag = AGAnalysis(agileEnv.confPath)
+    yield ag
+    ag.destroy()
+
+@pytest.fixture
+def aganalysisWithSources(aganalysis):
+    aganalysis.loadSourcesFromCatalog("2AGL", rangeDist=(0, 10))
+    aganalysis.freeSources('flux > 0', "flux", True)
+    return aganalysis
+
+
+def test_load_sources_from_catalog(benchmark, aganalysis):
+
+    sources = benchmark.pedantic(aganalysis.loadSourcesFromCatalog, args=("2AGL",), setup=aganalysis.sourcesLibrary.destroy, rounds=10)
+
+    assert len(sources) > 0
+
+def test_select_sources(benchmark, aganalysis):
+
+    aganalysis.loadSourcesFromCatalog("2AGL")
+
+    selected = benchmark(aganalysis.selectSources, "dist < 10 AND flux > 0")
+
+    assert len(selected) > 0
+
+def readLightCurve(lightCurveData):
+    """
+    It returns the (tstart, tstop) TT of the rows of a light curve file (the first line is the header), sorted by tstart.
+    """
+    with open(lightCurveData) as lcd:
+        return sorted((float(row.split()[17]), float(row.split()[18])) for row in lcd.readlines()[1:])
+
+def test_generate_maps(benchmark, aganalysis):
+
+    # a new MapList for each round, otherwise the rows of the previous rounds are written too
+    maplistFile = benchmark.pedantic(aganalysis.generateMaps, setup=lambda: ((), {"maplistObj": MapList(aganalysis.logger)}), rounds=3, iterations=1)
+
+    # 2 energy bins x 1 fov bin
+    assert len(aganalysis.parseMaplistFile(maplistFile)) == 2
+
+def test_generate_maps_product_store(benchmark, agileEnv, aganalysis):
+
+    aganalysis.setOptions(productstore=str(agileEnv.outDir.joinpath("product_store")))
+
+    maplistFile = aganalysis.generateMaps()
+
+    # the maps of the other analyses are materialized from the store
+    maplistFileCopy = benchmark.pedantic(aganalysis.generateMaps, setup=lambda: aganalysis.setOptions(outdir=str(agileEnv.outDir.joinpath("product_store_copy"))), rounds=3, iterations=1)
+
+    for row, rowCopy in zip(open(maplistFile), open(maplistFileCopy)):
+        assert os.stat(row.split()[0]).st_ino == os.stat(rowCopy.split()[0]).st_ino
+
+def test_generate_maps_async(benchmark, aganalysis):
+
+    maplistFile = benchmark.pedantic(lambda maplistObj: asyncio.run(aganalysis.generateMapsAsync(maplistObj=maplistObj)), setup=lambda: ((MapList(aganalysis.logger),), {}), rounds=3, iterations=1)
+
+    assert len(aganalysis.parseMaplistFile(maplistFile)) == 2
+
+def test_mle(benchmark, aganalysisWithSources):
+
+    maplistFile = aganalysisWithSources.generateMaps()
+
+    sourceFiles = benchmark.pedantic(aganalysisWithSources.mle, args=(maplistFile,), rounds=3, iterations=1)
+
+    assert len(sourceFiles) > 0
+
+def test_light_curve(benchmark, agileEnv, aganalysisWithSources):
+
+    sourceName = aganalysisWithSources.sourcesLibrary.getSourcesNames()[0]
+    tmin = agileEnv.tmin
+
+    lightCurveData = benchmark.pedantic(aganalysisWithSources.lightCurve, args=(sourceName, tmin, tmin+4*86400, "TT", 86400), rounds=1, iterations=1)
+
+    rows = readLightCurve(lightCurveData)
+
+    assert [tstart for tstart, _ in rows] == [tmin+i*86400 for i in range(4)]
+    assert [tstop for _, tstop in rows] == [tmin+(i+1)*86400 for i in range(4)]
+
+def test_light_curve_concurrent_bins(benchmark, agileEnv, aganalysisWithSources):
+
+    sourceName = aganalysisWithSources.sourcesLibrary.getSourcesNames()[0]
+    tmin = agileEnv.tmin
+
+    lightCurveData = benchmark.pedantic(aganalysisWithSources.lightCurve, args=(sourceName, tmin, tmin+4*86400, "TT", 86400), kwargs={"concurrentBins": 4}, rounds=1, iterations=1)
+
+    rows = readLightCurve(lightCurveData)
+
+    assert [tstart for tstart, _ in rows] == [tmin+i*86400 for i in range(4)]
+    assert [tstop for _, tstop in rows] == [tmin+(i+1)*86400 for i in range(4)]
+
+def test_adaptive_light_curve(benchmark, agileEnv, aganalysisWithSources):
+
+    sourceName = aganalysisWithSources.sourcesLibrary.getSourcesNames()[0]
+    tmin = agileEnv.tmin
+
+    lightCurveData = benchmark.pedantic(aganalysisWithSources.adaptiveLightCurve, args=(sourceName, tmin, tmin+8*86400, "TT"), kwargs={"binsize": 4*86400, "minBinsize": 86400}, rounds=1, iterations=1)
+
+    rows = readLightCurve(lightCurveData)
+
+    # from 2 bins (no split) to 8 bins (every bin split down to minBinsize), covering [tmin, tmax] without gaps
+    assert 2 <= len(rows) <= 8
+    assert rows[0][0] == tmin
+    assert rows[-1][1] == tmin+8*86400
+    assert all(rows[i][1] == rows[i+1][0] for i in range(len(rows)-1))
+
+def test_sliding_window_light_curve(benchmark, agileEnv, aganalysisWithSources):
+
+    sourceName = aganalysisWithSources.sourcesLibrary.getSourcesNames()[0]
+    tmin = agileEnv.tmin
+
+    lightCurveData = benchmark.pedantic(aganalysisWithSources.slidingWindowLightCurve, args=(sourceName, tmin, tmin+4*86400, "TT"), kwargs={"windowSize": 2*86400, "step": 43200}, rounds=1, iterations=1)
+
+    rows = readLightCurve(lightCurveData)
+
+    assert [tstart for tstart, _ in rows] == [tmin+i*43200 for i in range(5)]
+    assert [tstop for _, tstop in rows] == [tmin+2*86400+i*43200 for i in range(5)]
+
+def test_render_images(benchmark, aganalysis):
+
+    maplistFile = aganalysis.generateMaps()
+
+    images = benchmark.pedantic(aganalysis.renderImages, args=([maplistFile]*8,), kwargs={"skyMapTypes": ["CTS", "EXP"], "singleMode": False}, rounds=1, iterations=1)
+
+    assert None not in images
+
+def test_from_template(benchmark, aganalysisWithSources):
+
+    analysis = benchmark(AGAnalysis.fromTemplate, aganalysisWithSources)
+
+    assert len(analysis.getSources()) == len(aganalysisWithSources.getSources())
+
+def test_ts_map(benchmark, aganalysisWithSources):
+
+    tsMapPath, ulMapPath = benchmark.pedantic(aganalysisWithSources.tsMap, kwargs={"size": 2, "step": 0.5}, rounds=1, iterations=1)
+
+    tsMap = SkyMap.read(tsMapPath)
+
+    assert tsMap.shape == (4, 4)
+    assert not np.isnan(tsMap.data).any()
+    assert not np.isnan(SkyMap.read(ulMapPath).data).any()
+
+    outfiles = set(f.split("_TSMAP_")[0] for f in os.listdir(Path(tsMapPath).parent.joinpath("mle")) if "_TSMAP_" in f)
+    assert len(outfiles) == 16
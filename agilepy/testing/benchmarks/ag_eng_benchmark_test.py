@@ -0,0 +1,55 @@
+# DESCRIPTION
+#       Agilepy software
+#
+# NOTICE
+#      Any information contained in this software
+#      is property of the AGILE TEAM and is strictly
+#      private and confidential.
+#      Copyright (C) 2005-2020 AGILE Team.
+#          Baroncelli Leonardo <leonardo.baroncelli@inaf.it>
+#          Addis Antonio <antonio.addis@inaf.it>
+#          Bulgarelli Andrea <andrea.bulgarelli@inaf.it>
+#          Parmiggiani Nicolò <nicolo.parmiggiani@inaf.it>
+#      All rights reserved.
+
+#This program is free software: you can redistribute it and/or modify
+#it under the terms of the GNU General Public License as published by
+#the Free Software Foundation, either version 3 of the License, or
+#(at your option) any later version.
+
+#This program is distributed in the hope that it will be useful,
+#but WITHOUT ANY WARRANTY; without even the implied warranty of
+#MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#GNU General Public License for more details.
+
+#You should have received a copy of the GNU General Public License
+#along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+import pytest
+
+pytest.importorskip("pytest_benchmark")
+
+from agilepy.api.AGEng import AGEng
+
+
+@pytest.fixture
+def ageng(agileEnv):
+    return AGEng(agileEnv.confPath)
+
+
+def test_compute_pointing_distances_from_sources(benchmark, agileEnv, ageng):
+
+    tmin = agileEnv.tmin
+
+    separations, _, _, _, _ = benchmark(ageng.computePointingDistancesFromSources, tmin, tmin+3*3600, src_x=[129.7, 78.2375], src_y=[3.7, 2.12298], ref="gal", step=10)
+
+    assert separations.shape[0] == 2
+
+def test_visibility_plot(benchmark, agileEnv, ageng):
+
+    tmin = agileEnv.tmin
+
+    visplot, histoplot = benchmark.pedantic(ageng.visibilityPlot, args=(tmin, tmin+3*3600, 129.7, 3.7, "gal"), kwargs={"step": 10, "writeFiles": False}, rounds=3, iterations=1)
+
+    assert visplot is not None
+    assert histoplot is not None
@@ -0,0 +1,193 @@
+# DESCRIPTION
+#       Agilepy software
+#
+# NOTICE
+#      Any information contained in this software
+#      is property of the AGILE TEAM and is strictly
+#      private and confidential.
+#      Copyright (C) 2005-2020 AGILE Team.
+#          Baroncelli Leonardo <leonardo.baroncelli@inaf.it>
+#          Addis Antonio <antonio.addis@inaf.it>
+#          Bulgarelli Andrea <andrea.bulgarelli@inaf.it>
+#          Parmiggiani Nicolò <nicolo.parmiggiani@inaf.it>
+#      All rights reserved.
+
+#This program is free software: you can redistribute it and/or modify
+#it under the terms of the GNU General Public License as published by
+#the Free Software Foundation, either version 3 of the License, or
+#(at your option) any later version.
+
+#This program is distributed in the hope that it will be useful,
+#but WITHOUT ANY WARRANTY; without even the implied warranty of
+#MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#GNU General Public License for more details.
+
+#You should have received a copy of the GNU General Public License
+#along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""
+It builds a fake AGILE environment ($AGILE and $PFILES) populated with synthetic data:
+EVT and LOG index files, attitude log files, a synthetic 2AGL catalog, the par files
+and the stub science tools (see stub_tools.py), put in front of $PATH.
+"""
+import os
+import sys
+import stat
+import shutil
+import tempfile
+from pathlib import Path
+
+import pytest
+import numpy as np
+from astropy.io import fits
+
+# Parameters reads $AGILE when it is imported
+os.environ.setdefault("AGILE", tempfile.gettempdir())
+os.environ.setdefault("PFILES", tempfile.gettempdir())
+
+import agilepy
+
+TOOLS = ["AG_ctsmapgen", "AG_expmapgen", "AG_gasmapgen", "AG_intmapgen", "AG_multi"]
+
+TSTART = 456361778.0
+DAYS = 10
+LOG_FILES = 3
+LOG_FILE_DURATION = 3600.0
+CATALOG_SOURCES = 300
+
+WRAPPER = """#!{python}
+import sys
+sys.path.insert(0, {root!r})
+from agilepy.testing.benchmarks.stub_tools import main
+main()
+"""
+
+class FakeAgileEnvironment:
+
+    def __init__(self, rootDir):
+
+        self.rootDir = Path(rootDir)
+        self.binDir = self.rootDir.joinpath("bin")
+        self.shareDir = self.rootDir.joinpath("share")
+        self.dataDir = self.rootDir.joinpath("data")
+        self.catalogsDir = self.rootDir.joinpath("catalogs")
+        self.outDir = self.rootDir.joinpath("output")
+
+        for d in [self.binDir, self.shareDir, self.dataDir, self.catalogsDir, self.outDir]:
+            d.mkdir(parents=True, exist_ok=True)
+
+        self.tmin = TSTART
+        self.tmax = TSTART + DAYS*86400
+
+        self._writeStubTools()
+        self._writeEvtIndex()
+        self._writeLogFiles()
+        self._writeCatalog()
+        self.confPath = self._writeConfiguration()
+
+    def _writeStubTools(self):
+        agilepyRoot = str(Path(agilepy.__file__).absolute().parent.parent)
+        for tool in TOOLS:
+            toolPath = self.binDir.joinpath(tool)
+            toolPath.write_text(WRAPPER.format(python=sys.executable, root=agilepyRoot))
+            toolPath.chmod(toolPath.stat().st_mode | stat.S_IXUSR | stat.S_IXGRP | stat.S_IXOTH)
+            self.shareDir.joinpath(tool+".par").write_text(f"# {tool} stub par file\n")
+
+    def _writeEvtIndex(self):
+        self.evtIndex = self.dataDir.joinpath("EVT.index")
+        with open(self.evtIndex, "w") as idx:
+            for day in range(DAYS):
+                t1 = TSTART + day*86400
+                idx.write(f"{self.dataDir}/evt_{day}.evt.gz {t1} {t1+86400} EVT\n")
+
+    def _writeLogFiles(self):
+        self.logIndex = self.dataDir.joinpath("LOG.index")
+        with open(self.logIndex, "w") as idx:
+            for i in range(LOG_FILES):
+                t1 = TSTART + i*LOG_FILE_DURATION
+                time = np.arange(t1, t1+LOG_FILE_DURATION, 0.1)
+                ra = (np.arange(len(time))*0.004 + i*45) % 360
+                dec = 60*np.sin(np.arange(len(time))*1e-4)
+                columns = [fits.Column(name="TIME", format="D", array=time), \
+                           fits.Column(name="ATTITUDE_RA_Y", format="D", array=ra), \
+                           fits.Column(name="ATTITUDE_DEC_Y", format="D", array=dec)]
+                logFile = self.dataDir.joinpath(f"log_{i}.log.gz")
+                fits.BinTableHDU.from_columns(columns).writeto(logFile, overwrite=True)
+                idx.write(f"{logFile} {t1} {t1+LOG_FILE_DURATION} LOG\n")
+            # the index must be longer than 500 bytes
+            for i in range(10):
+                idx.write(f"{self.dataDir}/missing_{i}.log.gz {TSTART+(DAYS+i)*86400} {TSTART+(DAYS+i+1)*86400} LOG\n")
+
+    def _writeCatalog(self):
+        rng = np.random.default_rng(0)
+        with open(self.catalogsDir.joinpath("2AGL.xml"), "w") as cat:
+            cat.write('<?xml version="1.0" ?>\n<source_library title="source library">\n')
+            for i in range(CATALOG_SOURCES):
+                glon = rng.uniform(40, 120)
+                glat = rng.uniform(-30, 30)
+                cat.write(f"""
+  <source name="2AGLJ{i:04d}+0000" type="PointSource">
+    <spectrum type="PLExpCutoff">
+      <parameter name="flux" free="0" value="{rng.uniform(10, 100):.2f}e-08"/>
+      <parameter name="index" free="0" scale="-1.0" value="{rng.uniform(1.5, 2.5):.2f}" min="0.5" max="5"/>
+      <parameter name="cutoffEnergy" free="0" value="{rng.uniform(500, 5000):.2f}" min="20" max="10000"/>
+    </spectrum>
+    <spatialModel type="PointSource" locationLimit="0">
+      <parameter name="pos" value="({glon:.4f}, {glat:.4f})" free="0"/>
+    </spatialModel>
+  </source>
+""")
+            cat.write("</source_library>\n")
+
+    def _writeConfiguration(self):
+        confPath = self.rootDir.joinpath("agilepyconf.yaml")
+        confPath.write_text(f"""
+input:
+  evtfile: {self.evtIndex}
+  logfile: {self.logIndex}
+
+output:
+  outdir: {self.outDir}/benchmark
+  filenameprefix: benchmark
+  logfilenameprefix: benchmark
+  verboselvl: 0
+
+selection:
+  tmin: {self.tmin}
+  tmax: {self.tmin + 86400}
+  timetype: TT
+  glon: 80
+  glat: 0
+
+maps:
+  energybins:
+    - 100, 300
+    - 300, 1000
+  fovbinnumber: 1
+  mapsize: 20
+  binsize: 0.5
+""")
+        return str(confPath)
+
+
+@pytest.fixture(scope="session")
+def agileEnv():
+    rootDir = tempfile.mkdtemp(prefix="agilepy_benchmarks_")
+    environ = dict(os.environ)
+    cwd = os.getcwd()
+
+    env = FakeAgileEnvironment(rootDir)
+
+    os.environ["AGILE"] = rootDir
+    os.environ["PFILES"] = str(env.shareDir)
+    os.environ["PATH"] = str(env.binDir) + os.pathsep + os.environ.get("PATH", "")
+    os.environ.setdefault("AGILEPY_STUB_LATENCY", "0")
+    # the science tools wrappers copy the par files in the working directory
+    os.chdir(rootDir)
+
+    yield env
+
+    os.chdir(cwd)
+    os.environ.clear()
+    os.environ.update(environ)
+    shutil.rmtree(rootDir, ignore_errors=True)
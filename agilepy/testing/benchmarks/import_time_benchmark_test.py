@@ -0,0 +1,81 @@
+# DESCRIPTION
+#       Agilepy software
+#
+# NOTICE
+#      Any information contained in this software
+#      is property of the AGILE TEAM and is strictly
+#      private and confidential.
+#      Copyright (C) 2005-2020 AGILE Team.
+#          Baroncelli Leonardo <leonardo.baroncelli@inaf.it>
+#          Addis Antonio <antonio.addis@inaf.it>
+#          Bulgarelli Andrea <andrea.bulgarelli@inaf.it>
+#          Parmiggiani Nicolò <nicolo.parmiggiani@inaf.it>
+#      All rights reserved.
+
+#This program is free software: you can redistribute it and/or modify
+#it under the terms of the GNU General Public License as published by
+#the Free Software Foundation, either version 3 of the License, or
+#(at your option) any later version.
+
+#This program is distributed in the hope that it will be useful,
+#but WITHOUT ANY WARRANTY; without even the implied warranty of
+#MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#GNU General Public License for more details.
+
+#You should have received a copy of the GNU General Public License
+#along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+import os
+import sys
+import subprocess
+from pathlib import Path
+
+import pytest
+
+pytest.importorskip("pytest_benchmark")
+
+# the plotting dependencies must be imported only when a plot is produced
+PLOTTING_MODULES = {"matplotlib", "plotly", "pandas", "regions", "scipy"}
+
+
+def _importModule(module):
+    """
+    It imports the module in a new interpreter (python -X importtime), without the AGILE environment variables.
+    """
+    code = f"import sys; before = set(sys.modules); import {module}; print(' '.join(set(sys.modules) - before))"
+
+    env = {key: value for key, value in os.environ.items() if key not in ["AGILE", "PFILES"]}
+    env["PYTHONPATH"] = os.pathsep.join([str(Path(__file__).parents[3]), env.get("PYTHONPATH", "")])
+
+    return subprocess.run([sys.executable, "-X", "importtime", "-c", code], env=env, capture_output=True, text=True, check=True)
+
+def _getCumulativeImportTime(importtimeOutput, module):
+    """
+    It returns the cumulative import time (unit: microseconds) of the module from the output of python -X importtime.
+    """
+    for line in importtimeOutput.splitlines():
+        fields = line.split("|")
+        if len(fields) == 3 and fields[2].strip() == module:
+            return int(fields[1])
+    return None
+
+def _runImportBenchmark(benchmark, module):
+
+    completed = benchmark.pedantic(_importModule, args=(module,), rounds=5, iterations=1)
+
+    benchmark.extra_info["cumulative_import_time_us"] = _getCumulativeImportTime(completed.stderr, module)
+
+    return {name.split(".")[0] for name in completed.stdout.split()}
+
+
+def test_import_analysis_api(benchmark):
+
+    importedModules = _runImportBenchmark(benchmark, "agilepy.api.AGAnalysis")
+
+    assert not importedModules & (PLOTTING_MODULES | {"astropy"})
+
+def test_import_engineering_api(benchmark):
+
+    importedModules = _runImportBenchmark(benchmark, "agilepy.api.AGEng")
+
+    assert not importedModules & PLOTTING_MODULES
@@ -0,0 +1,58 @@
+# DESCRIPTION
+#       Agilepy software
+#
+# NOTICE
+#      Any information contained in this software
+#      is property of the AGILE TEAM and is strictly
+#      private and confidential.
+#      Copyright (C) 2005-2020 AGILE Team.
+#          Baroncelli Leonardo <leonardo.baroncelli@inaf.it>
+#          Addis Antonio <antonio.addis@inaf.it>
+#          Bulgarelli Andrea <andrea.bulgarelli@inaf.it>
+#          Parmiggiani Nicolò <nicolo.parmiggiani@inaf.it>
+#      All rights reserved.
+
+#This program is free software: you can redistribute it and/or modify
+#it under the terms of the GNU General Public License as published by
+#the Free Software Foundation, either version 3 of the License, or
+#(at your option) any later version.
+
+#This program is distributed in the hope that it will be useful,
+#but WITHOUT ANY WARRANTY; without even the implied warranty of
+#MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#GNU General Public License for more details.
+
+#You should have received a copy of the GNU General Public License
+#along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+from pathlib import Path
+
+import pytest
+
+pytest.importorskip("pytest_benchmark")
+
+from agilepy.api.AGAnalysis import AGAnalysis
+
+SOURCE_FILE = Path(__file__).absolute().parent.parent.joinpath("unittesting", "api", "data", "testcase_2AGLJ2021+4029.source")
+
+
+@pytest.fixture
+def sourcesLibrary(agileEnv):
+    ag = AGAnalysis(agileEnv.confPath)
+    yield ag.sourcesLibrary
+    ag.destroy()
+
+
+def test_parse_source_file(benchmark, sourcesLibrary):
+
+    multiOutput = benchmark(sourcesLibrary.parseSourceFile, str(SOURCE_FILE))
+
+    assert multiOutput is not None
+
+def test_load_sources_from_file(benchmark, agileEnv, sourcesLibrary):
+
+    catalog = str(agileEnv.catalogsDir.joinpath("2AGL.xml"))
+
+    sources = benchmark.pedantic(sourcesLibrary.loadSourcesFromFile, args=(catalog,), setup=sourcesLibrary.destroy, rounds=10)
+
+    assert len(sources) > 0
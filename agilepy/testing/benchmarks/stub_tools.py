@@ -0,0 +1,179 @@
+# DESCRIPTION
+#       Agilepy software
+#
+# NOTICE
+#      Any information contained in this software
+#      is property of the AGILE TEAM and is strictly
+#      private and confidential.
+#      Copyright (C) 2005-2020 AGILE Team.
+#          Baroncelli Leonardo <leonardo.baroncelli@inaf.it>
+#          Addis Antonio <antonio.addis@inaf.it>
+#          Bulgarelli Andrea <andrea.bulgarelli@inaf.it>
+#          Parmiggiani Nicolò <nicolo.parmiggiani@inaf.it>
+#      All rights reserved.
+
+#This program is free software: you can redistribute it and/or modify
+#it under the terms of the GNU General Public License as published by
+#the Free Software Foundation, either version 3 of the License, or
+#(at your option) any later version.
+
+#This program is distributed in the hope that it will be useful,
+#but WITHOUT ANY WARRANTY; without even the implied warranty of
+#MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#GNU General Public License for more details.
+
+#You should have received a copy of the GNU General Public License
+#along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""
+Lightweight stubs of the AGILE science tools, used by the benchmark suite.
+
+They follow the I/O contracts of the real tools: AG_ctsmapgen, AG_expmapgen, AG_gasmapgen
+and AG_intmapgen write gzipped FITS sky maps, AG_multi writes one synthetic .source file for
+each source of the input source list. The positional arguments are the ones passed by the
+wrappers in agilepy/api/ScienceTools.py.
+
+The AGILEPY_STUB_LATENCY environment variable (seconds, default 0) adds a fixed latency
+to each invocation, emulating the cost of the real tools.
+"""
+import os
+import sys
+import zlib
+from time import sleep
+from pathlib import Path
+
+import numpy as np
+from astropy.io import fits
+
+from agilepy.utils.AstroUtils import AstroUtils
+
+SOURCE_FILE_TEMPLATE = Path(__file__).absolute().parent.parent.joinpath("unittesting", "api", "data", "testcase_2AGLJ2021+4029.source")
+
+def _mapHeader(mapsize, binsize, glon, glat, tmin, tmax, emin, emax):
+
+    npix = max(int(round(mapsize/binsize)), 1)
+
+    header = fits.Header()
+    header["CTYPE1"] = "GLON-ARC"
+    header["CTYPE2"] = "GLAT-ARC"
+    header["CRPIX1"] = (npix+1)/2.0
+    header["CRPIX2"] = (npix+1)/2.0
+    header["CRVAL1"] = glon
+    header["CRVAL2"] = glat
+    header["CDELT1"] = -binsize
+    header["CDELT2"] = binsize
+    header["CUNIT1"] = "deg"
+    header["CUNIT2"] = "deg"
+    header["TSTART"] = tmin
+    header["TSTOP"] = tmax
+    header["DATE-OBS"] = AstroUtils.time_tt_to_utc(tmin)
+    header["DATE-END"] = AstroUtils.time_tt_to_utc(tmax)
+    header["MINENG"] = emin
+    header["MAXENG"] = emax
+
+    return npix, header
+
+def _writeMap(outfile, data, header):
+    Path(outfile).parent.mkdir(parents=True, exist_ok=True)
+    fits.PrimaryHDU(data.astype(np.float32), header).writeto(outfile, overwrite=True)
+
+def ctsmapgen(args):
+    outfile = args[0]
+    mapsize, binsize, glon, glat = map(float, args[3:7])
+    tmin, tmax, emin, emax = map(float, args[12:16])
+    npix, header = _mapHeader(mapsize, binsize, glon, glat, tmin, tmax, emin, emax)
+    rng = np.random.default_rng(zlib.crc32(outfile.encode()))
+    _writeMap(outfile, rng.poisson(0.5, (npix, npix)), header)
+
+def expmapgen(args):
+    outfile = args[0]
+    mapsize, binsize, glon, glat = map(float, args[6:10])
+    tmin, tmax, emin, emax = map(float, args[20:24])
+    npix, header = _mapHeader(mapsize, binsize, glon, glat, tmin, tmax, emin, emax)
+    _writeMap(outfile, np.full((npix, npix), 1e6*(tmax-tmin)/86400.0), header)
+
+def gasmapgen(args):
+    expfile, outfile = args[0], args[1]
+    header = fits.getheader(expfile)
+    data = fits.getdata(expfile)
+    _writeMap(outfile, np.ones_like(data), header)
+
+def intmapgen(args):
+    expfile, outfile, ctsfile = args[0], args[1], args[2]
+    header = fits.getheader(ctsfile)
+    cts = fits.getdata(ctsfile)
+    exp = fits.getdata(expfile)
+    _writeMap(outfile, np.divide(cts, exp, out=np.zeros_like(cts, dtype=float), where=exp!=0), header)
+
+def multi(args):
+    # maplist, 3 x matrixconf, ranal, galmode, isomode, sourcelist, outfile, ...
+    maplistFile, sourcelistFile, outfile = args[0], args[7], args[8]
+
+    with open(maplistFile) as mlf:
+        maplistRows = [line.split() for line in mlf if line.strip()]
+
+    numberOfMaps = len(maplistRows)
+    ctsHeaders = [fits.getheader(row[0]) for row in maplistRows]
+    tstart, tstop = ctsHeaders[0]["TSTART"], ctsHeaders[0]["TSTOP"]
+
+    energyBins = ",".join([f"{h['MINENG']:.0f}..{h['MAXENG']:.0f}" for h in ctsHeaders])
+    fovBins = ",".join([f"0..{row[3]}" for row in maplistRows])
+
+    with open(SOURCE_FILE_TEMPLATE) as tf:
+        templateLines = tf.readlines()
+
+    comments = [line for line in templateLines if line[0] == "!"]
+    body = [line for line in templateLines if line[0] != "!"]
+
+    with open(sourcelistFile) as slf:
+        sources = [line.split() for line in slf if line.strip()]
+
+    Path(outfile).parent.mkdir(parents=True, exist_ok=True)
+
+    for source in sources:
+        flux, glon, glat, name = source[0], source[1], source[2], source[6]
+
+        seed = zlib.crc32(f"{name}{tstart}".encode())
+        sqrtts = (seed % 1000) / 100.0
+
+        firstLine = body[0].split(" ")
+        firstLine[0], firstLine[5], firstLine[6], firstLine[7] = name, glon, glat, flux
+
+        coeffs = ",".join(["0.6"]*numberOfMaps) + " " + ",".join(["0"]*numberOfMaps) + "\n"
+
+        sourceBody = list(body)
+        sourceBody[0] = " ".join(firstLine)
+        sourceBody[1] = f"{sqrtts}\n"
+        sourceBody[8] = coeffs
+        sourceBody[9] = coeffs
+        sourceBody[10] = coeffs
+        sourceBody[11] = coeffs
+        sourceBody[12] = "{} {} {:.7f} {:.7f} {:.7f} {:.7f}\n".format(AstroUtils.time_tt_to_utc(tstart), AstroUtils.time_tt_to_utc(tstop), \
+                                                                     tstart, tstop, AstroUtils.time_tt_to_mjd(tstart), AstroUtils.time_tt_to_mjd(tstop))
+        sourceBody[13] = " ".join([energyBins, fovBins] + body[13].split(" ")[2:])
+
+        with open(f"{outfile}_{name}.source", "w") as sf:
+            sf.writelines(comments + sourceBody)
+
+TOOLS = {
+    "AG_ctsmapgen": ctsmapgen,
+    "AG_expmapgen": expmapgen,
+    "AG_gasmapgen": gasmapgen,
+    "AG_intmapgen": intmapgen,
+    "AG_multi": multi
+}
+
+def main():
+    toolName = os.path.basename(sys.argv[0])
+
+    if toolName not in TOOLS:
+        sys.exit("Unknown science tool stub: %s"%(toolName))
+
+    sleep(float(os.environ.get("AGILEPY_STUB_LATENCY", 0)))
+
+    TOOLS[toolName](sys.argv[1:])
+
+    print(f"{toolName} stub: done")
+
+if __name__ == "__main__":
+    main()
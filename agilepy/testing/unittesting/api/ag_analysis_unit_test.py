@@ -26,12 +26,14 @@
 #along with this program.  If not, see <https://www.gnu.org/licenses/>.
 
 import unittest
+import asyncio
 import os
 import shutil
 from pathlib import Path
 from time import sleep
 
 from agilepy.api.AGAnalysis import AGAnalysis
+from agilepy.utils.SkyMap import SkyMap
 
 class AGAnalysisUT(unittest.TestCase):
 
@@ -58,6 +60,33 @@ class AGAnalysisUT(unittest.TestCase):
         self.assertEqual(False, outDir.exists())
 
 
+    def test_from_template(self):
+
+        template = AGAnalysis(self.agilepyconfPath, self.sourcesconfPath)
+
+        outDir = Path(template.getOption("outdir")).joinpath("job_1")
+
+        ag = AGAnalysis.fromTemplate(template, outdir=str(outDir))
+
+        # no directory is created until a product is written
+        self.assertEqual(False, outDir.exists())
+        self.assertEqual(str(outDir), ag.getOption("outdir"))
+        self.assertNotEqual(str(outDir), template.getOption("outdir"))
+        self.assertIs(template.logger, ag.logger)
+
+        # the sources are copied
+        self.assertEqual([s.name for s in template.getSources()], [s.name for s in ag.getSources()])
+        ag.freeSources('name == "2AGLJ2021+4029"', "flux", False)
+        self.assertEqual(1, template.getSources()[0].spectrum.getFree("flux"))
+        self.assertEqual(0, ag.getSources()[0].spectrum.getFree("flux"))
+
+        sourceFile = ag.sourcesLibrary.writeToFile("sources")
+        self.assertEqual(True, os.path.isfile(sourceFile))
+
+        ag.destroy()
+        template.destroy()
+
+
     def test_generate_maps(self):
 
         ag = AGAnalysis(self.agilepyconfPath, self.sourcesconfPath)
@@ -78,6 +107,32 @@ class AGAnalysisUT(unittest.TestCase):
 
         ag.destroy()
 
+    def test_generate_maps_async(self):
+
+        ag = AGAnalysis(self.agilepyconfPath, self.sourcesconfPath)
+
+        outDir = ag.getOption("outdir")
+
+        maplistFilePath = asyncio.run(ag.generateMapsAsync(semaphore=asyncio.Semaphore(2)))
+        self.assertEqual(True, os.path.isfile(maplistFilePath))
+
+        maps = os.listdir(Path(outDir).joinpath("maps"))
+        self.assertEqual(16, len(maps))
+
+        with open(maplistFilePath) as mfp:
+            lines = mfp.readlines()
+
+        self.assertEqual(4, len(lines))
+
+        # the rows follow the (fov bin, energy bin) order, as in generateMaps()
+        self.assertEqual(True, "EMIN00100_EMAX00300_01" in lines[0])
+        self.assertEqual(True, "EMIN00300_EMAX01000_02" in lines[3])
+
+        # the par files are removed from the working directory
+        self.assertEqual(False, os.path.isfile("AG_ctsmapgen.par"))
+
+        ag.destroy()
+
     def test_update_gal_iso(self):
 
 
@@ -168,6 +223,29 @@ class AGAnalysisUT(unittest.TestCase):
 
         ag.destroy()
 
+    def test_ts_map(self):
+        ag = AGAnalysis(self.agilepyconfPath, self.sourcesconfPath)
+
+        tsMapFilePath, ulMapFilePath = ag.tsMap(size=1, step=0.5)
+
+        tsMap = SkyMap.read(tsMapFilePath)
+        ulMap = SkyMap.read(ulMapFilePath)
+
+        self.assertEqual((2, 2), tsMap.shape)
+        self.assertEqual((2, 2), ulMap.shape)
+        self.assertEqual(ag.getOption("glon"), tsMap.header["CRVAL1"])
+        self.assertEqual(ag.getOption("glat"), tsMap.header["CRVAL2"])
+        self.assertEqual(0.5, tsMap.header["CDELT2"])
+
+        # the maps are generated once for all the grid positions
+        self.assertEqual(1, len([f for f in os.listdir(Path(tsMapFilePath).parent) if f.endswith(".maplist4")]))
+
+        # every grid position has its own AG_multi outfile
+        outfiles = set(f.split("_TSMAP_")[0] for f in os.listdir(Path(tsMapFilePath).parent.joinpath("mle")) if "_TSMAP_" in f)
+        self.assertEqual(4, len(outfiles))
+
+        ag.destroy()
+
     def test_parse_maplistfile(self):
         ag = AGAnalysis(self.agilepyconfPath, self.sourcesconfPath)
 
@@ -288,6 +366,74 @@ class AGAnalysisUT(unittest.TestCase):
 
         self.assertEqual(True, os.path.isfile(lightCurveData))
 
+    def test_lc_concurrent_bins(self):
+        ag = AGAnalysis(self.agilepyconfPath, self.sourcesconfPath)
+
+        ag.setOptions(glon=78.2375, glat=2.12298)
+
+        ag.setOptions(tmin=456400000.000000, tmax=456500000.000000, timetype="TT")
+
+        ag.freeSources('name == "2AGLJ2021+4029"', "flux", True)
+
+        lightCurveData = ag.lightCurve("2AGLJ2021+4029", binsize=20000, concurrentBins=3)
+
+        self.assertEqual(True, os.path.isfile(lightCurveData))
+
+        with open(lightCurveData) as lcd:
+            self.assertEqual(6, len(lcd.readlines()))
+
+        # each bin has its own sources list file
+        binDirs = os.listdir(Path(ag.getOption("outdir")).joinpath("lc"))
+        for binDir in [bd for bd in binDirs if bd.startswith("bin_")]:
+            self.assertEqual(True, Path(ag.getOption("outdir")).joinpath("lc", binDir, "sourceLibrary00000.txt").is_file())
+
+        ag.destroy()
+
+    def test_adaptive_lc(self):
+        ag = AGAnalysis(self.agilepyconfPath, self.sourcesconfPath)
+
+        ag.setOptions(glon=78.2375, glat=2.12298)
+
+        ag.freeSources('name == "2AGLJ2021+4029"', "flux", True)
+
+        lightCurveData = ag.adaptiveLightCurve("2AGLJ2021+4029", tmin=456400000, tmax=456500000, timetype="TT", binsize=50000, minBinsize=20000, sqrtTSThreshold=0)
+
+        self.assertEqual(True, os.path.isfile(lightCurveData))
+
+        with open(lightCurveData) as lcd:
+            rows = [row.split() for row in lcd.readlines()[1:]]
+
+        # every bin is split once (sqrtTSThreshold=0): 2 initial bins, 4 final bins
+        self.assertEqual(4, len(rows))
+        self.assertEqual([456400000, 456425000, 456450000, 456475000], [float(row[17]) for row in rows])
+        self.assertEqual([456425000, 456450000, 456475000, 456500000], [float(row[18]) for row in rows])
+
+        ag.destroy()
+
+    def test_sliding_window_lc(self):
+        ag = AGAnalysis(self.agilepyconfPath, self.sourcesconfPath)
+
+        ag.setOptions(glon=78.2375, glat=2.12298)
+
+        ag.freeSources('name == "2AGLJ2021+4029"', "flux", True)
+
+        lightCurveData = ag.slidingWindowLightCurve("2AGLJ2021+4029", tmin=456400000, tmax=456500000, timetype="TT", windowSize=40000, step=20000)
+
+        self.assertEqual(True, os.path.isfile(lightCurveData))
+
+        with open(lightCurveData) as lcd:
+            rows = [row.split() for row in lcd.readlines()[1:]]
+
+        self.assertEqual(4, len(rows))
+        self.assertEqual([456400000, 456420000, 456440000, 456460000], [float(row[17]) for row in rows])
+        self.assertEqual([456440000, 456460000, 456480000, 456500000], [float(row[18]) for row in rows])
+
+        # the maps are generated once per sub-bin (20000 seconds)
+        subbins = os.listdir(Path(ag.getOption("outdir")).joinpath("lc_sliding", "subbins"))
+        self.assertEqual(5, len(subbins))
+
+        ag.destroy()
+
 
     """
     def test_display_sky_maps_singlemode_show(self):
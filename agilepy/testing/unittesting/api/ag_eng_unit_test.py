@@ -27,6 +27,7 @@
 
 import unittest
 import os
+import numpy as np
 import shutil
 from pathlib import Path
 
@@ -54,6 +55,41 @@ class AGEngUT(unittest.TestCase):
 
         # self.assertEqual(True, os.path.isfile(separationFile))
 
+    def test_compute_pointing_distances_from_sources(self):
+
+        step = 10
+        separations, ti_tt, tf_tt, src_ra, src_dec = self.ageng.computePointingDistancesFromSources(456361778, 456373279, src_x=[129.7, 78.2375], src_y=[3.7, 2.12298], ref="gal", step=step)
+
+        self.assertEqual((2, len(ti_tt)), separations.shape)
+        self.assertEqual(len(ti_tt), len(tf_tt))
+        self.assertEqual(2, len(src_ra))
+        self.assertEqual(2, len(src_dec))
+
+        # one pass for many sources is equivalent to one pass per source
+        singleSeparations, _, _, _, _, _, _, _ = self.ageng._computePointingDistancesFromSource(456361778, 456373279, src_x=129.7, src_y=3.7, ref="gal", zmax=60, step=step, logfilesIndex=None, writeFiles=False)
+
+        for idx, sep in enumerate(singleSeparations):
+            self.assertAlmostEqual(sep.value, separations[0][idx], places=6)
+
+    def test_compute_visibility_stats(self):
+
+        step = 10
+        zmax = 60
+        separations, ti_tt, tf_tt, _, _ = self.ageng.computePointingDistancesFromSources(456361778, 456373279, src_x=[129.7, 78.2375], src_y=[3.7, 2.12298], ref="gal", step=step)
+
+        stats, src_ra, src_dec = self.ageng.computeVisibilityStats(456361778, 456373279, src_x=[129.7, 78.2375], src_y=[3.7, 2.12298], ref="gal", zmax=zmax, step=step)
+
+        # the streaming reduction is equivalent to the reduction of the whole arrays
+        self.assertEqual(len(ti_tt), stats.count)
+        self.assertAlmostEqual(np.sum(tf_tt - ti_tt), stats.ttotal_obs, places=6)
+        for i in range(2):
+            self.assertEqual(np.histogram(separations[i], bins=[0, 10, 20, 30, 40, 50, 60, 70, 80])[0].tolist(), stats.hist[i].tolist())
+            self.assertAlmostEqual(np.sum((tf_tt - ti_tt)[separations[i] < zmax]), stats.timeUnderZmax[i], places=6)
+
+        histoplot = self.ageng.visibilityHisto(456361778, 456373279, src_x=129.7, src_y=3.7, ref="gal", zmax=zmax, step=step)
+
+        self.assertEqual(True, os.path.isfile(histoplot))
+
 
     def test_visibility_plot(self):
 
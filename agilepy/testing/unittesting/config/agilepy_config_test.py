@@ -78,6 +78,51 @@ class AgilepyConfigUT(unittest.TestCase):
 
 
 
+    def test_validation_incremental(self):
+
+        self.config = AgilepyConfig()
+        self.config.loadConfigurations(self.agilepyconfPath, validate=False)
+
+        # the index files are checked only if an option they depend on changes
+        self.config.addOptions("input", evtfile="/not/existing/EVT.index")
+
+        self.assertEqual(None, self.config.setOptions(filenameprefix="pippo", outdir="/tmp/pippo"))
+        self.assertRaises(ConfigurationsNotValidError, self.config.setOptions, emin=10, emax=0)
+        self.assertRaises(FileNotFoundError, self.config.setOptions, tmin=456361779, timetype="TT")
+
+    def test_index_lines_cache(self):
+
+        self.config = AgilepyConfig()
+        self.config.loadConfigurations(self.agilepyconfPath, validate=False)
+
+        evtfile = self.config.getOptionValue("evtfile")
+
+        lines = AgilepyConfig._getFirstAndLastLineInFile(evtfile)
+
+        self.assertIs(lines, AgilepyConfig._getFirstAndLastLineInFile(evtfile))
+
+    def test_index_lines_cache_update(self):
+
+        outDir = Path(os.path.join(os.environ["AGILE"], "agilepy-test-data/unittesting-output/config"))
+        outDir.mkdir(parents=True, exist_ok=True)
+
+        indexFile = outDir.joinpath("EVT.index")
+
+        # the index files must be longer than 500 bytes
+        for tstop in [4000, 5000, 6000]:
+            with open(indexFile, "w") as idx:
+                idx.write("".join([f"evt_{t}.evt.gz {t} {t+100} EVT\n" for t in range(0, tstop, 100)]))
+
+            firstLine, lastLine, _ = AgilepyConfig._getFirstAndLastLineInFile(str(indexFile))
+
+            self.assertEqual(("0", "100"), AgilepyConfig._extractTimes(firstLine))
+            self.assertEqual((str(tstop-100), str(tstop)), AgilepyConfig._extractTimes(lastLine))
+
+        # the updated file replaces the cached entry
+        self.assertEqual(1, len([key for key in AgilepyConfig._indexLinesCache if key == os.path.realpath(indexFile)]))
+        self.assertEqual(True, all(isinstance(key, str) for key in AgilepyConfig._indexLinesCache))
+
+
     def test_set_options(self):
 
         self.config = AgilepyConfig()
@@ -107,6 +152,48 @@ class AgilepyConfigUT(unittest.TestCase):
         self.assertRaises(ConfigurationsNotValidError, self.config.setOptions, isocoeff=[0.617196])
 
 
+    def test_get_copy(self):
+
+        self.config = AgilepyConfig()
+        self.config.loadConfigurations(self.agilepyconfPath, validate=False)
+
+        configCopy = AgilepyConfig.getCopy(self.config)
+
+        # the sections are shared until one of the two configurations writes them
+        self.assertIs(self.config.getConf("mle"), configCopy.getConf("mle"))
+
+        configCopy.setOptions(loccl=99)
+        configCopy.addOptions("selection", tmin=456361779)
+
+        self.assertEqual(9.21034, configCopy.getOptionValue("loccl"))
+        self.assertEqual(5.99147, self.config.getOptionValue("loccl"))
+        self.assertNotEqual(456361779, self.config.getOptionValue("tmin"))
+
+        self.config.setOptions(galcoeff=[0.6, 0.8, 0.6, 0.7])
+
+        self.assertNotEqual([0.6, 0.8, 0.6, 0.7], configCopy.getOptionValue("galcoeff"))
+        self.assertIs(self.config.getConf("maps"), configCopy.getConf("maps"))
+
+
+    def test_get_option_values(self):
+
+        self.config = AgilepyConfig()
+        self.config.loadConfigurations(self.agilepyconfPath, validate=False)
+
+        self.assertEqual([456361778, 456537945, "TT"], self.config.getOptionValues(["tmin", "tmax", "timetype"]))
+        self.assertRaises(OptionNotFoundInConfigFileError, self.config.getOptionValues, ["tmin", "pdor"])
+
+        self.config.addOptions("selection", maplist="maplist.txt")
+        self.assertEqual("selection", self.config.getSectionOfOption("maplist"))
+        self.assertEqual(["maplist.txt"], self.config.getOptionValues(["maplist"]))
+
+        # the options added to a copy are not visible from the original configuration
+        configCopy = AgilepyConfig.getCopy(self.config)
+        configCopy.addOptions("maps", expmap="map.exp.gz")
+        self.assertEqual("map.exp.gz", configCopy.getOptionValue("expmap"))
+        self.assertEqual(None, self.config.getSectionOfOption("expmap"))
+
+
     def test_energybins(self):
 
         self.config = AgilepyConfig()
@@ -26,16 +26,52 @@
 #along with this program.  If not, see <https://www.gnu.org/licenses/>.
 
 import os
+import atexit
+import sys
+import json
+import asyncio
 import shutil
 import unittest
+import numpy as np
+import scipy.ndimage as ndimage
 from pathlib import Path
 from time import sleep
 from datetime import datetime
+from multiprocessing import Process
+from unittest.mock import patch
 
 from agilepy.utils.AstroUtils import AstroUtils
 from agilepy.utils.AgilepyLogger import AgilepyLogger
+from agilepy.utils.AgilepyTracer import AgilepyTracer, traced
 from agilepy.utils.PlottingUtils import PlottingUtils
 from agilepy.config.AgilepyConfig import AgilepyConfig
+from agilepy.api.ScienceTools import CtsMapGenerator
+from agilepy.utils.ProcessWrapper import ProcessWrapper
+from agilepy.utils.SkyMap import SkyMap
+from agilepy.utils.SkyMapCache import SkyMapCache
+from agilepy.utils.SkyMapSmoother import SkyMapSmoother
+from agilepy.utils.RegionsCache import RegionsCache
+from agilepy.utils.ProductStore import ProductStore
+from agilepy.utils.SourceModel import Source, Spectrum, SpatialModel, MultiOutput
+from agilepy.utils.CustomExceptions import ScienceToolErrorCodeReturned, SkyMapsNotCompatibleError
+
+def loggerWorker(workersQueue, workerID):
+    logger = AgilepyLogger()
+    logger.initializeWorker(workersQueue, f"worker_{workerID}", 2)
+    logger.info(logger, "%s %s", "Info", "message")
+
+def productStoreWorker(storeDir, mapPath, outDir, key, iterations):
+    # it materializes the product and releases it in a loop: the object is removed and stored again many times
+    productStore = ProductStore.getStore(storeDir)
+    products = [str(Path(outDir).joinpath("maps", "testcase.gas.gz"))]
+    Path(products[0]).parent.mkdir(parents=True, exist_ok=True)
+    for _ in range(iterations):
+        if not productStore.fetch(key, products):
+            shutil.copy(mapPath, products[0])
+            productStore.put(key, products)
+        # the object is kept while it is referenced
+        assert os.path.samefile(products[0], productStore._getObjectPath(key, 0, products[0]))
+        productStore.release(outDir)
 
 class AgilepyUtilsUT(unittest.TestCase):
 
@@ -123,6 +159,31 @@ class AgilepyUtilsUT(unittest.TestCase):
 
         # self.assertEqual(True, os.path.isfile(file))
 
+    def test_render_batch(self):
+
+        pu = PlottingUtils(self.config, self.agilepyLogger)
+
+        img = self.datadir+"/testcase_EMIN00100_EMAX00300_01.cts.gz"
+        batchDir = self.outDir.joinpath("plots", "batch")
+        batchDir.mkdir(parents=True, exist_ok=True)
+
+        options = {"smooth": 4, "fileFormat": ".png", "cmap": "CMRmap", "regFilePath": None, "catalogRegions": None, "catalogRegionsColor": "red"}
+
+        jobs = [
+            ("displaySkyMap", dict(options, fitsFilepath=img, title="testcase", outputFilePath=str(batchDir.joinpath("map.png")))),
+            ("displaySkyMapsSingleMode", dict(options, fitsFilepaths=[img, img, img], titles=["1", "2", "3"], outputFilePath=str(batchDir.joinpath("maps.png")))),
+            ("saveLcImage", {"filename": self.datadir+"/lc-4.txt", "outputFilePath": str(batchDir.joinpath("lc.png"))}),
+            ("displaySkyMap", dict(options, fitsFilepath=self.datadir+"/not_existing.cts.gz", title="missing", outputFilePath=str(batchDir.joinpath("missing.png"))))
+        ]
+
+        outputFiles = pu.renderBatch(jobs, processes=2)
+
+        self.assertEqual([str(batchDir.joinpath(name)) for name in ["map.png", "maps.png", "lc.png"]] + [None], outputFiles)
+        for outputFile in outputFiles[:3]:
+            self.assertEqual(True, os.path.isfile(outputFile))
+
+        self.assertRaises(ValueError, pu.renderBatch, [("plotLc", {})])
+
     def test_initialize_logger_verboselvl_2(self):
         sleep(1.0)
         self.agilepyLogger.reset()
@@ -191,11 +252,346 @@ class AgilepyUtilsUT(unittest.TestCase):
             linesNumber = len(f.readlines())
             self.assertEqual(5, linesNumber)
 
+    def test_initialize_logger_async(self):
+        sleep(1.0)
+        self.agilepyLogger.reset()
+
+        logfilePath = self.agilepyLogger.initialize(self.config.getOptionValue("outdir"), "async_"+self.config.getOptionValue("logfilenameprefix"), 0, asyncMode=True, fileDebugLvl=1)
+
+        self.agilepyLogger.debug(self, "%s %s", "Debug", "message")
+        self.agilepyLogger.info(self, "%s %s", "Info", "message")
+        self.agilepyLogger.warning(self, "%s %s", "Warning", "message")
+        self.agilepyLogger.critical(self, "%s %s", "Critical", "message")
+
+        # the queue is flushed by reset()
+        self.agilepyLogger.reset()
+
+        with open(logfilePath, "r") as f:
+            lines = f.readlines()
+            # "loggers are active" + 3 messages + "Removing logger" (debug is disabled)
+            self.assertEqual(5, len(lines))
+            self.assertEqual(False, any("Debug message" in line for line in lines))
+
+        # the exit handler is removed by reset(): the handlers do not pile up across re-initializations
+        with patch.object(atexit, "register", wraps=atexit.register) as register, patch.object(atexit, "unregister", wraps=atexit.unregister) as unregister:
+            for _ in range(3):
+                self.agilepyLogger.initialize(self.config.getOptionValue("outdir"), "async_"+self.config.getOptionValue("logfilenameprefix"), 0, asyncMode=True)
+                self.assertEqual(True, self.agilepyLogger.atexitRegistered)
+                self.agilepyLogger.reset()
+                self.assertEqual(False, self.agilepyLogger.atexitRegistered)
+            self.assertEqual(3, register.call_count)
+            self.assertEqual(3, unregister.call_count)
+
+    def test_logger_workers(self):
+        sleep(1.0)
+        self.agilepyLogger.reset()
+
+        logfilePath = self.agilepyLogger.initialize(self.config.getOptionValue("outdir"), "workers_"+self.config.getOptionValue("logfilenameprefix"), 0)
+
+        workersQueue = self.agilepyLogger.startWorkersListener()
+
+        processes = [Process(target=loggerWorker, args=(workersQueue, workerID)) for workerID in range(3)]
+        for p in processes:
+            p.start()
+        for p in processes:
+            p.join()
+
+        self.agilepyLogger.stopWorkersListener()
+
+        with open(logfilePath, "r") as f:
+            lines = f.readlines()
+            self.assertEqual(4, len(lines))
+            for workerID in range(3):
+                self.assertEqual(1, sum(f"[worker_{workerID}] [AgilepyLogger] Info message" in line for line in lines))
+
+    def test_initialize_logger_rotating_file(self):
+        sleep(1.0)
+        self.agilepyLogger.reset()
+
+        logfilePath = self.agilepyLogger.initialize(self.config.getOptionValue("outdir"), "rotating_"+self.config.getOptionValue("logfilenameprefix"), 0, maxBytes=1000, backupCount=2)
+
+        for i in range(100):
+            self.agilepyLogger.info(self, "Info message %d", i)
+
+        self.assertEqual(True, logfilePath.with_suffix(".log.1").is_file())
+        self.assertEqual(True, logfilePath.with_suffix(".log.2").is_file())
+        self.assertEqual(False, logfilePath.with_suffix(".log.3").is_file())
+        self.assertEqual(True, logfilePath.stat().st_size <= 1000)
+
+
+
+    def test_tracer(self):
+
+        class Traced:
+            def __init__(self, tracer):
+                self.tracer = tracer
+            @traced("api")
+            def step(self, x):
+                return x*2
+
+        tracer = AgilepyTracer()
+
+        with tracer.span("AG_ctsmapgen", "tool", exe="AG_ctsmapgen") as attributes:
+            attributes["call"] = 0
+
+        self.assertEqual(4, Traced(tracer).step(2))
+
+        self.assertEqual(2, len(tracer.spans))
+        self.assertEqual({"exe": "AG_ctsmapgen", "call": 0}, tracer.spans[0]["attributes"])
+        self.assertEqual(True, tracer.spans[1]["name"].endswith("Traced.step"))
+        self.assertEqual(True, tracer.spans[1]["wall_s"] >= 0)
+
+        jsonlPath = tracer.export(self.outDir.joinpath("traces"), "jsonl")
+        with open(jsonlPath) as f:
+            self.assertEqual(2, len(f.readlines()))
+
+        chromePath = tracer.export(self.outDir.joinpath("traces"), "chrome")
+        with open(chromePath) as f:
+            self.assertEqual(2, len(json.load(f)["traceEvents"]))
+
+        # a disabled tracer does not record anything
+        disabledTracer = AgilepyTracer(enabled=False)
+        self.assertEqual(4, Traced(disabledTracer).step(2))
+        self.assertEqual(0, len(disabledTracer.spans))
+
+    def test_execute_command_output_tail(self):
+
+        tool = CtsMapGenerator("AG_ctsmapgen", self.agilepyLogger)
+
+        verboseTool = [sys.executable, "-c", "import sys\nfor i in range(5000): print(i)\nprint('error', file=sys.stderr)"]
+
+        stdout = tool.executeCommand(verboseTool)
+        self.assertEqual(ProcessWrapper.outputTailLines, len(stdout.split("\n")))
+        self.assertEqual("4999", stdout.split("\n")[-1])
+
+        self.assertEqual(stdout, asyncio.run(tool.executeCommandAsync(verboseTool)))
+
+        failingTool = [sys.executable, "-c", "import sys\nfor i in range(5000): print(i, file=sys.stderr)\nsys.exit(1)"]
+
+        with self.assertRaises(ScienceToolErrorCodeReturned) as cm:
+            tool.executeCommand(failingTool)
+        self.assertEqual(True, str(cm.exception).endswith("4999"))
+        self.assertEqual(False, "\n0\n" in str(cm.exception))
+
+        self.assertRaises(ScienceToolErrorCodeReturned, tool.executeCommand, ["AG_not_existing_tool"])
+
+    def test_sky_map(self):
+
+        ctsMap = SkyMap.read(self.datadir+"/testcase_EMIN00100_EMAX00300_01.cts.gz")
+
+        self.assertEqual((456361778, 456537945), ctsMap.getTimeRange())
+
+        # time stacking of two contiguous maps (the same map shifted in time)
+        nextCtsMap = SkyMap(data=ctsMap.data, header=ctsMap.header.copy())
+        nextCtsMap.header["TSTART"], nextCtsMap.header["TSTOP"] = 456537945, 456714112
+
+        stackedMap = SkyMap.stack([ctsMap, nextCtsMap])
+        self.assertEqual((456361778, 456714112), stackedMap.getTimeRange())
+        self.assertEqual(2*ctsMap.data.sum(), stackedMap.data.sum())
+        self.assertEqual(stackedMap.data.tolist(), ctsMap.sum(nextCtsMap).data.tolist())
+        self.assertEqual((456361778, 456714112), SkyMap.stack([nextCtsMap, ctsMap]).getTimeRange())
+
+        # overlapping time ranges and gaps are rejected
+        overlappingCtsMap = SkyMap(data=ctsMap.data, header=ctsMap.header.copy())
+        overlappingCtsMap.header["TSTART"], overlappingCtsMap.header["TSTOP"] = 456500000, 456714112
+        self.assertRaises(SkyMapsNotCompatibleError, ctsMap.sum, overlappingCtsMap)
+        self.assertRaises(SkyMapsNotCompatibleError, SkyMap.stack, [ctsMap, overlappingCtsMap])
+        self.assertRaises(SkyMapsNotCompatibleError, ctsMap.sum, ctsMap)
+
+        distantCtsMap = SkyMap(data=ctsMap.data, header=ctsMap.header.copy())
+        distantCtsMap.header["TSTART"], distantCtsMap.header["TSTOP"] = 456600000, 456714112
+        self.assertRaises(SkyMapsNotCompatibleError, ctsMap.sum, distantCtsMap)
+        self.assertRaises(SkyMapsNotCompatibleError, SkyMap.stack, [distantCtsMap, ctsMap])
+
+        # the difference recovers the original map, without overflows of the unsigned data
+        differenceMap = stackedMap.subtract(nextCtsMap)
+        self.assertEqual((456361778, 456537945), differenceMap.getTimeRange())
+        self.assertEqual(ctsMap.data.tolist(), differenceMap.data.tolist())
+        self.assertEqual(0, SkyMap(data=ctsMap.data, header=stackedMap.header).subtract(SkyMap(data=stackedMap.data, header=nextCtsMap.header)).data.max())
+        self.assertRaises(SkyMapsNotCompatibleError, stackedMap.subtract, stackedMap)
+
+        outputFilePath = differenceMap.write(self.outDir.joinpath("sky_map_test.cts.gz"))
+        writtenMap = SkyMap.read(outputFilePath)
+        self.assertEqual(ctsMap.data.tolist(), writtenMap.data.tolist())
+        self.assertEqual(ctsMap.header["DATE-OBS"], writtenMap.header["DATE-OBS"])
+        self.assertEqual(ctsMap.header["DATE-END"], writtenMap.header["DATE-END"])
+
+        ratioMap = ctsMap.ratio(stackedMap)
+        self.assertEqual(True, ((ratioMap.data == 0.5) | (stackedMap.data == 0)).all())
+
+        rebinnedMap = ctsMap.rebin(2)
+        self.assertEqual((100, 100), rebinnedMap.shape)
+        self.assertEqual(ctsMap.data.sum(), rebinnedMap.data.sum())
+        self.assertAlmostEqual(2*ctsMap.header["CDELT1"], rebinnedMap.header["CDELT1"])
+        self.assertEqual(ctsMap.wcs.pixel_to_world(0.5, 0.5).l.deg, rebinnedMap.wcs.pixel_to_world(0, 0).l.deg)
+        self.assertRaises(SkyMapsNotCompatibleError, ctsMap.sum, rebinnedMap)
+
+        l, b = ctsMap.header["CRVAL1"], ctsMap.header["CRVAL2"]
+        cutoutMap = ctsMap.cutout(l, b, 10)
+        self.assertEqual((50, 50), cutoutMap.shape)
+        center = cutoutMap.wcs.pixel_to_world(24.5, 24.5)
+        self.assertAlmostEqual(l, center.l.deg, places=1)
+        self.assertAlmostEqual(b, center.b.deg, places=1)
+
+
+
+    def test_sky_map_cache(self):
+
+        mapPath = self.datadir+"/testcase_EMIN00100_EMAX00300_01.cts.gz"
+
+        mapCache = SkyMapCache()
+
+        data, header, wcs = mapCache.get(mapPath)
+        self.assertIs(data, mapCache.get(mapPath)[0])
+        self.assertEqual((1, 1), (mapCache.hits, mapCache.misses))
+        self.assertEqual(False, data.flags.writeable)
+        self.assertEqual(data.nbytes, mapCache.currentBytes)
+
+        # a modified file is read again
+        self.outDir.mkdir(parents=True, exist_ok=True)
+        copyPath = self.outDir.joinpath("sky_map_cache_test.cts.gz")
+        shutil.copy(mapPath, copyPath)
+        self.assertIsNot(data, mapCache.get(copyPath)[0])
+        os.utime(copyPath, ns=(0, 0))
+        copyData, _, _ = mapCache.get(copyPath)
+        self.assertEqual(2, len(mapCache))
+        self.assertIs(copyData, mapCache.get(copyPath)[0])
+
+        # the least recently used map is evicted
+        mapCache.setMaxBytes(data.nbytes)
+        self.assertEqual(1, len(mapCache))
+        self.assertIs(copyData, mapCache.get(copyPath)[0])
+        self.assertIsNot(data, mapCache.get(mapPath)[0])
+
+        mapCache.setMaxBytes(0)
+        self.assertEqual(0, len(mapCache))
+        mapCache.get(mapPath)
+        self.assertEqual(0, mapCache.currentBytes)
+
+    def test_sky_map_smoother(self):
+
+        data = SkyMap.read(self.datadir+"/testcase_EMIN00100_EMAX00300_01.cts.gz").data
+
+        smoother = SkyMapSmoother()
+
+        for sigma in [0.5, 4, 60]:
+            self.assertAlmostEqual(0, np.abs(ndimage.gaussian_filter(data, sigma=sigma, output=float) - smoother.smooth(data, sigma)).max(), places=10)
+
+        smoothed = smoother.smooth(data, 4, key="testcase")
+        self.assertIs(smoothed, smoother.smooth(data, 4, key="testcase"))
+        self.assertEqual(False, smoothed.flags.writeable)
+
+        # 68% containment radius of 3.5 deg at 100 MeV, 1.2 deg at 1 GeV
+        header = {"MINENG": 100, "MAXENG": 100, "CDELT1": -0.1}
+        self.assertAlmostEqual(3.5, SkyMapSmoother.getPsfSigma(header) * 0.1 * np.sqrt(-2 * np.log(0.32)))
+        header = {"MINENG": 1000, "MAXENG": 1000, "CDELT1": -0.1}
+        self.assertAlmostEqual(1.2, SkyMapSmoother.getPsfSigma(header) * 0.1 * np.sqrt(-2 * np.log(0.32)))
+
+    def test_regions_cache(self):
+
+        regionFile = self.currentDirPath.parents[2].joinpath("utils", "examples", "2AGL_2.reg")
+
+        wcs = SkyMap.read(self.datadir+"/testcase_EMIN00100_EMAX00300_01.cts.gz").wcs
+
+        regionsCache = RegionsCache()
+
+        _, regions, _, _ = regionsCache.getRegions(regionFile)
+        self.assertIs(regions, regionsCache.getRegions(regionFile)[1])
+
+        pixelRegions = regionsCache.getPixelRegions(regionFile, wcs)
+        self.assertIs(pixelRegions, regionsCache.getPixelRegions(regionFile, wcs))
+
+        # only the regions overlapping the map are projected
+        nx, ny = wcs.pixel_shape
+        overlapping = [region.to_pixel(wcs=wcs) for region in regions]
+        overlapping = [pr for pr in overlapping if -0.5 - pr.width <= pr.center.x <= nx - 0.5 + pr.width and -0.5 - pr.width <= pr.center.y <= ny - 0.5 + pr.width]
+        self.assertEqual(True, 0 < len(pixelRegions) < len(regions))
+        self.assertEqual(sorted(pr.center.x for pr in overlapping), sorted(pr.center.x for pr in pixelRegions))
+
+        # a modified file is parsed again
+        self.outDir.mkdir(parents=True, exist_ok=True)
+        copyPath = self.outDir.joinpath("regions_cache_test.reg")
+        shutil.copy(regionFile, copyPath)
+        copyRegions = regionsCache.getRegions(copyPath)[1]
+        os.utime(copyPath, ns=(0, 0))
+        self.assertIsNot(copyRegions, regionsCache.getRegions(copyPath)[1])
+
+    def test_product_store(self):
+
+        mapPath = self.datadir+"/testcase_EMIN00100_EMAX00300_01.cts.gz"
+
+        storeDir = self.outDir.joinpath("product_store")
+        if storeDir.exists():
+            shutil.rmtree(storeDir)
+
+        productStore = ProductStore.getStore(storeDir)
+        self.assertIs(productStore, ProductStore.getStore(str(storeDir)))
+        self.assertIsNone(ProductStore.getStore(None))
+
+        products1 = [str(self.outDir.joinpath("analysis_1", "maps", "testcase.gas.gz"))]
+        products2 = [str(self.outDir.joinpath("analysis_2", "maps", "testcase.gas.gz"))]
+
+        # the key depends on the input files, not on the output paths
+        key = productStore.getKey("AG_gasmapgen", [mapPath, products1[0], "skymapL"], products1)
+        self.assertEqual(key, productStore.getKey("AG_gasmapgen", [mapPath, products2[0], "skymapL"], products2))
+        self.assertNotEqual(key, productStore.getKey("AG_gasmapgen", [mapPath, products1[0], "skymapH"], products1))
+
+        self.assertEqual(False, productStore.fetch(key, products1))
+
+        for products in [products1, products2]:
+            Path(products[0]).parent.mkdir(parents=True, exist_ok=True)
+        shutil.copy(mapPath, products1[0])
+        productStore.put(key, products1)
+
+        # the stored product is materialized by a link
+        self.assertEqual(True, productStore.fetch(key, products2))
+        self.assertEqual(os.stat(products1[0]).st_ino, os.stat(products2[0]).st_ino)
+        self.assertEqual((1, 1), (productStore.hits, productStore.misses))
+
+        # the products used by another analysis are kept
+        self.assertEqual(0, productStore.release(self.outDir.joinpath("analysis_1")))
+        self.assertEqual(True, productStore.fetch(key, products1))
+
+        self.assertEqual(0, productStore.release(self.outDir.joinpath("analysis_2")))
+        self.assertEqual(1, productStore.release(self.outDir.joinpath("analysis_1")))
+        self.assertEqual(False, productStore.fetch(key, products1))
+
+        # the references of the deleted products are dropped by gc()
+        productStore.put(key, products2)
+        shutil.rmtree(self.outDir.joinpath("analysis_2"))
+        self.assertEqual(1, productStore.gc())
+
+        # two processes fetching and releasing the same object at once
+        processes = [Process(target=productStoreWorker, args=(storeDir, mapPath, self.outDir.joinpath(f"analysis_p{pID}"), key, 200)) for pID in range(2)]
+        for p in processes:
+            p.start()
+        for p in processes:
+            p.join()
+
+        self.assertEqual([0, 0], [p.exitcode for p in processes])
+        self.assertEqual([], list(storeDir.joinpath("refs").iterdir()))
+        self.assertEqual(0, productStore.gc())
+
+    def test_source_model(self):
 
+        source = Source("2AGLJ2021+4029", "PointSource")
+        source.spectrum = Spectrum.getSpectrumObject("PLExpCutoff")
+        source.spatialModel = SpatialModel.getSpatialModelObject("PointSource", 0)
+        source.multi = MultiOutput()
 
+        # the objects have no instance dictionary
+        for obj in [source, source.spectrum, source.spatialModel, source.multi, source.spectrum.flux, source.spatialModel.dist]:
+            self.assertEqual(False, hasattr(obj, "__dict__"))
 
+        self.assertEqual(["flux", "index", "cutoffEnergy"], list(source.spectrum.getParameters()))
+        self.assertEqual(["pos"], list(source.spatialModel.getParameters()))
 
+        source.spectrum.index.setAttributes(value=2.1, free=1)
+        self.assertEqual({"name": "index", "value": "2.1", "free": "1", "scale": "-1.0", "min": "0.5", "max": "5"}, source.spectrum.index.toDict())
 
+        source.spatialModel.set("pos", "(78.2375, 2.12298)")
+        self.assertEqual((78.2375, 2.12298), source.spatialModel.get("pos"))
+        self.assertEqual([{"name": "pos", "value": "(78.2375, 2.12298)", "free": "0"}], source.spatialModel.getParameterDict())
 
     """
     Time conversions
@@ -26,20 +26,65 @@
 #along with this program.  If not, see <https://www.gnu.org/licenses/>.
 
 import sys
+import queue
+import atexit
 import logging
+import multiprocessing
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
 from pathlib import Path
 
 from agilepy.utils.CustomExceptions import LoggerTypeNotFound
 
+class LazyQueueHandler(QueueHandler):
+    """
+    A QueueHandler that does not format the records in the calling thread:
+    the formatting is done by the QueueListener thread, when the record is written.
+    """
+    def prepare(self, record):
+        return record
+
+class WorkerQueueHandler(QueueHandler):
+    """
+    A QueueHandler used by the worker processes: each message is formatted
+    (hence it can be pickled) and tagged with the name of the worker.
+    """
+    def __init__(self, queue, workerName):
+        super().__init__(queue)
+        self.workerName = workerName
+
+    def prepare(self, record):
+        record = super().prepare(record)
+        record.msg = "[%s] %s"%(self.workerName, record.msg)
+        return record
+
 class AgilepyLogger():
 
     def __init__(self):
         self.debug_lvl = None
         self.logger = None
         self.initialized = False
-
-    def initialize(self, outputDirectory, logFilenamePrefix, debug_lvl = 2):
-
+        self.listener = None
+        self.atexitRegistered = False
+        self.loggers = []
+        self.handlers = []
+        self.workersManager = None
+        self.workersQueue = None
+        self.workersListener = None
+
+    def initialize(self, outputDirectory, logFilenamePrefix, debug_lvl = 2, asyncMode = False, fileDebugLvl = 2, maxBytes = 0, backupCount = 0):
+        """
+        Args:
+            outputDirectory (str): the log file is written in the 'logs' subdirectory.
+            logFilenamePrefix (str): the log file name prefix.
+            debug_lvl (int): the verbosity of the console logger (0, 1 or 2).
+            asyncMode (bool): if True, the messages are written by a background thread.
+            fileDebugLvl (int): the verbosity of the file logger (0, 1 or 2).
+            maxBytes (int): if greater than 0, the log file is rotated when it reaches maxBytes bytes.
+            backupCount (int): the number of rotated log files to keep.
+
+        Returns:
+            The path to the log file.
+        """
         self.outputDirectory = Path(outputDirectory).joinpath('logs')
 
         self.logfilePath = self.outputDirectory.joinpath(f"{logFilenamePrefix}").with_suffix(".log")
@@ -53,49 +98,157 @@ class AgilepyLogger():
 
         self.outputDirectory.mkdir(parents=True, exist_ok=True)
 
-        # CRITICAL: always present in the log.
+        debug_lvl_enum = AgilepyLogger._getLevel(debug_lvl)
 
-        # WARNING: An indication that something unexpected happened, or indicative
-        # of some problem in the near future (e.g. ‘disk space low’). The software is
-        # still working as expected.
-        if self.debug_lvl == 0: debug_lvl_enum = logging.WARNING
+        file_debug_lvl_enum = AgilepyLogger._getLevel(fileDebugLvl)
 
-        # INFO: Confirmation that things are working as expected.
-        if self.debug_lvl == 1: debug_lvl_enum = logging.INFO
+        # formatter
+        logFormatter = logging.Formatter("%(asctime)s [%(levelname)-8.8s] %(message)s")
 
-        # DEBUG: Detailed information, typically of interest only when diagnosing problems.
-        if self.debug_lvl == 2: debug_lvl_enum = logging.DEBUG
+        if asyncMode:
 
+            consoleHandler = AgilepyLogger.setupHandler("console", logFormatter, debug_lvl_enum)
 
+            fileHandler = AgilepyLogger.setupHandler("file", logFormatter, file_debug_lvl_enum, self.logfilePath, maxBytes, backupCount)
 
-        # formatter
-        logFormatter = logging.Formatter("%(asctime)s [%(levelname)-8.8s] %(message)s")
+            self.queue = queue.Queue(-1)
+
+            self.listener = QueueListener(self.queue, fileHandler, consoleHandler, respect_handler_level=True)
+
+            self.listener.start()
 
-        self.consoleLogger = AgilepyLogger.setupLogger("Console logger", "console", logFormatter, debug_lvl_enum)
+            # the messages still in the queue are written when the interpreter exits (once per logger, see reset())
+            if not self.atexitRegistered:
+                atexit.register(self._stopListener)
+                self.atexitRegistered = True
+
+            queueLogger = logging.getLogger("Queue logger")
+            queueLogger.setLevel(min(debug_lvl_enum, file_debug_lvl_enum))
+            queueLogger.addHandler(LazyQueueHandler(self.queue))
+
+            self.fileLogger = queueLogger
+            self.consoleLogger = queueLogger
+            self.loggers = [queueLogger]
+            self.handlers = [fileHandler, consoleHandler]
+
+        else:
 
-        self.fileLogger = AgilepyLogger.setupLogger("File logger", "file", logFormatter, logging.DEBUG, self.logfilePath)
+            self.consoleLogger = AgilepyLogger.setupLogger("Console logger", "console", logFormatter, debug_lvl_enum)
 
-        self.fileLogger.info("[%s] File and Console loggers are active. Log file: %s", type(self).__name__, self.logfilePath)
-        self.consoleLogger.info("[%s] File and Console loggers are active. Log file: %s", type(self).__name__, self.logfilePath)
+            self.fileLogger = AgilepyLogger.setupLogger("File logger", "file", logFormatter, file_debug_lvl_enum, self.logfilePath, maxBytes, backupCount)
+
+            self.loggers = [self.fileLogger, self.consoleLogger]
+            self.handlers = [self.fileLogger.handlers[-1], self.consoleLogger.handlers[-1]]
 
         self.initialized = True
 
+        self.info(self, "File and Console loggers are active. Log file: %s", self.logfilePath)
+
         return Path(self.logfilePath)
 
+    def initializeWorker(self, workersQueue, workerName, debug_lvl = 2):
+        """
+        It initializes the logger of a worker process: the messages are sent to the
+        listener started by the parent process with startWorkersListener(), that writes
+        them in the parent log tagged with the worker name.
+
+        Args:
+            workersQueue: the queue returned by startWorkersListener().
+            workerName (str): the tag of the messages of this worker.
+            debug_lvl (int): the verbosity of this worker (0, 1 or 2).
+        """
+        if self.initialized:
+            return
+
+        self.debug_lvl = debug_lvl
+
+        # the logger name is unique, its handler is not shared with other loggers of the same process
+        workerLogger = logging.getLogger(f"Worker logger {workerName} {id(self)}")
+        workerLogger.setLevel(AgilepyLogger._getLevel(debug_lvl))
+        workerLogger.propagate = False
+        workerLogger.addHandler(WorkerQueueHandler(workersQueue, workerName))
+
+        self.fileLogger = workerLogger
+        self.consoleLogger = workerLogger
+        self.loggers = [workerLogger]
+
+        self.initialized = True
+
+    def startWorkersListener(self):
+        """
+        It starts (once) a listener writing the messages of the worker processes
+        with the handlers of this logger.
+
+        Returns:
+            The queue to be passed to initializeWorker() by each worker process.
+        """
+        if self.workersListener is None:
+
+            self.workersManager = multiprocessing.Manager()
+
+            self.workersQueue = self.workersManager.Queue(-1)
+
+            self.workersListener = QueueListener(self.workersQueue, *self.handlers, respect_handler_level=True)
+
+            self.workersListener.start()
+
+        return self.workersQueue
+
+    def stopWorkersListener(self):
+        """
+        It writes the messages still in the queue and stops the listener of the worker processes.
+        """
+        if self.workersListener is not None:
+
+            self.workersListener.stop()
+
+            self.workersManager.shutdown()
+
+            self.workersListener = None
+            self.workersQueue = None
+            self.workersManager = None
+
     @staticmethod
-    def setupLogger(name, loggerType, formatter, level, log_file=None):
-        """To setup as many loggers as you want"""
+    def _getLevel(debug_lvl):
+
+        # CRITICAL: always present in the log.
+
+        # WARNING: An indication that something unexpected happened, or indicative
+        # of some problem in the near future (e.g. ‘disk space low’). The software is
+        # still working as expected.
+        if debug_lvl == 0: return logging.WARNING
+
+        # INFO: Confirmation that things are working as expected.
+        if debug_lvl == 1: return logging.INFO
+
+        # DEBUG: Detailed information, typically of interest only when diagnosing problems.
+        return logging.DEBUG
 
-        if loggerType == "file":
+    @staticmethod
+    def setupHandler(handlerType, formatter, level, log_file=None, maxBytes=0, backupCount=0):
+
+        if handlerType == "file" and maxBytes > 0:
+            handler = RotatingFileHandler(log_file, maxBytes=maxBytes, backupCount=backupCount)
+
+        elif handlerType == "file":
             handler = logging.FileHandler(log_file)
 
-        elif loggerType== "console":
+        elif handlerType == "console":
             handler = logging.StreamHandler(sys.stdout)
 
         else:
-            raise LoggerTypeNotFound("Logger of type %s is not supported"%(loggerType))
+            raise LoggerTypeNotFound("Logger of type %s is not supported"%(handlerType))
 
         handler.setFormatter(formatter)
+        handler.setLevel(level)
+
+        return handler
+
+    @staticmethod
+    def setupLogger(name, loggerType, formatter, level, log_file=None, maxBytes=0, backupCount=0):
+        """To setup as many loggers as you want"""
+
+        handler = AgilepyLogger.setupHandler(loggerType, formatter, level, log_file, maxBytes, backupCount)
 
         logger = logging.getLogger(name)
         logger.setLevel(level)
@@ -103,37 +256,53 @@ class AgilepyLogger():
 
         return logger
 
-    def critical(self, context, message, *arguments):
+    def _log(self, level, context, message, arguments):
         if not self.initialized: return
-        self.fileLogger.critical("[%s] " + message, type(context).__name__, *arguments)
-        self.consoleLogger.critical("[%s] " + message, type(context).__name__, *arguments)
+        for logger in self.loggers:
+            # the message is not formatted if the level is disabled
+            if logger.isEnabledFor(level):
+                logger.log(level, "[%s] " + message, type(context).__name__, *arguments)
+
+    def critical(self, context, message, *arguments):
+        self._log(logging.CRITICAL, context, message, arguments)
 
     def info(self, context, message, *arguments):
-        if not self.initialized: return
-        self.fileLogger.info("[%s] " + message, type(context).__name__, *arguments)
-        self.consoleLogger.info("[%s] " + message, type(context).__name__, *arguments)
+        self._log(logging.INFO, context, message, arguments)
 
     def warning(self, context, message, *arguments):
-        if not self.initialized: return
-        self.fileLogger.warning("[%s] " + message, type(context).__name__, *arguments)
-        self.consoleLogger.warning("[%s] " + message, type(context).__name__, *arguments)
+        self._log(logging.WARNING, context, message, arguments)
 
     def debug(self, context, message, *arguments):
-        if not self.initialized: return
-        self.fileLogger.debug("[%s] " + message, type(context).__name__, *arguments)
-        self.consoleLogger.debug("[%s] " + message, type(context).__name__, *arguments)
+        self._log(logging.DEBUG, context, message, arguments)
+
+    def _stopListener(self):
+        if self.listener:
+            # it writes the messages still in the queue before returning
+            self.listener.stop()
+            for handler in self.listener.handlers:
+                handler.close()
+            self.listener = None
 
     def reset(self):
         if self.initialized:
 
-            self.fileLogger.info("[%s] Removing logger...", type(self).__name__)
-            for handler in self.fileLogger.handlers[:]:
-                handler.close()
-                self.fileLogger.removeHandler(handler)
+            self.info(self, "Removing logger...")
 
-            self.consoleLogger.info("[%s] Removing logger...", type(self).__name__)
-            for handler in self.consoleLogger.handlers[:]:
-                handler.close()
-                self.consoleLogger.removeHandler(handler)
+            self.stopWorkersListener()
+
+            self._stopListener()
+
+            # the exit handler would keep this logger alive until the interpreter exits
+            if self.atexitRegistered:
+                atexit.unregister(self._stopListener)
+                self.atexitRegistered = False
+
+            for logger in self.loggers:
+                for handler in logger.handlers[:]:
+                    handler.close()
+                    logger.removeHandler(handler)
+
+            self.loggers = []
+            self.handlers = []
 
         self.initialized = False
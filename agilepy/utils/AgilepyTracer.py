@@ -0,0 +1,167 @@
+# DESCRIPTION
+#       Agilepy software
+#
+# NOTICE
+#      Any information contained in this software
+#      is property of the AGILE TEAM and is strictly
+#      private and confidential.
+#      Copyright (C) 2005-2020 AGILE Team.
+#          Baroncelli Leonardo <leonardo.baroncelli@inaf.it>
+#          Addis Antonio <antonio.addis@inaf.it>
+#          Bulgarelli Andrea <andrea.bulgarelli@inaf.it>
+#          Parmiggiani Nicolò <nicolo.parmiggiani@inaf.it>
+#      All rights reserved.
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+import os
+import json
+import resource
+import threading
+from time import time, perf_counter, process_time
+from functools import wraps
+from pathlib import Path
+from contextlib import contextmanager
+
+from agilepy.utils.CustomExceptions import TraceFormatNotSupportedError
+
+def traced(category):
+    """
+    Decorator tracing a method of an object having a 'tracer' attribute.
+    The span is named after the qualified name of the method.
+    """
+    def decorator(method):
+        @wraps(method)
+        def wrapper(self, *args, **kwargs):
+            with self.tracer.span(method.__qualname__, category):
+                return method(self, *args, **kwargs)
+        return wrapper
+    return decorator
+
+class AgilepyTracer:
+    """
+    It records spans (API calls, science tool invocations, parsing steps) with their
+    wall and CPU times. The CPU time and the peak RSS of the child processes are read
+    with resource.getrusage(RUSAGE_CHILDREN): note that the peak RSS is the maximum
+    among all the child processes terminated so far, not only the ones of the span.
+
+    The spans can be exported as JSON lines or as a Chrome trace file
+    (it can be opened with chrome://tracing or https://ui.perfetto.dev).
+    """
+    def __init__(self, enabled=True):
+        self.enabled = enabled
+        self.spans = []
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def span(self, name, category, **attributes):
+        """
+        Context manager recording a span. It yields a dictionary of attributes
+        that can be updated while the span is active. If the tracer is disabled it does nothing.
+
+        Args:
+            name (str): the span name.
+            category (str): the span category (e.g. "api", "tool", "parsing").
+            **attributes: additional attributes of the span.
+        """
+        if not self.enabled:
+            yield attributes
+            return
+
+        childrenStart = resource.getrusage(resource.RUSAGE_CHILDREN)
+        start = time()
+        wallStart = perf_counter()
+        cpuStart = process_time()
+
+        try:
+            yield attributes
+
+        finally:
+            wall = perf_counter() - wallStart
+            cpu = process_time() - cpuStart
+            childrenEnd = resource.getrusage(resource.RUSAGE_CHILDREN)
+
+            span = {
+                "name": name,
+                "category": category,
+                "start": start,
+                "wall_s": wall,
+                "cpu_s": cpu,
+                "children_cpu_s": (childrenEnd.ru_utime + childrenEnd.ru_stime) - (childrenStart.ru_utime + childrenStart.ru_stime),
+                "children_maxrss_kb": childrenEnd.ru_maxrss,
+                "pid": os.getpid(),
+                "tid": threading.get_ident(),
+                "attributes": attributes
+            }
+
+            with self._lock:
+                self.spans.append(span)
+
+    def reset(self):
+        with self._lock:
+            self.spans = []
+
+    def export(self, outDir, fileFormat="jsonl", filenamePrefix="trace"):
+        """
+        It writes the recorded spans on file.
+
+        Args:
+            outDir (str): the output directory.
+            fileFormat (str): "jsonl" (one span per line) or "chrome" (Chrome trace event format).
+            filenamePrefix (str): the prefix of the output file name.
+
+        Returns:
+            The path to the trace file.
+        """
+        outDir = Path(outDir)
+        outDir.mkdir(parents=True, exist_ok=True)
+
+        with self._lock:
+            spans = list(self.spans)
+
+        if fileFormat == "jsonl":
+
+            filePath = outDir.joinpath(filenamePrefix+".jsonl")
+
+            with open(filePath, "w") as f:
+                for span in spans:
+                    f.write(json.dumps(span, default=str)+"\n")
+
+        elif fileFormat == "chrome":
+
+            filePath = outDir.joinpath(filenamePrefix+".json")
+
+            traceEvents = []
+
+            for span in spans:
+                args = dict(span["attributes"])
+                args.update({key: span[key] for key in ["cpu_s", "children_cpu_s", "children_maxrss_kb"]})
+                traceEvents.append({
+                    "name": span["name"],
+                    "cat": span["category"],
+                    "ph": "X",
+                    "ts": span["start"] * 1e6,
+                    "dur": span["wall_s"] * 1e6,
+                    "pid": span["pid"],
+                    "tid": span["tid"],
+                    "args": args
+                })
+
+            with open(filePath, "w") as f:
+                json.dump({"traceEvents": traceEvents, "displayTimeUnit": "ms"}, f, default=str)
+
+        else:
+            raise TraceFormatNotSupportedError("Trace format %s is not supported. Supported formats: 'jsonl', 'chrome'"%(fileFormat))
+
+        return str(filePath)
@@ -105,3 +105,11 @@ class SpectrumTypeNotFoundError(Exception):
 class MultiOutputNotFoundError(Exception):
     def __init__(self, message):
         super().__init__(message)
+
+class TraceFormatNotSupportedError(Exception):
+    def __init__(self, message):
+        super().__init__(message)
+
+class SkyMapsNotCompatibleError(Exception):
+    def __init__(self, message):
+        super().__init__(message)
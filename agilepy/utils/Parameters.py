@@ -28,19 +28,35 @@
 
 import os
 
-class Parameters:
+class _EnvironmentPaths(type):
+    """
+    The paths depending on $AGILE are computed when they are accessed, not when the module is imported.
+    """
+    _dataFiles = {
+        "_skymap": "{}_{}.SKY002.SFMG_H0025.disp.conv.sky.gz",
+        "sarmatrix": "AG_GRID_G0017_SFMG_H0025.sar.gz",
+        "edpmatrix": "AG_GRID_G0017_SFMG_H0025.edp.gz",
+        "psdmatrix": "AG_GRID_G0017_SFMG_H0025.psd.gz"
+    }
 
-    datapath = os.path.join(os.environ["AGILE"], "model/scientific_analysis/data")
+    def __getattr__(cls, name):
 
-    _skymap = os.path.join(datapath, "{}_{}.SKY002.SFMG_H0025.disp.conv.sky.gz")
-    _mapNamePrefix = "EMIN{}_EMAX{}_{}"
+        if name == "datapath":
+            return os.path.join(os.environ["AGILE"], "model/scientific_analysis/data")
+
+        if name in _EnvironmentPaths._dataFiles:
+            return os.path.join(cls.datapath, _EnvironmentPaths._dataFiles[name])
+
+        if name == "matrixconf":
+            return cls.sarmatrix + " " + cls.edpmatrix + " " + cls.psdmatrix
 
-    # constants
-    sarmatrix = os.path.join(datapath, "AG_GRID_G0017_SFMG_H0025.sar.gz")
-    edpmatrix = os.path.join(datapath, "AG_GRID_G0017_SFMG_H0025.edp.gz")
-    psdmatrix = os.path.join(datapath, "AG_GRID_G0017_SFMG_H0025.psd.gz")
+        raise AttributeError(f"type object '{cls.__name__}' has no attribute '{name}'")
 
-    matrixconf = sarmatrix + " " + edpmatrix + " " + psdmatrix
+class Parameters(metaclass=_EnvironmentPaths):
+
+    # datapath, sarmatrix, edpmatrix, psdmatrix and matrixconf are computed from $AGILE (see _EnvironmentPaths)
+
+    _mapNamePrefix = "EMIN{}_EMAX{}_{}"
 
     energybins = [[10000,50000],
                   [1000,3000],
@@ -26,12 +26,10 @@
 # along with this program.  If not, see <https://www.gnu.org/licenses/>.
 
 
-#mpl.use("Agg")
+import os
+import multiprocessing
+import matplotlib
 import matplotlib.pyplot as plt
-from astropy.wcs import WCS
-from astropy.io import fits
-from regions import read_ds9
-import scipy.ndimage as ndimage
 import ntpath
 from os.path import join
 import numpy as np
@@ -41,10 +39,29 @@ import plotly.graph_objects as go
 import pandas as pd
 
 from agilepy.utils.Utils import Singleton
+from agilepy.config.AgilepyConfig import AgilepyConfig
+from agilepy.utils.AgilepyLogger import AgilepyLogger
+from agilepy.utils.SkyMapCache import SkyMapCache
+from agilepy.utils.SkyMapSmoother import SkyMapSmoother
+from agilepy.utils.RegionsCache import RegionsCache
+from agilepy.utils.VisibilityStats import VisibilityStats
 
 
 class PlottingUtils(metaclass=Singleton):
 
+    _smoother = SkyMapSmoother()
+
+    _regionsCache = RegionsCache()
+
+    # the methods that can be called by renderBatch()
+    BATCH_METHODS = ["displaySkyMap", "displaySkyMapsSingleMode", "saveLcImage"]
+
+    # the worker processes of renderBatch() are replaced after this number of images, releasing their memory
+    renderTasksPerWorker = 100
+
+    # the PlottingUtils object of a renderBatch() worker process
+    _workerInstance = None
+
     def __init__(self, agilepyConfig, agilepyLogger):
 
         self.config = agilepyConfig
@@ -60,7 +77,7 @@ class PlottingUtils(metaclass=Singleton):
             "2AGL":"$AGILE/catalogs/2AGL_2.reg"
         }
 
-    def displaySkyMapsSingleMode(self, fitsFilepaths, smooth, saveImage, fileFormat, titles, cmap, regFilePath, catalogRegions, catalogRegionsColor):
+    def displaySkyMapsSingleMode(self, fitsFilepaths, smooth, saveImage, fileFormat, titles, cmap, regFilePath, catalogRegions, catalogRegionsColor, outputFilePath=None):
         # self._updateRC()
 
         regionsFiles = self._getRegionsFiles(regFilePath, catalogRegions)
@@ -73,21 +90,18 @@ class PlottingUtils(metaclass=Singleton):
             numberOfSubplots += 1
             hideLast = True
 
-        hdu = fits.open(fitsFilepaths[0])[0]
-        wcs = WCS(hdu.header)
+        mapCache = self._getMapCache()
+
+        _, _, wcs = mapCache.get(fitsFilepaths[0])
         fig, axs = plt.subplots(int(numberOfSubplots/2),int(numberOfSubplots/2), subplot_kw={'projection': wcs}, figsize=(12, 12))
 
         for idx, fitsImage in enumerate(fitsFilepaths):
 
             row,col = self._getCell(idx, int(numberOfSubplots/2))
 
-            hdu = fits.open(fitsFilepaths[idx])[0]
-            wcs = WCS(hdu.header)
+            data, header, wcs = mapCache.get(fitsImage)
 
-            if smooth > 0:
-                data = ndimage.gaussian_filter(hdu.data, sigma=float(smooth), order=0, output=float)
-            else:
-                data = hdu.data
+            data = self._smoothSkyMap(fitsImage, data, header, smooth)
 
             im = axs[row][col].imshow(data, origin='lower', norm=None, cmap=cmap)
 
@@ -105,50 +119,53 @@ class PlottingUtils(metaclass=Singleton):
         plt.subplots_adjust(bottom=-0.1)
 
         if saveImage:
-            _, filename = ntpath.split(fitsFilepaths[0])
-            values = filename.split("_")
-            prefix = values[0]
-            suffix = values[-1]
-            skymaptype = suffix.split(".")[1]
-            filename = self.outdir.joinpath(prefix+"_"+skymaptype+"_"+strftime("%Y%m%d-%H%M%S")).with_suffix(fileFormat)
-            plt.savefig(str(filename))
+            if outputFilePath is None:
+                _, filename = ntpath.split(fitsFilepaths[0])
+                values = filename.split("_")
+                prefix = values[0]
+                suffix = values[-1]
+                skymaptype = suffix.split(".")[1]
+                filename = self.outdir.joinpath(prefix+"_"+skymaptype+"_"+strftime("%Y%m%d-%H%M%S")).with_suffix(fileFormat)
+            else:
+                filename = outputFilePath
+            fig.savefig(str(filename))
+            plt.close(fig)
             self.logger.info(self, "Produced: %s", filename)
             return str(filename)
         else:
             plt.show()
             return None
 
-    def displaySkyMap(self, fitsFilepath, smooth, saveImage, fileFormat, title, cmap, regFilePath, catalogRegions, catalogRegionsColor):
+    def displaySkyMap(self, fitsFilepath, smooth, saveImage, fileFormat, title, cmap, regFilePath, catalogRegions, catalogRegionsColor, outputFilePath=None):
         # self._updateRC()
 
         regionsFiles = self._getRegionsFiles(regFilePath, catalogRegions)
         regionsColors = ["green", catalogRegionsColor]
 
 
-        hdu = fits.open(fitsFilepath)[0]
-        wcs = WCS(hdu.header)
+        data, header, wcs = self._getMapCache().get(fitsFilepath)
 
         fig, ax = plt.subplots(nrows=1, ncols=1, subplot_kw={'projection': wcs}, figsize=(12, 12))
 
-        if smooth > 0:
-            data = ndimage.gaussian_filter(hdu.data, sigma=float(smooth), order=0, output=float)
-        else:
-            data = hdu.data
+        data = self._smoothSkyMap(fitsFilepath, data, header, smooth)
 
-        plt.imshow(data, origin='lower', norm=None, cmap=cmap)
+        im = ax.imshow(data, origin='lower', norm=None, cmap=cmap)
 
         ax = self._configAxes(ax, title, regionsFiles, regionsColors, wcs)
 
         #cmap = plt.cm.CMRmap
         #cmap.set_bad(color='black')
-        plt.colorbar()
+        fig.colorbar(im, ax=ax)
 
         if saveImage:
-            _, filename = ntpath.split(fitsFilepath)
-            filename = self.outdir.joinpath(filename+"_"+strftime("%Y%m%d-%H%M%S")).with_suffix(fileFormat)
-            plt.savefig(filename)
+            if outputFilePath is None:
+                _, filename = ntpath.split(fitsFilepath)
+                filename = self.outdir.joinpath(filename+"_"+strftime("%Y%m%d-%H%M%S")).with_suffix(fileFormat)
+            else:
+                filename = outputFilePath
+            fig.savefig(filename)
+            plt.close(fig)
             self.logger.info(self, "Produced: %s", filename)
-            print("filename: ",filename)
             return str(filename)
         else:
             plt.show()
@@ -211,6 +228,7 @@ class PlottingUtils(metaclass=Singleton):
             filePath = join(outDir,'agile_visibility_ra'+str(src_ra)+'_dec'+str(src_dec)+'_tstart'+str(np.min(ti_tt))+'_tstop'+str(np.max(tf_tt))+'_zmax'+str(zmax)+'step'+str(step)+'.'+str(fileFormat))
             self.logger.info(self, "Visibility plot at: %s", filePath)
             f.savefig(filePath)
+            plt.close(f)
         else:
             plt.show()
 
@@ -223,17 +241,23 @@ class PlottingUtils(metaclass=Singleton):
             self.logger.warning(self, "No data to plot")
             return None
 
-        deltat = tf_tt - ti_tt
-        ttotal_obs = np.sum(deltat)
-        deltat1 = deltat[0] # for histogram always 0.1!!!
+        stats = VisibilityStats(zmax)
+        stats.update(np.asarray(separations, dtype=float)[np.newaxis, :], ti_tt, tf_tt)
+
+        return self.visibilityHistoFromStats(stats, src_ra, src_dec, step, saveImage, outDir, fileFormat, title)
+
+    def visibilityHistoFromStats(self, stats, src_ra, src_dec, step, saveImage, outDir, fileFormat, title, sourceIdx=0):
+        # self._updateRC()
+
+        if stats.count == 0:
+            self.logger.warning(self, "No data to plot")
+            return None
 
-        bins  = [0, 10, 20, 30, 40, 50, 60, 70, 80]
-        bins2 = [80, 180]
-        separations = [s.value for s in separations]
-        hist, bins = np.histogram(separations, bins=bins, density=False)
-        hist2, bins2 = np.histogram(separations, bins=bins2, density=False)
+        bins = VisibilityStats.BINS
+        bins2 = VisibilityStats.BINS2
+        perc, perc2 = stats.getPercentages(sourceIdx)
 
-        print(hist)
+        self.logger.debug(self, "Visibility histogram: %s %s", stats.hist[sourceIdx], stats.hist2[sourceIdx])
 
         width = 1. * (bins[1] - bins[0])
         center = (bins[:-1] + bins[1:]) / 2
@@ -244,8 +268,8 @@ class PlottingUtils(metaclass=Singleton):
         ax2 = f2.add_subplot(111)
         ax2.set_title(title, fontsize='large')
         ax2 = f2.add_subplot(111)
-        ax2.bar(center, hist*deltat1/ttotal_obs*100., align='center', color='w', edgecolor='b', width=width)
-        ax2.bar(center2, hist2*deltat1/ttotal_obs*100., align='center', color='w', edgecolor='b', width=width2)
+        ax2.bar(center, perc, align='center', color='w', edgecolor='b', width=width)
+        ax2.bar(center2, perc2, align='center', color='w', edgecolor='b', width=width2)
 
         ax2.set_xlim(0., 100.)
         ax2.set_ylim(0., 100.)
@@ -255,23 +279,114 @@ class PlottingUtils(metaclass=Singleton):
         xlabels = [0, 10, 20, 30, 40, 50, 60, 70, 80, 180]
         plt.xticks(xlabels, labels)
 
-        """
-        fil = open('agile_histogram_visibility'+str(src_ra)+'_dec'+str(src_dec)+'_tstart'+str(np.min(ti_tt))+'_tstop'+str(np.max(tf_tt))+'.txt', 'w')
-        for i in np.arange(len(center)):
-            fil.write("{} {} \n".format(center[i], hist[i]))
-        for i in np.arange(len(center2)):
-            fil.write("{} {} \n".format(center2[i], hist2[i]))
-        fil.close()
-        """
+        filePath = None
         if saveImage:
-            filePath = join(outDir,'agile_histogram_ra'+str(src_ra)+'_dec'+str(src_dec)+'_tstart'+str(np.min(ti_tt))+'_tstop'+str(np.max(tf_tt))+'_zmax'+str(zmax)+'step'+str(step)+'.'+str(fileFormat))
+            filePath = join(outDir,'agile_histogram_ra'+str(src_ra)+'_dec'+str(src_dec)+'_tstart'+str(stats.tmin)+'_tstop'+str(stats.tmax)+'_zmax'+str(stats.zmax)+'step'+str(step)+'.'+str(fileFormat))
             f2.savefig(filePath)
+            plt.close(f2)
             self.logger.info(self, "Visibility histogram at: %s", filePath)
         else:
             f2.show()
 
         return filePath
 
+    def _getMapCache(self):
+        """
+        It returns the sky maps cache shared with the analysis code, with the memory cap of the configuration.
+        """
+        mapCache = SkyMapCache.getShared()
+        mapCache.setMaxBytes(self.config.getOptionValue("mapcachemaxbytes"))
+        return mapCache
+
+    def renderBatch(self, jobs, processes=None):
+        """
+        It renders many images headlessly (matplotlib Agg backend) in a pool of worker processes. The figures
+        are closed as soon as they are written and the workers are replaced every 'renderTasksPerWorker' images,
+        so the memory does not grow with the number of images. The workers log into the log file of this object.
+
+        Args:
+            jobs (list): a list of (method, kwargs) tuples, where method is one of BATCH_METHODS and kwargs are
+                the keyword arguments of the call (e.g. the sky maps and the 'outputFilePath' of the image).
+            processes (int, optional): the number of worker processes. It defaults to None (os.cpu_count()).
+
+        Returns:
+            The list of the paths to the images, in the order of the jobs (None if the rendering of an image failed).
+        """
+        for method, _ in jobs:
+            if method not in PlottingUtils.BATCH_METHODS:
+                raise ValueError(f"The method {method} cannot be called by renderBatch(). Supported methods: {PlottingUtils.BATCH_METHODS}")
+
+        if not jobs:
+            return []
+
+        processes = min(processes or os.cpu_count(), len(jobs))
+
+        self.logger.info(self, "Rendering %d images with %d processes", len(jobs), processes)
+
+        workersQueue = self.logger.startWorkersListener()
+
+        # spawn: the workers do not inherit the figures and the threads of this process
+        context = multiprocessing.get_context("spawn")
+
+        try:
+            with context.Pool(processes, initializer=PlottingUtils._initRenderWorker, \
+                              initargs=(AgilepyConfig.getCopy(self.config), workersQueue, self.logger.debug_lvl), \
+                              maxtasksperchild=PlottingUtils.renderTasksPerWorker) as pool:
+
+                results = pool.map(PlottingUtils._renderJob, jobs, chunksize=1)
+        finally:
+            self.logger.stopWorkersListener()
+
+        outputFiles = []
+        for (method, kwargs), (outputFile, error) in zip(jobs, results):
+            if error is not None:
+                self.logger.warning(self, "%s failed (%s): %s", method, kwargs.get("outputFilePath"), error)
+            outputFiles.append(outputFile)
+
+        return outputFiles
+
+    @staticmethod
+    def _initRenderWorker(agilepyConfig, workersQueue, debug_lvl):
+
+        matplotlib.use("Agg", force=True)
+
+        logger = AgilepyLogger()
+        logger.initializeWorker(workersQueue, f"render-{os.getpid()}", debug_lvl)
+
+        PlottingUtils._workerInstance = PlottingUtils(agilepyConfig, logger)
+
+    @staticmethod
+    def _renderJob(job):
+
+        method, kwargs = job
+
+        if method != "saveLcImage":
+            kwargs = dict(kwargs, saveImage=True)
+
+        try:
+            return getattr(PlottingUtils._workerInstance, method)(**kwargs), None
+        except Exception as e:
+            return None, repr(e)
+        finally:
+            plt.close("all")
+
+    def _smoothSkyMap(self, fitsFilepath, data, header, smooth):
+        """
+        It smooths the map with a gaussian kernel: 'smooth' is the sigma (unit: pixels) or "psf" to approximate
+        the PSF of the energy range of the map. The result is cached (see SkyMapSmoother) and it is reused when
+        the map is displayed again with the same smoothing.
+        """
+        if smooth == "psf":
+            sigma = SkyMapSmoother.getPsfSigma(header)
+            self.logger.debug(self, "PSF smoothing of %s: sigma %f pixels", fitsFilepath, sigma)
+        else:
+            sigma = float(smooth)
+
+        if sigma <= 0:
+            return data
+
+        return PlottingUtils._smoother.smooth(data, sigma, key=SkyMapCache.getKey(fitsFilepath))
+
     def _getRegionsFiles(self, regFilePath, catalogRegions):
 
         regionsFiles = []
@@ -339,9 +454,7 @@ class PlottingUtils(metaclass=Singleton):
         # interpolation = "gaussian",
         for idx, regionFile in enumerate(regionFiles):
             if regionFile is not None:
-                regions = read_ds9(regionFile)
-                for region in regions:
-                    pixelRegion = region.to_pixel(wcs=wcs)
+                for pixelRegion in PlottingUtils._regionsCache.getPixelRegions(regionFile, wcs):
                     pixelRegion.plot(ax=ax, edgecolor=regionsColors[idx])
 
         if "GLON" in wcs.wcs.ctype[0]:
@@ -366,7 +479,7 @@ class PlottingUtils(metaclass=Singleton):
         col = r
         return row, col
 
-    def plotLc(self, filename, lineValue, lineError, saveImage=False):
+    def _readLcData(self, filename):
         # reading and setting dataframe
         data = pd.read_csv(filename, header=0, sep=" ")
         data["flux"] = data["flux"] * 10 ** 8
@@ -381,6 +494,42 @@ class PlottingUtils(metaclass=Singleton):
         sel1 = data.loc[data["sqrt(ts)"] >= 3]
         sel2 = data.loc[data["sqrt(ts)"] < 3]
 
+        return data, sel1, sel2
+
+    def saveLcImage(self, filename, outputFilePath, lineValue=None, lineError=None):
+        """
+        It writes the light curve plot with matplotlib (no browser renderer is needed, unlike plotLc()).
+
+        Returns:
+            The path to the image file.
+        """
+        data, sel1, sel2 = self._readLcData(filename)
+
+        fig, ax = plt.subplots(figsize=(12, 6))
+
+        ax.errorbar(sel1["tm"], sel1["flux"], xerr=[sel1["x_minus"], sel1["x_plus"]], yerr=sel1["flux_err"], fmt="o", label="sqrts >=3")
+        ax.errorbar(sel2["tm"], sel2["flux_ul"], xerr=[sel2["x_minus"], sel2["x_plus"]], fmt="v", markersize=10, label="sqrts < 3")
+
+        if lineValue is not None and lineError is not None:
+            ax.axhline(lineValue, linestyle="--", label="line1")
+            ax.axhspan(lineValue - lineError, lineValue + lineError, alpha=0.2)
+
+        ax.set_xlabel("Time(mjd)")
+        ax.set_ylabel(r"$10^{-8} ph cm^{-2} s^{-1}$")
+        ax.ticklabel_format(axis="x", useOffset=False, style="plain")
+        ax.legend()
+
+        fig.savefig(outputFilePath)
+        plt.close(fig)
+
+        self.logger.info(self, "Light curve plot at: %s", outputFilePath)
+
+        return str(outputFilePath)
+
+    def plotLc(self, filename, lineValue, lineError, saveImage=False):
+
+        data, sel1, sel2 = self._readLcData(filename)
+
 
         #Plotting
         fig = go.Figure()
@@ -26,23 +26,50 @@
 #along with this program.  If not, see <https://www.gnu.org/licenses/>.
 
 import os
+import asyncio
+import hashlib
+import weakref
+import threading
 import subprocess
+from collections import deque
 from pathlib import Path
 from abc import ABC, abstractmethod
 
+from agilepy.utils.AgilepyTracer import AgilepyTracer
 from agilepy.utils.CustomExceptions import ScienceToolProductNotFound, ScienceToolErrorCodeReturned
 
 class ProcessWrapper(ABC):
 
-    def __init__(self, exeName, agilepyLogger):
+    # maximum number of science tools running concurrently (per event loop) with callAsync()
+    maxConcurrency = os.cpu_count()
+
+    _semaphores = weakref.WeakKeyDictionary()
+
+    # number of running calls using each par file written in the working directory
+    _parFileRefs = {}
+    _parFilesLock = threading.Lock()
+
+    # content of the par files read from $AGILE/share
+    _parTemplates = {}
+
+    # number of lines of the science tools stdout and stderr kept in memory (for the error messages)
+    outputTailLines = 100
+
+    # maximum length of a line read from the science tools stdout by callAsync()
+    _streamLimit = 2**20
+
+    def __init__(self, exeName, agilepyLogger, tracer=None):
 
         self.logger = agilepyLogger
+        self.tracer = tracer if tracer is not None else AgilepyTracer(enabled=False)
         self.exeName = exeName
         self.args = []
         self.outputDir = None
         self.outfilePath = None
         self.products = []
         self.callCounter = 0
+        # the ProductStore sharing the products of the calls, set by configureTool() (None: the products are not shared)
+        self.productStore = None
 
     @abstractmethod
     def configureTool(self, confDict, extraParams=None):
@@ -57,8 +84,9 @@ class ProcessWrapper(ABC):
 
     def allRequiredOptionsSet(self, confDict):
         ok = True
-        for option in self.getRequiredOptions():
-            if confDict.getOptionValue(option) is None:
+        requiredOptions = self.getRequiredOptions()
+        for option, value in zip(requiredOptions, confDict.getOptionValues(requiredOptions)):
+            if value is None:
                 optionSection = confDict.getSectionOfOption(option)
                 self.logger.critical(self,"Option '%s' of section '%s' has not been set.", option, optionSection)
                 ok = False
@@ -75,43 +103,243 @@ class ProcessWrapper(ABC):
 
         Path(self.outputDir).mkdir(parents=True, exist_ok=True)
 
-        # copy par file
-        pfile_location = os.path.join(os.environ["AGILE"],"share")
-        pfile = os.path.join(pfile_location,self.exeName+".par")
+        argv = self._getArgv()
 
-        command = "cp "+pfile+" ./"
-        self.executeCommand(command, printStdout=False)
+        storeKey, fetched = self._fetchFromStore(argv)
 
-        # starting the tool
-        command = self.exeName + " " + " ".join(map(str, self.args))
-        toolstdout = self.executeCommand(command)
+        if fetched:
+            self.callCounter += 1
+            return list(self.products)
 
-        # remove par file
-        command = "rm ./"+self.exeName+".par"
-        self.executeCommand(command, printStdout=False)
+        argsHash = hashlib.sha1(" ".join(map(str, self.args)).encode("utf8")).hexdigest()
+
+        parFile = self._acquireParFile()
+
+        try:
+            with self.tracer.span(self.exeName, "tool", exe=self.exeName, args_sha1=argsHash, call=self.callCounter):
+                toolstdout = self.executeCommand(argv)
+        finally:
+            self._releaseParFile(parFile)
 
         self.callCounter += 1
 
+        return self._storeProducts(storeKey, self._getProducts(toolstdout))
+
+    async def callAsync(self, semaphore=None):
+        """
+        Coroutine running the science tool without a shell. The number of science tools running
+        concurrently is bounded by a semaphore, the stdout of the tool is streamed to the logger.
+
+        Args:
+            semaphore (asyncio.Semaphore, optional): the semaphore bounding the concurrency. It defaults to
+                None: a semaphore shared by all the science tools running in the event loop is used
+                (see ProcessWrapper.maxConcurrency).
+
+        Returns:
+            The list of the products of the science tool.
+        """
+        self.logger.info(self, "Science tool called!")
+
+        if not self.args:
+            self.logger.warning(self, "The 'args' attribute has not been set! Please, call setArguments() before call()! ")
+            return []
+
+        Path(self.outputDir).mkdir(parents=True, exist_ok=True)
+
+        argv = self._getArgv()
+
+        storeKey, fetched = self._fetchFromStore(argv)
+
+        if fetched:
+            self.callCounter += 1
+            return list(self.products)
+
+        if semaphore is None:
+            semaphore = ProcessWrapper._getSemaphore()
+
+        argsHash = hashlib.sha1(" ".join(map(str, self.args)).encode("utf8")).hexdigest()
+        callCounter = self.callCounter
+        self.callCounter += 1
+
+        async with semaphore:
+
+            parFile = self._acquireParFile()
+
+            try:
+                with self.tracer.span(self.exeName, "tool", exe=self.exeName, args_sha1=argsHash, call=callCounter):
+                    toolstdout = await self.executeCommandAsync(argv)
+            finally:
+                self._releaseParFile(parFile)
+
+        return self._storeProducts(storeKey, self._getProducts(toolstdout))
+
+    def _fetchFromStore(self, argv):
+        """
+        It materializes the products from the product store, if they have been already produced by an identical call.
+        Otherwise the existing products are removed, because they could be links to stored (shared) products.
+
+        Returns:
+            The key of the products in the store (None if the store is not used) and True if the products have been materialized.
+        """
+        if self.productStore is None:
+            return None, False
+
+        storeKey = self.productStore.getKey(self.exeName, argv, self.products)
+
+        if self.productStore.fetch(storeKey, self.products):
+            self.logger.info(self, "Products %s materialized from the product store %s", self.products, self.productStore.rootDir)
+            return storeKey, True
+
+        for product in self.products:
+            if os.path.lexists(product):
+                os.remove(product)
+
+        return storeKey, False
+
+    def _storeProducts(self, storeKey, products):
+
+        if storeKey is not None:
+            self.productStore.put(storeKey, products)
+
+        return products
+
+    def _getProducts(self, toolstdout):
+
         products = []
         for product in self.products:
             if not os.path.isfile(product):
-                raise ScienceToolProductNotFound("Product %s has NOT been produced by science tool. \nScience tool stdout:\n\n%s"%(product, toolstdout))
+                raise ScienceToolProductNotFound("Product %s has NOT been produced by science tool. \nScience tool stdout (last %d lines):\n\n%s"%(product, ProcessWrapper.outputTailLines, toolstdout))
             else:
                 products.append(product)
 
         return products
 
+    def _getArgv(self):
+        """
+        The arguments are split on whitespaces, as the shell does (e.g. Parameters.matrixconf holds three paths).
+        """
+        argv = [self.exeName]
+        for arg in self.args:
+            argv += str(arg).split()
+        return argv
+
+    @staticmethod
+    def _getSemaphore():
+        loop = asyncio.get_running_loop()
+        if loop not in ProcessWrapper._semaphores:
+            ProcessWrapper._semaphores[loop] = asyncio.Semaphore(ProcessWrapper.maxConcurrency)
+        return ProcessWrapper._semaphores[loop]
+
+    def _getParTemplate(self):
+        """
+        It returns the content of the par file of the science tool, reading it only the first time.
+        """
+        parTemplatePath = os.path.join(os.environ["AGILE"], "share", self.exeName+".par")
+
+        if parTemplatePath not in ProcessWrapper._parTemplates:
+            with open(parTemplatePath, "rb") as ptf:
+                ProcessWrapper._parTemplates[parTemplatePath] = ptf.read()
+
+        return ProcessWrapper._parTemplates[parTemplatePath]
+
+    def _acquireParFile(self):
+        """
+        It writes the par file of the science tool in the working directory, unless a running call already did it.
+        """
+        parFile = os.path.abspath(self.exeName+".par")
+
+        with ProcessWrapper._parFilesLock:
+
+            if ProcessWrapper._parFileRefs.get(parFile, 0) == 0:
+                with open(parFile, "wb") as pf:
+                    pf.write(self._getParTemplate())
+
+            ProcessWrapper._parFileRefs[parFile] = ProcessWrapper._parFileRefs.get(parFile, 0) + 1
+
+        return parFile
+
+    def _releaseParFile(self, parFile):
+        """
+        It removes the par file from the working directory when the last running call using it ends.
+        """
+        with ProcessWrapper._parFilesLock:
+
+            ProcessWrapper._parFileRefs[parFile] -= 1
+
+            if ProcessWrapper._parFileRefs[parFile] == 0:
+                del ProcessWrapper._parFileRefs[parFile]
+                if os.path.isfile(parFile):
+                    os.remove(parFile)
+
+
+    def executeCommand(self, argv, printStdout=True):
+        """
+        It runs the command without a shell. The stdout (if printStdout is True) and the stderr of the command are
+        written on the debug log line by line, and only their last 'outputTailLines' lines are kept in memory.
+
+        Returns:
+            The last lines of the stdout of the command.
+        """
+        self.logger.debug(self, "Executing command >>%s ", " ".join(argv))
+
+        try:
+            process = subprocess.Popen(argv, stdout=subprocess.PIPE, stderr=subprocess.PIPE, encoding="utf8", errors="replace")
+        except FileNotFoundError:
+            raise ScienceToolErrorCodeReturned("Science tool %s not found."%(argv[0]))
+
+        stdoutTail = deque(maxlen=ProcessWrapper.outputTailLines)
+        stderrTail = deque(maxlen=ProcessWrapper.outputTailLines)
+
+        stderrReader = threading.Thread(target=self._streamOutput, args=(process.stderr, stderrTail, "stderr", True), daemon=True)
+        stderrReader.start()
+
+        self._streamOutput(process.stdout, stdoutTail, "stdout", printStdout)
+
+        stderrReader.join()
+        returncode = process.wait()
+
+        if returncode != 0:
+            raise ScienceToolErrorCodeReturned("Non zero return status. \nstderr:" + "\n".join(stderrTail).strip())
+
+        return "\n".join(stdoutTail)
+
+    async def executeCommandAsync(self, argv):
+        """
+        Coroutine version of executeCommand().
+        """
+        self.logger.debug(self, "Executing command >>%s ", " ".join(argv))
+
+        try:
+            process = await asyncio.create_subprocess_exec(*argv, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE, limit=ProcessWrapper._streamLimit)
+        except FileNotFoundError:
+            raise ScienceToolErrorCodeReturned("Science tool %s not found."%(argv[0]))
+
+        stdoutTail = deque(maxlen=ProcessWrapper.outputTailLines)
+        stderrTail = deque(maxlen=ProcessWrapper.outputTailLines)
+
+        await asyncio.gather(self._streamOutputAsync(process.stdout, stdoutTail, "stdout"), \
+                             self._streamOutputAsync(process.stderr, stderrTail, "stderr"))
+
+        returncode = await process.wait()
+
+        if returncode != 0:
+            raise ScienceToolErrorCodeReturned("Non zero return status. \nstderr:" + "\n".join(stderrTail).strip())
 
-    def executeCommand(self, command, printStdout=True):
+        return "\n".join(stdoutTail)
 
-        self.logger.debug(self, "Executing command >>%s ", command)
+    def _streamOutput(self, stream, tail, streamName, log):
 
-        completedProcess = subprocess.run(command, shell=True, capture_output=True, encoding="utf8")
+        for line in stream:
+            line = line.rstrip("\n")
+            tail.append(line)
+            if log:
+                self.logger.debug(self, "%s %s >> %s", self.exeName, streamName, line)
 
-        if completedProcess.returncode != 0:
-            raise ScienceToolErrorCodeReturned("Non zero return status. \nstderr:" + completedProcess.stderr.strip())
+        stream.close()
 
-        if printStdout:
-            self.logger.debug(self, "Science tool stdout:\n\n%s\n\n", completedProcess.stdout)
+    async def _streamOutputAsync(self, stream, tail, streamName):
 
-        return completedProcess.stdout
+        async for line in stream:
+            line = line.decode("utf8", errors="replace").rstrip("\n")
+            tail.append(line)
+            self.logger.debug(self, "%s %s >> %s", self.exeName, streamName, line)
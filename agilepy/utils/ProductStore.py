@@ -0,0 +1,344 @@
+# DESCRIPTION
+#       Agilepy software
+#
+# NOTICE
+#      Any information contained in this software
+#      is property of the AGILE TEAM and is strictly
+#      private and confidential.
+#      Copyright (C) 2005-2020 AGILE Team.
+#          Baroncelli Leonardo <leonardo.baroncelli@inaf.it>
+#          Addis Antonio <antonio.addis@inaf.it>
+#          Bulgarelli Andrea <andrea.bulgarelli@inaf.it>
+#          Parmiggiani Nicolò <nicolo.parmiggiani@inaf.it>
+#      All rights reserved.
+
+#This program is free software: you can redistribute it and/or modify
+#it under the terms of the GNU General Public License as published by
+#the Free Software Foundation, either version 3 of the License, or
+#(at your option) any later version.
+
+#This program is distributed in the hope that it will be useful,
+#but WITHOUT ANY WARRANTY; without even the implied warranty of
+#MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#GNU General Public License for more details.
+
+#You should have received a copy of the GNU General Public License
+#along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+import os
+import stat
+import errno
+import shutil
+import hashlib
+import threading
+from pathlib import Path
+from contextlib import contextmanager
+
+class ProductStore:
+    """
+    A directory where the products of the science tools (e.g. the sky maps) are stored once and shared by
+    the analyses: a product is identified by a key computed from the science tool, its arguments and the
+    input files, and it is materialized into the output directory of each analysis by a hard link or a
+    reflink (falling back to a copy). The store should be on the same filesystem of the output directories,
+    otherwise the products are copied.
+
+    Each materialized product holds a reference (a file in the 'refs' subdirectory) to the stored object:
+    release() drops the references of an output directory and removes the objects that are no longer referenced.
+    The references are changed holding an exclusive lock on the 'lock' file of the store, hence the store can be
+    shared by concurrent analyses (threads or processes).
+    The stored objects are read-only, the users must replace (not modify in place) the materialized products.
+    """
+
+    # the input files smaller than this are identified by their content, the others by their size and modification time
+    CONTENT_HASH_MAX_BYTES = 2**20
+
+    # ioctl request cloning a file on copy-on-write filesystems (e.g. btrfs, xfs)
+    FICLONE = 0x40049409
+
+    _stores = {}
+    _storesLock = threading.Lock()
+
+    # it replaces the lock file where fcntl is not available (the store is shared only by the threads of the process)
+    _threadsLock = threading.Lock()
+
+    def __init__(self, rootDir):
+
+        self.rootDir = Path(rootDir).absolute()
+        self.objectsDir = self.rootDir.joinpath("objects")
+        self.refsDir = self.rootDir.joinpath("refs")
+        self.lockPath = self.rootDir.joinpath("lock")
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def getStore(rootDir):
+        """
+        It returns the store of the directory (one object per directory in the process), or None if rootDir is None.
+        """
+        if rootDir is None:
+            return None
+
+        rootDir = os.path.abspath(rootDir)
+
+        with ProductStore._storesLock:
+            if rootDir not in ProductStore._stores:
+                ProductStore._stores[rootDir] = ProductStore(rootDir)
+        return ProductStore._stores[rootDir]
+
+    def getKey(self, exeName, argv, products):
+        """
+        It returns the key of the products of a science tool call. The arguments that are products are replaced
+        by their index, the arguments that are existing files are replaced by their content (or by their size and
+        modification time if they are larger than CONTENT_HASH_MAX_BYTES), hence the key does not depend on the output
+        directory of the analysis and the products computed from materialized products are shared too.
+        The executable of the science tool is identified by its size and modification time.
+        """
+        keyHash = hashlib.sha1(exeName.encode("utf8"))
+
+        exePath = shutil.which(exeName)
+        if exePath is not None:
+            exeStat = os.stat(exePath)
+            keyHash.update(f"{exeStat.st_size}:{exeStat.st_mtime_ns}".encode("utf8"))
+
+        for arg in argv:
+
+            arg = str(arg)
+
+            if arg in products:
+                token = f"product:{products.index(arg)}"
+
+            elif os.path.isfile(arg):
+                fileStat = os.stat(arg)
+                if fileStat.st_size <= ProductStore.CONTENT_HASH_MAX_BYTES:
+                    with open(arg, "rb") as f:
+                        token = "content:"+hashlib.sha1(f.read()).hexdigest()
+                else:
+                    token = f"file:{fileStat.st_size}:{fileStat.st_mtime_ns}"
+
+            else:
+                token = "arg:"+arg
+
+            keyHash.update(token.encode("utf8")+b"\0")
+
+        return keyHash.hexdigest()
+
+    def fetch(self, key, products):
+        """
+        It materializes the stored products of the key into the 'products' paths.
+
+        Returns:
+            True if the products were in the store, False otherwise.
+        """
+        objectPaths = [self._getObjectPath(key, idx, product) for idx, product in enumerate(products)]
+
+        # the references keep the objects in the store while they are materialized (outside the lock)
+        with self._lock():
+
+            if not all(objectPath.is_file() for objectPath in objectPaths):
+                self.misses += 1
+                return False
+
+            for objectPath, product in zip(objectPaths, products):
+                self._addRef(objectPath, product)
+
+        try:
+            for objectPath, product in zip(objectPaths, products):
+                ProductStore._materialize(objectPath, product)
+        except OSError:
+            with self._lock():
+                for objectPath, product in zip(objectPaths, products):
+                    self._removeRef(objectPath, product)
+                self._collect([objectPath.name for objectPath in objectPaths])
+            raise
+
+        self.hits += 1
+
+        return True
+
+    def put(self, key, products):
+        """
+        It stores the products of the key (a product already stored by a concurrent call is replaced by a link to it).
+        """
+        for idx, product in enumerate(products):
+
+            objectPath = self._getObjectPath(key, idx, product)
+
+            with self._lock():
+                stored = objectPath.is_file()
+                if stored:
+                    self._addRef(objectPath, product)
+
+            if not stored:
+
+                objectPath.parent.mkdir(parents=True, exist_ok=True)
+                tmpPath = objectPath.with_name(f"{objectPath.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+                ProductStore._materialize(product, tmpPath)
+                os.chmod(tmpPath, stat.S_IRUSR | stat.S_IRGRP | stat.S_IROTH)
+
+                with self._lock():
+                    stored = objectPath.is_file()
+                    if stored:
+                        os.remove(tmpPath)
+                    else:
+                        os.replace(tmpPath, objectPath)
+                    self._addRef(objectPath, product)
+
+            if stored:
+                ProductStore._materialize(objectPath, product)
+
+    def release(self, directory):
+        """
+        It drops the references held by the products materialized in the directory (e.g. before deleting an analysis output directory)
+        and it removes the stored objects that are no longer referenced.
+
+        Returns:
+            The number of removed objects.
+        """
+        directory = os.path.join(os.path.abspath(directory), "")
+
+        released = set()
+
+        with self._lock():
+
+            for refPath, product in self._getRefs():
+                if product.startswith(directory):
+                    refPath.unlink(missing_ok=True)
+                    released.add(refPath.parent.name)
+
+            return self._collect(released)
+
+    def gc(self):
+        """
+        It drops the references of the products that no longer exist (e.g. output directories deleted without release())
+        and it removes the stored objects that are no longer referenced.
+
+        Returns:
+            The number of removed objects.
+        """
+        with self._lock():
+
+            for refPath, product in self._getRefs():
+                if not os.path.exists(product):
+                    refPath.unlink(missing_ok=True)
+
+            if not self.refsDir.is_dir():
+                return 0
+
+            return self._collect([objectRefs.name for objectRefs in self.refsDir.iterdir()])
+
+    @contextmanager
+    def _lock(self):
+        """
+        It holds the exclusive lock of the store (the threads of the process are serialized too, since each call opens the lock file).
+        """
+        self.rootDir.mkdir(parents=True, exist_ok=True)
+
+        with open(self.lockPath, "a") as lockFile:
+            try:
+                import fcntl
+            except ImportError:
+                fcntl = None
+
+            if fcntl is None:
+                with ProductStore._threadsLock:
+                    yield
+            else:
+                fcntl.flock(lockFile.fileno(), fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(lockFile.fileno(), fcntl.LOCK_UN)
+
+    def _getRefs(self):
+        """
+        It returns the (reference path, materialized product path) pairs, skipping the references removed meanwhile.
+        """
+        refs = []
+
+        if self.refsDir.is_dir():
+            for refPath in self.refsDir.glob("*/*"):
+                try:
+                    with open(refPath) as rf:
+                        refs.append((refPath, rf.read()))
+                except FileNotFoundError:
+                    continue
+
+        return refs
+
+    def _collect(self, objectNames):
+        """
+        It removes the objects without references. It must be called holding the lock.
+        """
+        removed = 0
+
+        for objectName in objectNames:
+
+            objectRefs = self.refsDir.joinpath(objectName)
+
+            try:
+                objectRefs.rmdir()
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                # the object is still referenced
+                if e.errno in (errno.ENOTEMPTY, errno.EEXIST):
+                    continue
+                raise
+
+            objectPath = self.objectsDir.joinpath(objectName[:2], objectName)
+            if objectPath.is_file():
+                objectPath.unlink()
+                removed += 1
+
+        return removed
+
+    def _getObjectPath(self, key, idx, product):
+        # the suffixes are kept (e.g. .cts.gz) because the readers of the products may rely on them
+        suffixes = "".join(Path(product).suffixes)
+        return self.objectsDir.joinpath(key[:2], f"{key}_{idx}{suffixes}")
+
+    def _getRefPath(self, objectPath, product):
+        product = os.path.abspath(product)
+        return self.refsDir.joinpath(objectPath.name, hashlib.sha1(product.encode("utf8")).hexdigest())
+
+    def _addRef(self, objectPath, product):
+        """
+        It must be called holding the lock.
+        """
+        refPath = self._getRefPath(objectPath, product)
+        refPath.parent.mkdir(parents=True, exist_ok=True)
+
+        with open(refPath, "w") as rf:
+            rf.write(os.path.abspath(product))
+
+    def _removeRef(self, objectPath, product):
+        """
+        It must be called holding the lock.
+        """
+        self._getRefPath(objectPath, product).unlink(missing_ok=True)
+
+    @staticmethod
+    def _materialize(sourcePath, destPath):
+        """
+        It makes destPath a hard link of sourcePath, or a reflink, or a copy.
+        """
+        if os.path.lexists(destPath):
+            os.remove(destPath)
+
+        try:
+            os.link(sourcePath, destPath)
+            return
+        except OSError:
+            pass
+
+        try:
+            import fcntl
+            with open(sourcePath, "rb") as src, open(destPath, "wb") as dst:
+                fcntl.ioctl(dst.fileno(), ProductStore.FICLONE, src.fileno())
+            shutil.copystat(sourcePath, destPath)
+            return
+        except (OSError, ImportError):
+            if os.path.lexists(destPath):
+                os.remove(destPath)
+
+        shutil.copy2(sourcePath, destPath)
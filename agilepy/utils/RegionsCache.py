@@ -0,0 +1,163 @@
+# DESCRIPTION
+#       Agilepy software
+#
+# NOTICE
+#      Any information contained in this software
+#      is property of the AGILE TEAM and is strictly
+#      private and confidential.
+#      Copyright (C) 2005-2020 AGILE Team.
+#          Baroncelli Leonardo <leonardo.baroncelli@inaf.it>
+#          Addis Antonio <antonio.addis@inaf.it>
+#          Bulgarelli Andrea <andrea.bulgarelli@inaf.it>
+#          Parmiggiani Nicolò <nicolo.parmiggiani@inaf.it>
+#      All rights reserved.
+
+#This program is free software: you can redistribute it and/or modify
+#it under the terms of the GNU General Public License as published by
+#the Free Software Foundation, either version 3 of the License, or
+#(at your option) any later version.
+
+#This program is distributed in the hope that it will be useful,
+#but WITHOUT ANY WARRANTY; without even the implied warranty of
+#MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#GNU General Public License for more details.
+
+#You should have received a copy of the GNU General Public License
+#along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+import threading
+import numpy as np
+from collections import OrderedDict
+
+import astropy.units as u
+from astropy.coordinates import SkyCoord
+from astropy.wcs.utils import proj_plane_pixel_scales
+from regions import read_ds9
+
+from agilepy.utils.SkyMapCache import SkyMapCache
+
+class RegionsCache:
+    """
+    Cache of the ds9 region files used in the plots overlays. Each file is parsed only once (until it is
+    modified) and its regions are projected only once for each WCS: the regions whose extent falls
+    outside the footprint of the map are discarded before the projection.
+    """
+
+    def __init__(self, maxProjections=32):
+
+        self.maxProjections = maxProjections
+        self._regions = {}
+        self._projections = OrderedDict()
+        self._lock = threading.Lock()
+
+    def getRegions(self, regionFile):
+        """
+        It returns the regions of the file and the key identifying the current version of the file.
+        """
+        key = SkyMapCache.getKey(regionFile)
+
+        with self._lock:
+            cached = self._regions.get(key[0])
+
+        if cached is None or cached[0] != key:
+            regions = read_ds9(key[0])
+            centers, extents = RegionsCache._getCentersAndExtents(regions)
+            cached = (key, regions, centers, extents)
+            with self._lock:
+                self._regions[key[0]] = cached
+
+        return cached
+
+    def getPixelRegions(self, regionFile, wcs):
+        """
+        It returns the regions of the file that overlap the map, projected on the pixels of the map.
+
+        Args:
+            regionFile (str): the path to a ds9 region file.
+            wcs (astropy.wcs.WCS): the WCS of the map. If its pixel_shape is not set, the regions are not culled.
+
+        Returns:
+            A list of PixelRegion objects.
+        """
+        key, regions, centers, extents = self.getRegions(regionFile)
+
+        projectionKey = (key, wcs.to_header_string(), wcs.pixel_shape)
+
+        with self._lock:
+            pixelRegions = self._projections.get(projectionKey)
+            if pixelRegions is not None:
+                self._projections.move_to_end(projectionKey)
+                return pixelRegions
+
+        visible = RegionsCache._getVisible(centers, extents, wcs)
+
+        pixelRegions = [region.to_pixel(wcs=wcs) for region, isVisible in zip(regions, visible) if isVisible]
+
+        with self._lock:
+            self._projections[projectionKey] = pixelRegions
+            while len(self._projections) > self.maxProjections:
+                self._projections.popitem(last=False)
+
+        return pixelRegions
+
+    def clear(self):
+
+        with self._lock:
+            self._regions.clear()
+            self._projections.clear()
+
+    @staticmethod
+    def _getCentersAndExtents(regions):
+        """
+        It returns the centers (ICRS) and the extents (unit: degrees) of the regions. The regions without
+        a center (e.g. polygons) have a NaN center and they are never culled.
+        """
+        ra = np.full(len(regions), np.nan)
+        dec = np.full(len(regions), np.nan)
+        extents = np.zeros(len(regions))
+
+        # the centers are transformed with one call for each frame
+        centersByFrame = {}
+
+        for idx, region in enumerate(regions):
+
+            center = getattr(region, "center", None)
+
+            if not isinstance(center, SkyCoord):
+                continue
+
+            centersByFrame.setdefault(center.frame.name, []).append((idx, center))
+
+            for attribute in ["radius", "outer_radius", "width", "height"]:
+                value = getattr(region, attribute, None)
+                if value is not None:
+                    extent = value.to_value(u.deg)
+                    extents[idx] = max(extents[idx], extent if "radius" in attribute else extent / 2)
+
+        for frameCenters in centersByFrame.values():
+            indexes = [idx for idx, _ in frameCenters]
+            icrs = SkyCoord([center for _, center in frameCenters]).icrs
+            ra[indexes] = icrs.ra.deg
+            dec[indexes] = icrs.dec.deg
+
+        return SkyCoord(ra=ra*u.deg, dec=dec*u.deg, frame="icrs"), extents
+
+    @staticmethod
+    def _getVisible(centers, extents, wcs):
+
+        noCenter = np.isnan(centers.ra.deg)
+
+        if wcs.pixel_shape is None or len(extents) == 0:
+            return np.ones(len(extents), dtype=bool)
+
+        nx, ny = wcs.pixel_shape
+
+        x, y = wcs.world_to_pixel(centers)
+
+        margins = extents / np.min(proj_plane_pixel_scales(wcs))
+
+        with np.errstate(invalid="ignore"):
+            inside = (x >= -0.5 - margins) & (x <= nx - 0.5 + margins) & \
+                     (y >= -0.5 - margins) & (y <= ny - 0.5 + margins)
+
+        return inside | noCenter
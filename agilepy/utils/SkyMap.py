@@ -0,0 +1,297 @@
+# DESCRIPTION
+#       Agilepy software
+#
+# NOTICE
+#      Any information contained in this software
+#      is property of the AGILE TEAM and is strictly
+#      private and confidential.
+#      Copyright (C) 2005-2020 AGILE Team.
+#          Baroncelli Leonardo <leonardo.baroncelli@inaf.it>
+#          Addis Antonio <antonio.addis@inaf.it>
+#          Bulgarelli Andrea <andrea.bulgarelli@inaf.it>
+#          Parmiggiani Nicolò <nicolo.parmiggiani@inaf.it>
+#      All rights reserved.
+
+#This program is free software: you can redistribute it and/or modify
+#it under the terms of the GNU General Public License as published by
+#the Free Software Foundation, either version 3 of the License, or
+#(at your option) any later version.
+
+#This program is distributed in the hope that it will be useful,
+#but WITHOUT ANY WARRANTY; without even the implied warranty of
+#MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#GNU General Public License for more details.
+
+#You should have received a copy of the GNU General Public License
+#along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+import numpy as np
+from pathlib import Path
+
+from agilepy.utils.SkyMapCache import SkyMapCache
+from agilepy.utils.CustomExceptions import SkyMapsNotCompatibleError
+
+class SkyMap:
+    """
+    A sky map (counts, exposure, gas or int map) backed by a numpy array. When the map is read
+    from a FITS file, the data and the header are loaded only when they are accessed, through
+    the shared SkyMapCache (the data of the maps read from files are read-only).
+
+    The astropy modules are imported only when they are needed (e.g. by the WCS and the FITS writer).
+
+    The arithmetic operations return new SkyMap objects and keep the time bookkeeping of the header
+    (TSTART, TSTOP, DATE-OBS, DATE-END): counts and exposure are additive in time, hence the maps
+    of contiguous time intervals can be stacked and the map of a sub-interval can be obtained by difference.
+    The written files can be used as input of the science tools.
+    """
+
+    # the header keywords that must match to combine two maps
+    GEOMETRY_KEYWORDS = ["CTYPE1", "CTYPE2", "CRVAL1", "CRVAL2", "CRPIX1", "CRPIX2", "CDELT1", "CDELT2"]
+
+    def __init__(self, filePath=None, data=None, header=None):
+
+        self.filePath = filePath
+        self._data = data
+        self._header = header
+        self._wcs = None
+
+    @staticmethod
+    def read(filePath):
+        """
+        It returns a SkyMap reading lazily the FITS file.
+
+        Args:
+            filePath (str): the path to a (gzipped) FITS file.
+
+        Returns:
+            A SkyMap object.
+        """
+        return SkyMap(filePath=str(filePath))
+
+    @property
+    def data(self):
+        if self._data is None:
+            self._load()
+        return self._data
+
+    @property
+    def header(self):
+        if self._header is None:
+            self._load()
+        return self._header
+
+    @property
+    def wcs(self):
+        if self._wcs is None:
+            from astropy.wcs import WCS
+            self._wcs = WCS(self.header)
+        return self._wcs
+
+    @property
+    def shape(self):
+        return self.data.shape
+
+    def getTimeRange(self):
+        return self.header["TSTART"], self.header["TSTOP"]
+
+    def sum(self, other):
+        """
+        It returns the pixel by pixel sum of the two maps, covering the union of their time ranges.
+        The time ranges must be contiguous (the TSTOP of a map is the TSTART of the other one).
+        """
+        self._checkCompatible(other)
+
+        tstart, tstop = SkyMap._contiguousTimeRange([self, other])
+
+        return self._newMap(self.data.astype(np.float64) + other.data, tstart, tstop)
+
+    def subtract(self, other):
+        """
+        It returns the pixel by pixel difference of the two maps (negative values are set to zero).
+        The time range of 'other' must be at the beginning or at the end of the time range of this map.
+        """
+        self._checkCompatible(other)
+
+        tstart, tstop = self.getTimeRange()
+        otherTstart, otherTstop = other.getTimeRange()
+
+        if otherTstart == tstart and otherTstop < tstop:
+            tstart = otherTstop
+        elif otherTstop == tstop and otherTstart > tstart:
+            tstop = otherTstart
+        else:
+            raise SkyMapsNotCompatibleError(f"The time range [{otherTstart}, {otherTstop}] is not at the beginning or at the end of [{tstart}, {tstop}]")
+
+        return self._newMap(np.clip(self.data.astype(np.float64) - other.data, 0, None), tstart, tstop)
+
+    def ratio(self, other):
+        """
+        It returns the pixel by pixel ratio of the two maps (e.g. counts / exposure). The pixels where
+        'other' is zero are set to zero.
+        """
+        self._checkCompatible(other)
+
+        numerator = self.data.astype(np.float64)
+
+        data = np.divide(numerator, other.data, out=np.zeros_like(numerator), where=other.data != 0)
+
+        return SkyMap(data=data, header=self._cleanHeader())
+
+    def rebin(self, factor, mode="sum"):
+        """
+        It returns a map with pixels 'factor' times larger, summing ('sum', e.g. counts) or averaging ('mean')
+        the original pixels. The map size is cropped to a multiple of 'factor'.
+        """
+        if mode not in ["sum", "mean"]:
+            raise ValueError(f"Rebin mode {mode} is not supported. Supported modes: 'sum', 'mean'")
+
+        ny, nx = self.shape[0] // factor, self.shape[1] // factor
+
+        blocks = self.data[:ny*factor, :nx*factor].astype(np.float64).reshape(ny, factor, nx, factor)
+
+        data = blocks.sum(axis=(1, 3)) if mode == "sum" else blocks.mean(axis=(1, 3))
+
+        header = self._cleanHeader()
+        for axis in ["1", "2"]:
+            header["CDELT"+axis] = header["CDELT"+axis] * factor
+            header["CRPIX"+axis] = (header["CRPIX"+axis] - 0.5) / factor + 0.5
+
+        return SkyMap(data=self._castLike(data), header=header)
+
+    def cutout(self, l, b, size):
+        """
+        It returns the square portion of the map centered in (l, b) galactic coordinates.
+
+        Args:
+            l (float): the galactic longitude of the center (unit: degrees).
+            b (float): the galactic latitude of the center (unit: degrees).
+            size (float): the side of the cutout (unit: degrees).
+        """
+        import astropy.units as u
+        from astropy.nddata import Cutout2D
+        from astropy.coordinates import SkyCoord
+
+        center = SkyCoord(l=l*u.deg, b=b*u.deg, frame="galactic")
+
+        cutout = Cutout2D(self.data, center, size*u.deg, wcs=self.wcs)
+
+        header = self._cleanHeader()
+        header.update(cutout.wcs.to_header())
+
+        return SkyMap(data=np.array(cutout.data), header=header)
+
+    @staticmethod
+    def stack(skyMaps):
+        """
+        It returns the sum of the maps of contiguous time intervals.
+
+        Args:
+            skyMaps (list): a list of SkyMap objects, in any order.
+
+        Raises:
+            SkyMapsNotCompatibleError: if the maps have different geometries or if their time ranges overlap or leave gaps.
+        """
+        skyMaps = list(skyMaps)
+
+        first = skyMaps[0]
+
+        for skyMap in skyMaps[1:]:
+            first._checkCompatible(skyMap)
+
+        tstart, tstop = SkyMap._contiguousTimeRange(skyMaps)
+
+        data = first.data.astype(np.float64)
+
+        for skyMap in skyMaps[1:]:
+            data += skyMap.data
+
+        return first._newMap(data, tstart, tstop)
+
+    @staticmethod
+    def _contiguousTimeRange(skyMaps):
+        """
+        It returns the (TSTART, TSTOP) covered by the maps. Overlapping time ranges would count the same
+        events twice and gaps would be covered by the header but not by the data: both are rejected.
+        """
+        timeRanges = sorted(skyMap.getTimeRange() for skyMap in skyMaps)
+
+        for (_, previousTstop), (nextTstart, nextTstop) in zip(timeRanges[:-1], timeRanges[1:]):
+            if nextTstart < previousTstop:
+                raise SkyMapsNotCompatibleError(f"The time range [{nextTstart}, {nextTstop}] overlaps a time range ending at {previousTstop}")
+            if nextTstart > previousTstop:
+                raise SkyMapsNotCompatibleError(f"There is a gap between {previousTstop} and {nextTstart}")
+
+        return timeRanges[0][0], timeRanges[-1][1]
+
+    def write(self, outputFilePath):
+        """
+        It writes the map on a FITS file (gzipped if the file name ends with .gz).
+
+        Returns:
+            The path to the written file.
+        """
+        from astropy.io import fits
+
+        Path(outputFilePath).parent.mkdir(parents=True, exist_ok=True)
+
+        # an existing file is replaced, not overwritten: it could be a link to a product shared by other analyses (see ProductStore)
+        Path(outputFilePath).unlink(missing_ok=True)
+
+        fits.PrimaryHDU(self.data, self._cleanHeader()).writeto(outputFilePath, overwrite=True)
+
+        return str(outputFilePath)
+
+    def _load(self):
+
+        data, header, _ = SkyMapCache.getShared().get(self.filePath)
+
+        if self._data is None:
+            self._data = data
+
+        # the cached header is shared, a copy is kept because it can be modified
+        if self._header is None:
+            self._header = header.copy()
+
+    def _checkCompatible(self, other):
+
+        if self.shape != other.shape:
+            raise SkyMapsNotCompatibleError(f"The maps have different shapes: {self.shape} {other.shape}")
+
+        for keyword in SkyMap.GEOMETRY_KEYWORDS:
+            if self.header.get(keyword) != other.header.get(keyword):
+                raise SkyMapsNotCompatibleError(f"The maps have different {keyword}: {self.header.get(keyword)} {other.header.get(keyword)}")
+
+    def _newMap(self, data, tstart, tstop):
+
+        from astropy.time import Time
+
+        header = self._cleanHeader()
+
+        header["TSTART"] = tstart
+        header["TSTOP"] = tstop
+
+        mjdref = header.get("MJDREFI", 53005.0) + header.get("MJDREFF", 0.0)
+
+        if "DATE-OBS" in header:
+            header["DATE-OBS"] = Time(mjdref + tstart/86400.0, format="mjd", scale="tt", precision=0).isot
+        if "DATE-END" in header:
+            header["DATE-END"] = Time(mjdref + tstop/86400.0, format="mjd", scale="tt", precision=0).isot
+
+        return SkyMap(data=self._castLike(data), header=header)
+
+    def _castLike(self, data):
+        """
+        The integer maps (counts) are stored as int32 to avoid overflows, the others keep their type.
+        """
+        if np.issubdtype(self.data.dtype, np.integer):
+            return np.rint(data).astype(np.int32)
+        return data.astype(self.data.dtype)
+
+    def _cleanHeader(self):
+        """
+        A copy of the header without the scaling keywords (the data are written unscaled).
+        """
+        header = self.header.copy()
+        for keyword in ["BZERO", "BSCALE"]:
+            header.remove(keyword, ignore_missing=True)
+        return header
@@ -0,0 +1,149 @@
+# DESCRIPTION
+#       Agilepy software
+#
+# NOTICE
+#      Any information contained in this software
+#      is property of the AGILE TEAM and is strictly
+#      private and confidential.
+#      Copyright (C) 2005-2020 AGILE Team.
+#          Baroncelli Leonardo <leonardo.baroncelli@inaf.it>
+#          Addis Antonio <antonio.addis@inaf.it>
+#          Bulgarelli Andrea <andrea.bulgarelli@inaf.it>
+#          Parmiggiani Nicolò <nicolo.parmiggiani@inaf.it>
+#      All rights reserved.
+
+#This program is free software: you can redistribute it and/or modify
+#it under the terms of the GNU General Public License as published by
+#the Free Software Foundation, either version 3 of the License, or
+#(at your option) any later version.
+
+#This program is distributed in the hope that it will be useful,
+#but WITHOUT ANY WARRANTY; without even the implied warranty of
+#MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#GNU General Public License for more details.
+
+#You should have received a copy of the GNU General Public License
+#along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+import os
+import threading
+from collections import OrderedDict
+
+class SkyMapCache:
+    """
+    In-memory LRU cache of the decompressed sky maps (data, header and WCS), keyed by the path and the
+    modification time of the FITS file: a file that is overwritten is read again.
+
+    The data arrays are shared by all the users of the cache, hence they are read-only. The least recently
+    used maps are evicted when the total size of the cached arrays exceeds 'maxBytes'.
+    """
+
+    DEFAULT_MAX_BYTES = 256 * 2**20
+
+    _shared = None
+    _sharedLock = threading.Lock()
+
+    def __init__(self, maxBytes=DEFAULT_MAX_BYTES):
+
+        self.maxBytes = maxBytes
+        self.currentBytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def getShared():
+        """
+        It returns the cache shared by the plotting and the map processing code (e.g. SkyMap) of the process.
+        """
+        with SkyMapCache._sharedLock:
+            if SkyMapCache._shared is None:
+                SkyMapCache._shared = SkyMapCache()
+        return SkyMapCache._shared
+
+    def get(self, filePath):
+        """
+        It returns the decompressed sky map, reading the FITS file only if it is not in the cache
+        or if it has been modified since it was read.
+
+        Args:
+            filePath (str): the path to a (gzipped) FITS file.
+
+        Returns:
+            A tuple (data, header, wcs): the data is a read-only numpy array, the header and the WCS must not be modified.
+        """
+        key = SkyMapCache.getKey(filePath)
+        filePath = key[0]
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry
+            self.misses += 1
+
+        entry = SkyMapCache._read(filePath)
+
+        with self._lock:
+            self._evictPath(filePath)
+            if entry[0].nbytes <= self.maxBytes:
+                self._entries[key] = entry
+                self.currentBytes += entry[0].nbytes
+                self._evict()
+
+        return entry
+
+    @staticmethod
+    def getKey(filePath):
+        """
+        It returns the key identifying the current version of the file: (absolute path, modification time).
+        """
+        filePath = os.path.abspath(str(filePath))
+        return filePath, os.stat(filePath).st_mtime_ns
+
+    def setMaxBytes(self, maxBytes):
+        """
+        It sets the memory cap of the cache (unit: bytes), evicting the least recently used maps if needed.
+        If maxBytes is 0 the maps are not cached.
+        """
+        with self._lock:
+            self.maxBytes = maxBytes
+            self._evict()
+
+    def clear(self):
+
+        with self._lock:
+            self._entries.clear()
+            self.currentBytes = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    @staticmethod
+    def _read(filePath):
+
+        from astropy.io import fits
+        from astropy.wcs import WCS
+
+        with fits.open(filePath, memmap=False) as hdulist:
+            data = hdulist[0].data
+            header = hdulist[0].header
+
+        data.flags.writeable = False
+
+        return data, header, WCS(header)
+
+    def _evictPath(self, filePath):
+        """
+        It removes the maps read from older versions of the file.
+        """
+        for key in [key for key in self._entries if key[0] == filePath]:
+            self.currentBytes -= self._entries.pop(key)[0].nbytes
+
+    def _evict(self):
+
+        while self._entries and self.currentBytes > self.maxBytes:
+            _, entry = self._entries.popitem(last=False)
+            self.currentBytes -= entry[0].nbytes
@@ -0,0 +1,155 @@
+# DESCRIPTION
+#       Agilepy software
+#
+# NOTICE
+#      Any information contained in this software
+#      is property of the AGILE TEAM and is strictly
+#      private and confidential.
+#      Copyright (C) 2005-2020 AGILE Team.
+#          Baroncelli Leonardo <leonardo.baroncelli@inaf.it>
+#          Addis Antonio <antonio.addis@inaf.it>
+#          Bulgarelli Andrea <andrea.bulgarelli@inaf.it>
+#          Parmiggiani Nicolò <nicolo.parmiggiani@inaf.it>
+#      All rights reserved.
+
+#This program is free software: you can redistribute it and/or modify
+#it under the terms of the GNU General Public License as published by
+#the Free Software Foundation, either version 3 of the License, or
+#(at your option) any later version.
+
+#This program is distributed in the hope that it will be useful,
+#but WITHOUT ANY WARRANTY; without even the implied warranty of
+#MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#GNU General Public License for more details.
+
+#You should have received a copy of the GNU General Public License
+#along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+import threading
+import numpy as np
+from scipy import fft
+from collections import OrderedDict
+
+class SkyMapSmoother:
+    """
+    Gaussian smoothing of the sky maps computed as a FFT convolution. It is equivalent to
+    scipy.ndimage.gaussian_filter (symmetric padding of the borders, kernel truncated at 4 sigma).
+
+    When a key identifying the map is given (e.g. its path and modification time), the transform of the
+    padded map, the transform of the kernel and the smoothed map are cached: displaying again the same map
+    does not recompute the convolution, and a different sigma costs only one transform of the kernel and one
+    inverse transform.
+    """
+
+    TRUNCATE = 4.0
+
+    # 68% containment radius of the AGILE-GRID PSF (unit: degrees) at 100 MeV and 1 GeV (Tavani et al. 2009),
+    # interpolated with a power law of the energy.
+    PSF_68_100MEV = 3.5
+    PSF_68_1GEV = 1.2
+
+    def __init__(self, maxCachedMaps=8):
+
+        self.maxCachedMaps = maxCachedMaps
+        self._mapTransforms = OrderedDict()
+        self._kernelTransforms = OrderedDict()
+        self._smoothedMaps = OrderedDict()
+        self._lock = threading.Lock()
+
+    def smooth(self, data, sigma, key=None):
+        """
+        It returns the map convolved with a gaussian kernel.
+
+        Args:
+            data (np.ndarray): the 2D map.
+            sigma (float): the sigma of the gaussian kernel (unit: pixels).
+            key (hashable, optional): the key identifying the map in the cache. It defaults to None (no caching).
+
+        Returns:
+            A read-only 2D numpy array of floats.
+        """
+        sigma = float(sigma)
+
+        radius = int(SkyMapSmoother.TRUNCATE * sigma + 0.5)
+
+        if key is not None:
+            smoothed = self._getCached(self._smoothedMaps, (key, sigma))
+            if smoothed is not None:
+                return smoothed
+
+        fftShape = tuple(fft.next_fast_len(n + 2*radius, real=True) for n in data.shape)
+
+        mapTransform = None if key is None else self._getCached(self._mapTransforms, (key, radius, fftShape))
+        if mapTransform is None:
+            padded = np.pad(np.asarray(data, dtype=np.float64), radius, mode="symmetric")
+            mapTransform = fft.rfft2(padded, s=fftShape)
+            if key is not None:
+                self._setCached(self._mapTransforms, (key, radius, fftShape), mapTransform)
+
+        kernelTransform = self._getCached(self._kernelTransforms, (sigma, fftShape))
+        if kernelTransform is None:
+            kernelTransform = SkyMapSmoother._getKernelTransform(sigma, radius, fftShape)
+            self._setCached(self._kernelTransforms, (sigma, fftShape), kernelTransform)
+
+        smoothed = fft.irfft2(mapTransform * kernelTransform, s=fftShape)
+        smoothed = smoothed[radius:radius+data.shape[0], radius:radius+data.shape[1]].copy()
+        smoothed.flags.writeable = False
+
+        if key is not None:
+            self._setCached(self._smoothedMaps, (key, sigma), smoothed)
+
+        return smoothed
+
+    @staticmethod
+    def getPsfSigma(header):
+        """
+        It returns the sigma (unit: pixels) of the gaussian approximating the AGILE-GRID PSF
+        at the geometric mean of the energy range of the map (MINENG and MAXENG header keywords).
+        """
+        energy = np.sqrt(header["MINENG"] * header["MAXENG"])
+
+        index = np.log10(SkyMapSmoother.PSF_68_100MEV / SkyMapSmoother.PSF_68_1GEV)
+
+        psf68 = SkyMapSmoother.PSF_68_100MEV * (energy / 100.0) ** (-index)
+
+        # 68% containment radius of a 2D gaussian
+        sigma = psf68 / np.sqrt(-2 * np.log(1 - 0.68))
+
+        return sigma / abs(header["CDELT1"])
+
+    def clear(self):
+
+        with self._lock:
+            self._mapTransforms.clear()
+            self._kernelTransforms.clear()
+            self._smoothedMaps.clear()
+
+    @staticmethod
+    def _getKernelTransform(sigma, radius, fftShape):
+        """
+        The kernel is centered in the origin (wrapped around the borders), so that the convolution is not shifted.
+        """
+        x = np.arange(-radius, radius+1)
+        kernel1d = np.exp(-0.5 * (x / sigma)**2)
+        kernel1d /= kernel1d.sum()
+
+        kernel = np.zeros(fftShape)
+        kernel[:2*radius+1, :2*radius+1] = np.outer(kernel1d, kernel1d)
+        kernel = np.roll(kernel, (-radius, -radius), axis=(0, 1))
+
+        return fft.rfft2(kernel)
+
+    def _getCached(self, cache, key):
+
+        with self._lock:
+            value = cache.get(key)
+            if value is not None:
+                cache.move_to_end(key)
+            return value
+
+    def _setCached(self, cache, key, value):
+
+        with self._lock:
+            cache[key] = value
+            while len(cache) > self.maxCachedMaps:
+                cache.popitem(last=False)
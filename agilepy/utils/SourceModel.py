@@ -35,6 +35,10 @@ from agilepy.utils.CustomExceptions import SpectrumTypeNotFoundError, \
                                            NotFreeableParamsError
 
 class Value:
+
+    # the attributes are slots: a sources library holds thousands of values
+    __slots__ = ("name", "value", "datatype")
+
     def __init__(self, name, datatype=None):
         self.name = name
         self.value = None
@@ -75,6 +79,9 @@ class Value:
             raise AttributeValueDatatypeNotSupportedError("The datatype {} is not supported for attribute {}".format(self.datatype, self.name))
 
 class OutputVal(Value):
+
+    __slots__ = ()
+
     def __init__(self, name, datatype=None):
         super().__init__(name, datatype)
 
@@ -86,6 +93,12 @@ class OutputVal(Value):
             self.value = self.castTo(value)
 
 class Parameter(Value):
+
+    __slots__ = ("free", "scale", "min", "max", "locationLimit")
+
+    # the attributes written by toDict() (e.g. in the XML sources files), in order
+    DICT_ATTRIBUTES = ("name", "value", "free", "scale", "min", "max", "locationLimit")
+
     def __init__(self, name, datatype=None, free=0, scale=None, min=None, max=None, locationLimit=None):
         super().__init__(name, datatype)
         self.free = free
@@ -119,16 +132,30 @@ class Parameter(Value):
             self.locationLimit = int(locationLimit)
 
     def toDict(self):
-        d = vars(self)
         outDict = {}
-        for k,v in d.items():
-            if v is not None and k!="datatype":
+        for k in Parameter.DICT_ATTRIBUTES:
+            v = getattr(self, k)
+            if v is not None:
                 outDict[k] = str(v)
 
         return outDict
 
 class SourceDescription:
 
+    __slots__ = ()
+
+    def getParameters(self):
+        """
+        It returns the Parameter attributes in a dictionary, in the order of their definition.
+        """
+        parameters = {}
+        for cls in reversed(type(self).__mro__):
+            for attributeName in cls.__dict__.get("__slots__", ()):
+                attribute = getattr(self, attributeName, None)
+                if isinstance(attribute, Parameter):
+                    parameters[attributeName] = attribute
+        return parameters
+
     def set(self, attributeName, attributeVal):
         try:
             parameter = getattr(self, attributeName)
@@ -175,6 +202,8 @@ class SourceDescription:
 
 class Spectrum(ABC, SourceDescription):
 
+    __slots__ = ("stype", "flux")
+
     @staticmethod
     def getSpectrumObject(stype):
 
@@ -202,6 +231,9 @@ class Spectrum(ABC, SourceDescription):
         self.flux = Parameter("flux", "float", free = 0)
 
 class PowerLawSpectrum(Spectrum):
+
+    __slots__ = ("index",)
+
     def __init__(self, type):
         super().__init__(type)
         self.index = Parameter("index", "float", free=0, scale=-1.0, min=0.5, max=5)
@@ -216,6 +248,9 @@ class PowerLawSpectrum(Spectrum):
         return self.index.value
 
 class PLExpCutoffSpectrum(Spectrum):
+
+    __slots__ = ("index", "cutoffEnergy")
+
     def __init__(self, type):
         super().__init__(type)
         self.index = Parameter("index", "float", free=0, scale=-1.0, min=0.5, max=5)
@@ -231,6 +266,9 @@ class PLExpCutoffSpectrum(Spectrum):
         return self.index.value
 
 class PLSuperExpCutoffSpectrum(Spectrum):
+
+    __slots__ = ("index1", "cutoffEnergy", "index2")
+
     def __init__(self, type):
         super().__init__(type)
         self.index1 = Parameter("index1", "float", free=0, scale=-1.0, min=0.5, max=5)
@@ -247,6 +285,9 @@ class PLSuperExpCutoffSpectrum(Spectrum):
         return self.index1.value
 
 class LogParabolaSpectrum(Spectrum):
+
+    __slots__ = ("index", "pivotEnergy", "curvature")
+
     def __init__(self, type):
         super().__init__(type)
         self.flux = Parameter("flux", "float")
@@ -265,6 +306,8 @@ class LogParabolaSpectrum(Spectrum):
 
 class SpatialModel(SourceDescription):
 
+    __slots__ = ("sptype", "locationLimit")
+
     @staticmethod
     def getSpatialModelObject(type, ll):
 
@@ -280,6 +323,9 @@ class SpatialModel(SourceDescription):
         self.locationLimit = ll
 
 class PointSourceSpatialModel(SpatialModel):
+
+    __slots__ = ("pos", "dist")
+
     def __init__(self, type, ll):
         super().__init__(type, ll)
         self.pos = Parameter("pos", "tuple<float,float>")
@@ -292,6 +338,12 @@ class PointSourceSpatialModel(SpatialModel):
         return [self.pos.toDict()]
 
 class MultiOutput(SourceDescription):
+
+    __slots__ = ("name", "multiSqrtTS", "multiFlux", "multiFluxErr", "multiFluxPosErr", "multiFluxNegErr", "multiUL", "multiExp", \
+                 "multiErgLog", "multiErgLogErr", "multiStartL", "multiStartB", "multiDist", "multiLPeak", "multiBPeak", \
+                 "multiDistFromStartPositionPeak", "multiL", "multiB", "multiDistFromStartPosition", "multir", "multia", "multib", \
+                 "multiphi", "multiGalCoeff", "multiGalErr", "multiIsoCoeff", "multiIsoErr", "startDataTT", "endDataTT", "multiExpRatio")
+
     def __init__(self):
 
         self.name = OutputVal("name", "str")
@@ -364,6 +416,8 @@ class Source:
 
     }
 
+    __slots__ = ("name", "type", "spatialModel", "spectrum", "multi")
+
     def __init__(self, name, type):
         self.name = name
         self.type = type
@@ -375,10 +429,10 @@ class Source:
     def __str__(self):
 
 
-        freeParams = [k for k,v in vars(self.spectrum).items() if isinstance(v, Parameter) and self.spectrum.getFree(k) > 0] + \
-                        [k for k,v in vars(self.spatialModel).items() if isinstance(v, Parameter) and self.spatialModel.getFree(k) > 0]
+        freeParams = [k for k in self.spectrum.getParameters() if self.spectrum.getFree(k) > 0] + \
+                        [k for k in self.spatialModel.getParameters() if self.spatialModel.getFree(k) > 0]
 
-        spectrumParams = [k+": "+v.get(strRepr=True) for k,v in vars(self.spectrum).items() if isinstance(v, Parameter)]
+        spectrumParams = [k+": "+v.get(strRepr=True) for k,v in self.spectrum.getParameters().items()]
 
         strRepr = '\n-----------------------------------------------------------'
         strRepr += f'\nSource name: {self.name} ({self.type})'
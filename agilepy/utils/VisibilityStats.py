@@ -0,0 +1,104 @@
+# DESCRIPTION
+#       Agilepy software
+#
+# NOTICE
+#      Any information contained in this software
+#      is property of the AGILE TEAM and is strictly
+#      private and confidential.
+#      Copyright (C) 2005-2020 AGILE Team.
+#          Baroncelli Leonardo <leonardo.baroncelli@inaf.it>
+#          Addis Antonio <antonio.addis@inaf.it>
+#          Bulgarelli Andrea <andrea.bulgarelli@inaf.it>
+#          Parmiggiani Nicolò <nicolo.parmiggiani@inaf.it>
+#      All rights reserved.
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+import numpy as np
+
+class VisibilityStats:
+    """
+    Streaming reducer of the off-axis angles of one or more sources. The separations
+    are consumed chunk by chunk (e.g. log file by log file) and only the histograms
+    and the time counters are kept in memory.
+    """
+
+    BINS = np.array([0, 10, 20, 30, 40, 50, 60, 70, 80])
+    BINS2 = np.array([80, 180])
+
+    def __init__(self, zmax, numberOfSources=1):
+
+        self.zmax = zmax
+        self.numberOfSources = numberOfSources
+        self.hist = np.zeros((numberOfSources, len(VisibilityStats.BINS)-1), dtype=np.int64)
+        self.hist2 = np.zeros((numberOfSources, len(VisibilityStats.BINS2)-1), dtype=np.int64)
+        self.timeUnderZmax = np.zeros(numberOfSources)
+        self.ttotal_obs = 0
+        self.deltat1 = None
+        self.tmin = None
+        self.tmax = None
+        self.count = 0
+
+    def update(self, separations, ti_tt, tf_tt):
+        """
+        It accumulates a chunk of separations.
+
+        Args:
+            separations (np.ndarray): the angular separations (unit: degrees) with shape (number of times,) or (number of sources, number of times).
+            ti_tt (np.ndarray): the start times of the samples.
+            tf_tt (np.ndarray): the stop times of the samples.
+        """
+        separations = np.atleast_2d(np.asarray(separations, dtype=float))
+        ti_tt = np.asarray(ti_tt, dtype=float)
+        tf_tt = np.asarray(tf_tt, dtype=float)
+
+        if separations.shape != (self.numberOfSources, len(ti_tt)):
+            raise ValueError("Expected separations with shape (%d, %d), got %s"%(self.numberOfSources, len(ti_tt), separations.shape))
+
+        if len(ti_tt) == 0:
+            return
+
+        deltat = tf_tt - ti_tt
+
+        if self.deltat1 is None:
+            self.deltat1 = deltat[0]
+            self.tmin = ti_tt.min()
+            self.tmax = tf_tt.max()
+        else:
+            self.tmin = min(self.tmin, ti_tt.min())
+            self.tmax = max(self.tmax, tf_tt.max())
+
+        self.ttotal_obs += np.sum(deltat)
+        self.count += len(ti_tt)
+
+        for i in range(self.numberOfSources):
+            self.hist[i] += np.histogram(separations[i], bins=VisibilityStats.BINS)[0]
+            self.hist2[i] += np.histogram(separations[i], bins=VisibilityStats.BINS2)[0]
+
+        self.timeUnderZmax += np.sum(np.where(separations < self.zmax, deltat, 0), axis=1)
+
+    def getPercentages(self, sourceIdx=0):
+        """
+        It returns the percentages of time spent in each bin of off-axis angle.
+
+        Returns:
+            The (perc, perc2) arrays for the [0, 80] bins and the [80, 180] bin.
+        """
+        if self.count == 0:
+            return np.zeros(len(VisibilityStats.BINS)-1), np.zeros(len(VisibilityStats.BINS2)-1)
+
+        perc = self.hist[sourceIdx]*self.deltat1/self.ttotal_obs*100.
+        perc2 = self.hist2[sourceIdx]*self.deltat1/self.ttotal_obs*100.
+
+        return perc, perc2